@@ -0,0 +1,3 @@
+"""
+离线基准测试（不访问网络，不需要 API Key）
+"""
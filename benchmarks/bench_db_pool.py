@@ -0,0 +1,126 @@
+"""
+数据库连接池基准：每次新建连接 vs 线程内复用（SQLite）
+
+在临时库上用多线程反复执行两条真实路径，比较每秒请求数：
+- dashboard：ensure_user_credits + get_daily_usage + get_credit_history + fetch_subscription
+- auth：verify_api_key 的数据库部分（按哈希查 Key；清空 Key 缓存并立即写回用量，避免测成纯内存命中）
+
+用法：
+    python -m benchmarks.bench_db_pool --threads 8 --seconds 3
+结果以 JSON 输出到标准输出。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def seed(users: int) -> list:
+    from web_app.credits import ensure_user_credits, init_credits_db
+    from web_app.db import get_connection
+    from web_app.startup.db_init import init_core_tables
+
+    asyncio.run(init_core_tables())
+    init_credits_db()
+
+    keys = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for i in range(users):
+            api_key = f"sk-bili-bench{i:04d}"
+            cursor.execute("""
+                INSERT OR REPLACE INTO api_keys (id, user_id, name, prefix, key_hash)
+                VALUES (?, ?, ?, ?, ?)
+            """, (f"key_{i}", f"user_{i}", "bench", api_key[:12], hashlib.sha256(api_key.encode()).hexdigest()))
+            keys.append(api_key)
+    for i in range(users):
+        ensure_user_credits(f"user_{i}")
+    return keys
+
+
+def dashboard_path(index: int, keys: list, loop) -> None:
+    from web_app.credits import ensure_user_credits, get_credit_history, get_daily_usage
+    from web_app.routers.dashboard import fetch_subscription
+
+    user_id = f"user_{index % len(keys)}"
+    ensure_user_credits(user_id)
+    get_daily_usage(user_id)
+    get_credit_history(user_id)
+    fetch_subscription(user_id)
+
+
+def auth_path(index: int, keys: list, loop) -> None:
+    from web_app.api_key_cache import clear_key_cache, flush_usage
+    from web_app.auth import verify_api_key
+
+    clear_key_cache()
+    loop.run_until_complete(verify_api_key(keys[index % len(keys)]))
+    flush_usage()
+
+
+def measure(path, keys: list, threads: int, seconds: float) -> dict:
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(slot: int):
+        loop = asyncio.new_event_loop()
+        try:
+            i = slot
+            while time.perf_counter() < deadline:
+                path(i, keys, loop)
+                counts[slot] += 1
+                i += threads
+        finally:
+            loop.close()
+
+    workers = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {"requests": sum(counts), "requests_per_s": round(sum(counts) / elapsed, 1)}
+
+
+def run(threads: int, seconds: float, users: int) -> dict:
+    from web_app import db
+    from web_app.metrics import DB_CONNECTIONS_OPENED
+
+    keys = seed(users)
+    results = {}
+    for mode, pooled in (("connect_per_call", False), ("pooled", True)):
+        db.SQLITE_POOL_ENABLED = pooled
+        db.close_all_connections()
+        opened_before = DB_CONNECTIONS_OPENED.value(backend="sqlite")
+        results[mode] = {
+            "dashboard": measure(dashboard_path, keys, threads, seconds),
+            "auth": measure(auth_path, keys, threads, seconds),
+            "connections_opened": int(DB_CONNECTIONS_OPENED.value(backend="sqlite") - opened_before),
+        }
+    for name in ("dashboard", "auth"):
+        before = results["connect_per_call"][name]["requests_per_s"]
+        results.setdefault("speedup", {})[name] = round(results["pooled"][name]["requests_per_s"] / before, 2) if before else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bili-dbpool-") as tmp:
+        os.environ["DB_PATH"] = str(Path(tmp) / "bench.db")
+        results = run(args.threads, args.seconds, args.users)
+    print(json.dumps({"benchmark": "db_pool", "threads": args.threads, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+应用导入耗时：在全新解释器中 python -X importtime 导入入口模块
+
+冷启动（Render 实例唤醒、测试收集）都要先导入 web_app.main；重依赖（yt_dlp、pptx、PIL、supabase 等）
+应延迟到第一次使用（见 web_app/lazy_imports.py）。这里统计总耗时、最慢的模块，以及导入后已加载的重依赖。
+
+用法：
+    python -m benchmarks.bench_import_time --top 15
+结果以 JSON 输出到标准输出。
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 导入 web_app.main 时不应加载的包（均已改为首次使用时导入）
+HEAVY_MODULES = (
+    "yt_dlp",
+    "pptx",
+    "PIL",
+    "qrcode",
+    "supabase",
+    "apscheduler",
+    "reportlab",
+    "google.generativeai",
+    "alipay",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str = "web_app.main") -> dict:
+    """
+    在子进程中导入 module
+
+    Returns:
+        {"total_ms", "modules": {名称: (自身 µs, 累计 µs)}, "heavy_loaded": [已加载的重依赖]}
+    """
+    probe = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    heavy = completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ""
+    return {
+        "total_ms": modules[module][1] / 1000 if module in modules else 0.0,
+        "modules": modules,
+        "heavy_loaded": [name for name in heavy.split(",") if name],
+    }
+
+
+def slowest(modules: dict, top: int) -> list:
+    """按累计耗时排序的顶层包（同一包取最大值，避免父子模块重复计数）"""
+    packages = {}
+    for name, (_, cumulative) in modules.items():
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), cumulative)
+    ranked = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return [{"package": package, "cumulative_ms": round(us / 1000, 1)} for package, us in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="web_app.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    result = measure(args.module)
+    print(json.dumps({
+        "benchmark": "import_time",
+        "module": args.module,
+        "total_ms": round(result["total_ms"], 1),
+        "heavy_loaded": result["heavy_loaded"],
+        "slowest": slowest(result["modules"], args.top),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
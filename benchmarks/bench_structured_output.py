@@ -0,0 +1,91 @@
+"""
+结构化输出解析基准：单次线性扫描 vs 旧版多轮正则
+
+用法：
+    python -m benchmarks.bench_structured_output --sizes 10000 100000 1000000 --repeat 5
+结果以 JSON 输出到标准输出。
+"""
+import argparse
+import json
+import re
+import time
+
+from web_app.structured_output import parse_structured_output
+
+
+def legacy_parse(response_text: str):
+    """旧版 summarize_content 的解析流程（多次 DOTALL 正则 + 整串替换），仅作对照"""
+    usage = {}
+    if "[COT_START]" in response_text and "[COT_END]" in response_text:
+        cot_start = response_text.index("[COT_START]")
+        cot_end = response_text.index("[COT_END]") + len("[COT_END]")
+        cot_content = response_text[cot_start:cot_end]
+        steps = re.findall(
+            r'(?:###\s*)?步骤\s*(\d+)[:：]\s*(.+?)\n\s*\[思考\][:：]\s*(.+?)(?=\n\n|\n(?:###\s*)?步骤|\[COT_END\]|$)',
+            cot_content, re.DOTALL
+        )
+        usage["cot_steps"] = [{"step": int(n), "title": t.strip(), "thinking": k.strip()} for n, t, k in steps]
+        response_text = response_text[:cot_start] + response_text[cot_end:]
+        response_text = response_text.replace("---\n\n", "").strip()
+    if "```json" in response_text and "charts" in response_text:
+        match = re.search(r'```json\s*(\{.*?"charts".*?\})\s*```', response_text, re.DOTALL)
+        if match:
+            usage["charts"] = json.loads(match.group(1)).get("charts")
+            response_text = response_text.replace(match.group(0), "").strip()
+    if "```json" in response_text and "keywords" in response_text:
+        match = re.search(r'```json\s*(\{.*?"keywords".*?\})\s*```', response_text, re.DOTALL)
+        if match:
+            usage["keywords"] = json.loads(match.group(1)).get("keywords")
+            response_text = response_text.replace(match.group(0), "").strip()
+    return response_text, usage
+
+
+def build_response(size: int) -> str:
+    """构造约 size 个字符的典型回复：思考过程 + 正文 + 思维导图 + 图表 / 关键词代码块"""
+    cot = "[COT_START]\n" + "".join(
+        f"### 步骤 {i}: 阶段{i}\n[思考]: 分析内容第 {i} 部分\n\n" for i in range(1, 6)
+    ) + "[COT_END]\n\n---\n\n"
+    tail = (
+        "\n\n【思维导图】\n- 主题\n  - 分支A\n  - 分支B\n\n"
+        '```json\n{"charts": [{"type": "bar", "data": [1, 2, 3]}]}\n```\n\n'
+        '```json\n{"keywords": [{"text": "AI", "value": 10}]}\n```'
+    )
+    line = "- 这是正文中的一个要点，包含一些说明文字与 `code` 片段。\n"
+    body = line * max((size - len(cot) - len(tail)) // len(line), 1)
+    return cot + body + tail
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        text = build_response(size)
+        legacy = _time(legacy_parse, text, repeat)
+        single = _time(parse_structured_output, text, repeat)
+        results.append({
+            "chars": len(text),
+            "legacy_ms": round(legacy * 1000, 3),
+            "single_pass_ms": round(single * 1000, 3),
+            "speedup": round(legacy / single, 2) if single else None
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps({"benchmark": "structured_output", "results": run(args.sizes, args.repeat)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
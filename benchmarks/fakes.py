@@ -0,0 +1,211 @@
+"""
+离线替身：假 yt-dlp、假 Gemini（本地桩后端）、模拟 B 站 API
+
+install_fakes() 在进程内替换外部依赖，返回的 Patcher 负责还原。
+所有延迟都可配置，数据按视频 ID 确定性生成（不同视频内容不同，避免误触发近重复识别）。
+"""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+WORDS = [
+    "模型", "数据", "训练", "推理", "缓存", "延迟", "吞吐", "队列", "并发", "索引",
+    "分片", "副本", "压缩", "编码", "调度", "限流", "熔断", "重试", "指标", "日志",
+]
+
+
+@dataclass
+class FakeConfig:
+    """
+    Attributes:
+        subtitle_ratio: 有字幕的视频比例（按视频 ID 确定性分配）
+        subtitle_latency: 字幕探测耗时（秒）
+        download_latency: 媒体下载耗时（秒）
+        media_bytes: 假媒体文件大小
+        subtitle_lines: 字幕行数
+        llm_latency / llm_first_token_latency / llm_tokens / upload_latency: 桩后端参数
+        bili_latency: 模拟 B 站接口耗时（秒）
+        bili_risk_ratio: 返回风控码 -352 的比例
+    """
+    subtitle_ratio: float = 0.5
+    subtitle_latency: float = 0.05
+    download_latency: float = 0.3
+    media_bytes: int = 256 * 1024
+    subtitle_lines: int = 120
+    llm_latency: float = 0.5
+    llm_first_token_latency: float = 0.1
+    llm_tokens: int = 800
+    upload_latency: float = 0.2
+    bili_latency: float = 0.05
+    bili_risk_ratio: float = 0.0
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16)
+
+
+def video_id_from_url(url: str) -> str:
+    match = re.search(r"BV[a-zA-Z0-9]+", url)
+    return match.group(0) if match else f"vid{_seed(url) % 10 ** 8}"
+
+
+def has_subtitles(video_id: str, ratio: float) -> bool:
+    return (_seed(video_id) % 1000) / 1000 < ratio
+
+
+def fixture_subtitle(video_id: str, lines: int) -> str:
+    """确定性的 SRT 字幕：同一视频内容固定，不同视频内容不同"""
+    rng = random.Random(_seed(video_id))
+    blocks = []
+    for i in range(lines):
+        words = "".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12)))
+        start, end = i * 3, i * 3 + 3
+        blocks.append(
+            f"{i + 1}\n00:{start // 60:02d}:{start % 60:02d},000 --> 00:{end // 60:02d}:{end % 60:02d},000\n"
+            f"{words}\n"
+        )
+    return "\n".join(blocks)
+
+
+class FakeYoutubeDL:
+    """
+    yt_dlp.YoutubeDL 的替身：按选项写出字幕或媒体文件，返回最小 info 字典
+    """
+    config = FakeConfig()
+    videos_dir = Path(".")
+
+    def __init__(self, opts: Optional[Dict[str, Any]] = None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url: str, download: bool = True) -> Dict[str, Any]:
+        video_id = video_id_from_url(url)
+        info = {
+            "id": video_id,
+            "title": f"基准测试视频 {video_id}",
+            "duration": self.config.subtitle_lines * 3,
+            "extractor_key": "BiliBili"
+        }
+        if self.opts.get("skip_download"):
+            time.sleep(self.config.subtitle_latency)
+            if has_subtitles(video_id, self.config.subtitle_ratio):
+                path = self.videos_dir / f"{video_id}.zh-Hans.srt"
+                path.write_text(fixture_subtitle(video_id, self.config.subtitle_lines), encoding="utf-8")
+            return info
+
+        time.sleep(self.config.download_latency)
+        path = self.videos_dir / f"{video_id}.mp4"
+        path.write_bytes(b"\0" * self.config.media_bytes)
+        for hook in self.opts.get("progress_hooks", []):
+            hook({"status": "finished"})
+        return info
+
+
+def bilibili_handler(config: FakeConfig) -> Callable[[httpx.Request], Any]:
+    """
+    模拟 B 站 API：/nav 返回 WBI 密钥，/x/space/wbi/arc/search 每次返回一个新的 BV 号
+    """
+    counter = {"n": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(config.bili_latency)
+        path = request.url.path
+        if path.endswith("/x/web-interface/nav"):
+            return httpx.Response(200, json={"code": 0, "data": {"wbi_img": {
+                "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+                "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"
+            }}})
+        if path.endswith("/x/space/wbi/arc/search"):
+            counter["n"] += 1
+            mid = request.url.params.get("mid", "0")
+            if config.bili_risk_ratio and (_seed(f"{mid}:{counter['n']}") % 1000) / 1000 < config.bili_risk_ratio:
+                return httpx.Response(200, json={"code": -352, "message": "风控校验失败"})
+            bvid = f"BV{mid}n{counter['n']}"
+            return httpx.Response(200, json={"code": 0, "data": {"list": {"vlist": [{
+                "bvid": bvid,
+                "title": f"UP {mid} 的新视频 {counter['n']}",
+                "pic": "https://example.invalid/cover.jpg",
+                "length": "10:00",
+                "created": int(time.time())
+            }]}}})
+        return httpx.Response(404, json={"code": -404})
+
+    return handler
+
+
+class Patcher:
+    """记录 setattr 并按相反顺序还原"""
+
+    def __init__(self):
+        self._undo: List[Callable[[], None]] = []
+
+    def setattr(self, target: Any, name: str, value: Any) -> None:
+        original = getattr(target, name)
+        self._undo.append(lambda: setattr(target, name, original))
+        setattr(target, name, value)
+
+    def defer(self, callback: Callable[[], None]) -> None:
+        self._undo.append(callback)
+
+    def restore(self) -> None:
+        while self._undo:
+            self._undo.pop()()
+
+
+def install_fakes(workdir: Path, config: FakeConfig) -> Patcher:
+    """
+    替换外部依赖：
+    - downloader.yt_dlp → FakeYoutubeDL，媒体写入 workdir/videos
+    - 抽取转录音频（ffmpeg）→ 跳过，直接用视频文件转录
+    - LLM 后端 → StubBackend（可配置延迟与 token 数）
+    - scheduler 的 httpx.AsyncClient → 挂载模拟 B 站 API 的 MockTransport；调度间隔 sleep 缩短为 0
+    """
+    from web_app import downloader, scheduler
+    from web_app.llm import StubBackend, set_llm_backend
+
+    patcher = Patcher()
+    videos_dir = workdir / "videos"
+    videos_dir.mkdir(parents=True, exist_ok=True)
+
+    FakeYoutubeDL.config = config
+    FakeYoutubeDL.videos_dir = videos_dir
+    patcher.setattr(downloader, "yt_dlp", SimpleNamespace(YoutubeDL=FakeYoutubeDL))
+    patcher.setattr(downloader, "VIDEOS_DIR", videos_dir)
+    patcher.setattr(downloader, "extract_audio_for_transcript", lambda video_path: None)
+
+    set_llm_backend(StubBackend(
+        latency=config.llm_latency,
+        first_token_latency=config.llm_first_token_latency,
+        output_tokens=config.llm_tokens,
+        upload_latency=config.upload_latency
+    ))
+    patcher.defer(lambda: set_llm_backend(None))
+
+    transport = httpx.MockTransport(bilibili_handler(config))
+    real_client = httpx.AsyncClient
+    patcher.setattr(scheduler, "httpx", SimpleNamespace(
+        AsyncClient=lambda *args, **kwargs: real_client(*args, transport=transport, **kwargs)
+    ))
+
+    real_sleep = asyncio.sleep
+
+    async def no_throttle(delay, *args, **kwargs):
+        # 调度器在 UP 主之间的固定间隔只为躲避线上风控，离线测量时去掉
+        return await real_sleep(0, *args, **kwargs)
+
+    patcher.setattr(scheduler, "asyncio", SimpleNamespace(**{**vars(asyncio), "sleep": no_throttle}))
+    return patcher
+
@@ -0,0 +1,102 @@
+"""
+基准测试统计：分阶段耗时分位数、内存峰值
+"""
+import asyncio
+import resource
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值分位数（q 取 0-100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """毫秒单位的分位数摘要"""
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0
+    }
+
+
+class StageRecorder:
+    """线程安全地收集各阶段耗时（秒）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        """包装同步或异步函数，记录每次调用耗时"""
+        if asyncio.iscoroutinefunction(fn):
+            async def async_wrapper(*args, **kwargs):
+                with self.time(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        def wrapper(*args, **kwargs):
+            with self.time(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+class MemoryWatermark:
+    """
+    进程常驻内存峰值（ru_maxrss），可选 Python 堆分配峰值（tracemalloc）
+
+    tracemalloc 会让分配密集的代码明显变慢，开启后延迟数字不可与未开启时比较。
+    """
+
+    def __init__(self, trace_python_heap: bool = False):
+        self.trace_python_heap = trace_python_heap
+        self.peak = None
+
+    def __enter__(self):
+        if self.trace_python_heap:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace_python_heap:
+            _, self.peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return False
+
+    def report(self) -> Dict[str, Any]:
+        # Linux 下 ru_maxrss 单位为 KB
+        report: Dict[str, Any] = {
+            "process_rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+        }
+        if self.peak is not None:
+            report["python_heap_peak_mb"] = round(self.peak / 1024 / 1024, 2)
+        return report
@@ -0,0 +1,403 @@
+"""
+离线流水线基准测试
+
+用假 yt-dlp（按视频 ID 生成字幕 / 媒体文件）、本地桩 LLM 后端（可配置延迟）与模拟 B 站 API
+驱动真实的 ASGI 应用，测量：
+- summarize：N 个并发 SSE 客户端走 /summarize，记录首个事件、首个 summary_delta 与完成耗时
+- batch：批量流水线各阶段（下载排队、下载+上传、LLM）耗时
+- scheduler：订阅检查的单个 UP 主请求耗时与整轮耗时
+
+同时输出任务队列排队 / 执行耗时、分阶段 p50/p95/p99、吞吐与内存峰值。结果为 JSON，便于做回归对比。
+
+用法:
+    python -m benchmarks.run_pipeline --scenario all --clients 8 --requests 4 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from benchmarks.fakes import FakeConfig, Patcher, install_fakes
+from benchmarks.metrics import MemoryWatermark, StageRecorder, summarize
+
+
+class SSEClient:
+    """
+    直接调用 ASGI 应用并逐块记录到达时间
+
+    httpx 的 ASGITransport 会把整个响应体缓冲后才返回，无法测量首个事件的延迟，
+    这里自己实现 receive/send，每收到一个 http.response.body 就解析其中完整的 SSE 事件。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        finished = asyncio.Event()
+        request_sent = False
+        buffer = ""
+        result: Dict[str, Any] = {"status": None, "events": [], "first_event": None, "first_delta": None}
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(params).encode(),
+            "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal buffer
+            if message["type"] == "http.response.start":
+                result["status"] = message["status"]
+                return
+            if message["type"] != "http.response.body":
+                return
+            now = time.perf_counter() - started
+            buffer += message.get("body", b"").decode("utf-8")
+            while "\n\n" in buffer:
+                raw, buffer = buffer.split("\n\n", 1)
+                if not raw.startswith("data: "):
+                    continue
+                event = json.loads(raw[len("data: "):])
+                result["events"].append((now, event))
+                if result["first_event"] is None:
+                    result["first_event"] = now
+                if event.get("type") == "summary_delta" and result["first_delta"] is None:
+                    result["first_delta"] = now
+            if not message.get("more_body", False):
+                finished.set()
+
+        await self.app(scope, receive, send)
+        finished.set()
+        result["total"] = time.perf_counter() - started
+        return result
+
+
+def instrument(patcher: Patcher, recorder: StageRecorder) -> None:
+    """
+    给流水线各阶段套上计时
+
+    同一函数可能以多个名字被引用（legacy_main 的模块级导入，batch_summarize 的函数内导入），
+    因此模块本身与导入方都要替换；队列处理器在调用时从 summarizer_gemini 取函数，只替换模块即可。
+    """
+    from web_app import cache, downloader, legacy_main, summarizer_gemini
+
+    stages = {
+        "download": (downloader, "download_content", [legacy_main]),
+        "upload": (summarizer_gemini, "upload_to_gemini", [legacy_main]),
+        "llm.summarize": (summarizer_gemini, "summarize_content", [legacy_main]),
+        "llm.summarize_from_base": (summarizer_gemini, "summarize_from_base", []),
+        "llm.summarize_with_base_notes": (summarizer_gemini, "summarize_with_base_notes", []),
+        "llm.transcript": (summarizer_gemini, "extract_ai_transcript", [legacy_main]),
+        "cache.lookup": (cache, "get_cached_result", [legacy_main]),
+        "cache.base_lookup": (cache, "get_base_extraction", [legacy_main]),
+        "cache.save": (cache, "save_to_cache", [legacy_main]),
+    }
+    for stage, (module, name, importers) in stages.items():
+        wrapped = recorder.wrap(stage, getattr(module, name))
+        patcher.setattr(module, name, wrapped)
+        for importer in importers:
+            patcher.setattr(importer, name, wrapped)
+
+
+def queue_report(since: float) -> Dict[str, Any]:
+    """按任务类型统计队列排队与执行耗时"""
+    from web_app.queue_manager import task_queue
+
+    waits: Dict[str, List[float]] = {}
+    runs: Dict[str, List[float]] = {}
+    for task in task_queue.tasks.values():
+        if task.created_at < since or task.started_at is None:
+            continue
+        waits.setdefault(task.task_type, []).append(task.started_at - task.created_at)
+        if task.completed_at is not None:
+            runs.setdefault(task.task_type, []).append(task.completed_at - task.started_at)
+    return {
+        task_type: {"wait": summarize(waits[task_type]), "run": summarize(runs.get(task_type, []))}
+        for task_type in sorted(waits)
+    }
+
+
+def bench_url(index: int) -> str:
+    return f"https://www.bilibili.com/video/BV1bench{index:06d}"
+
+
+async def run_summarize(app, clients: int, requests: int, videos: int) -> Dict[str, Any]:
+    """N 个客户端各自串行发起 M 次总结请求；URL 在 videos 个视频中轮转，超出部分命中缓存"""
+    client = SSEClient(app)
+    first_event: List[float] = []
+    first_delta: List[float] = []
+    totals: List[float] = []
+    outcomes: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+
+    async def worker(client_index: int):
+        for i in range(requests):
+            seq = client_index * requests + i
+            result = await client.get("/summarize", {
+                "url": bench_url(seq % videos),
+                "token": f"bench-user-{client_index}",
+            })
+            types = [event.get("type") for _, event in result["events"]]
+            if "error" in types:
+                outcome = "error"
+                message = next(event for _, event in result["events"] if event.get("type") == "error")
+                key = str(message.get("code") or message.get("error"))[:120]
+                errors[key] = errors.get(key, 0) + 1
+            elif any(event.get("cached") for _, event in result["events"]):
+                outcome = "cached"
+            elif "summary_complete" in types:
+                outcome = "completed"
+            else:
+                outcome = "incomplete"
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            totals.append(result["total"])
+            if result["first_event"] is not None:
+                first_event.append(result["first_event"])
+            if result["first_delta"] is not None:
+                first_delta.append(result["first_delta"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": clients,
+        "requests_per_client": requests,
+        "unique_videos": videos,
+        "outcomes": outcomes,
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(totals) / elapsed, 3) if elapsed else 0.0,
+        "sse": {
+            "first_event": summarize(first_event),
+            "first_summary_delta": summarize(first_delta),
+            "complete": summarize(totals),
+        },
+    }
+
+
+async def run_batch(batches: int, batch_size: int) -> Dict[str, Any]:
+    """并发创建若干批次，按生命周期事件时间戳拆分各阶段耗时"""
+    from web_app.batch_summarize import (
+        EVENT_DONE, EVENT_DOWNLOADING, EVENT_ERROR, EVENT_QUEUED, EVENT_SUMMARIZING, batch_service
+    )
+
+    started = time.perf_counter()
+    job_ids = []
+    for b in range(batches):
+        urls = [bench_url(900000 + b * batch_size + i) for i in range(batch_size)]
+        job_ids.append(await batch_service.create_batch(f"bench-batch-{b}", urls))
+
+    jobs = [batch_service.get_job_status(job_id) for job_id in job_ids]
+    while not all(job.finished for job in jobs):
+        await asyncio.gather(*(job.wait_for_events(len(job.events), 1.0) for job in jobs if not job.finished))
+    elapsed = time.perf_counter() - started
+
+    stages: Dict[str, List[float]] = {"download_wait": [], "download_upload": [], "llm": [], "item_total": []}
+    errors = 0
+    for job in jobs:
+        marks: Dict[str, Dict[str, float]] = {}
+        for event in job.events:
+            if event["url"]:
+                marks.setdefault(event["url"], {})[event["stage"]] = event["ts"]
+        for url_marks in marks.values():
+            if EVENT_ERROR in url_marks:
+                errors += 1
+                continue
+            queued, downloading = url_marks.get(EVENT_QUEUED), url_marks.get(EVENT_DOWNLOADING)
+            summarizing, done = url_marks.get(EVENT_SUMMARIZING), url_marks.get(EVENT_DONE)
+            if queued and downloading:
+                stages["download_wait"].append(downloading - queued)
+            if downloading and summarizing:
+                stages["download_upload"].append(summarizing - downloading)
+            if summarizing and done:
+                stages["llm"].append(done - summarizing)
+            if queued and done:
+                stages["item_total"].append(done - queued)
+
+    items = batches * batch_size
+    return {
+        "batches": batches,
+        "batch_size": batch_size,
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "throughput_items_per_s": round(items / elapsed, 3) if elapsed else 0.0,
+        "stages": {name: summarize(values) for name, values in stages.items()},
+    }
+
+
+async def run_scheduler(subscriptions: int, rounds: int, recorder: StageRecorder, patcher: Patcher) -> Dict[str, Any]:
+    """预置订阅后执行多轮新视频检查（模拟 API 每次都返回新 BV 号，因此每轮都会产生通知）"""
+    from web_app import scheduler
+    from web_app.db import get_connection
+    from web_app.services.subscriptions_service import subscribe_up
+
+    for i in range(subscriptions):
+        subscribe_up(f"bench-sub-{i % 50}", str(10000 + i), f"UP {i}")
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE up_subscriptions SET last_video_bvid = ?", ("BVseed",))
+    conn.commit()
+    conn.close()
+
+    patcher.setattr(scheduler, "get_up_latest_videos",
+                    recorder.wrap("scheduler.up_latest_videos", scheduler.get_up_latest_videos))
+    patcher.setattr(scheduler, "queue_notification",
+                    recorder.wrap("scheduler.queue_notification", scheduler.queue_notification))
+
+    round_times = []
+    for _ in range(rounds):
+        with recorder.time("scheduler.round"):
+            started = time.perf_counter()
+            await scheduler.check_new_videos()
+            round_times.append(time.perf_counter() - started)
+
+    total = sum(round_times)
+    return {
+        "subscriptions": subscriptions,
+        "rounds": rounds,
+        "round": summarize(round_times),
+        "throughput_subscriptions_per_s": round(subscriptions * rounds / total, 3) if total else 0.0,
+    }
+
+
+def patch_admission(patcher: Patcher) -> None:
+    """
+    基准客户端用 token 作为用户 ID，不经过 Supabase；按不限额用户处理，免去积分不足分支
+    全局限流桶只有 5 个突发令牌，不放开的话测到的是限流而不是流水线
+    """
+    from web_app import legacy_main
+
+    async def verify_session_token(token):
+        return {"user_id": token, "email": f"{token}@bench.local"}
+
+    async def acquire(user_id):
+        return True
+
+    patcher.setattr(legacy_main, "verify_session_token", verify_session_token)
+    patcher.setattr(legacy_main, "is_unlimited_user", lambda user: True)
+    patcher.setattr(legacy_main.rate_limiter, "acquire", acquire)
+
+
+async def init_tables() -> None:
+    """与启动项相同的表结构迁移，但同步完成（启动项里是后台任务，可能晚于第一个请求）"""
+    from web_app.migrations import run_migrations
+
+    run_migrations()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from web_app import scheduler
+    from web_app.main import app
+
+    config = FakeConfig(
+        subtitle_ratio=args.subtitle_ratio,
+        download_latency=args.download_latency,
+        llm_latency=args.llm_latency,
+        llm_first_token_latency=args.llm_first_token_latency,
+        llm_tokens=args.llm_tokens,
+        upload_latency=args.upload_latency,
+        bili_latency=args.bili_latency,
+    )
+    workdir = Path(args.workdir)
+    patcher = install_fakes(workdir, config)
+    recorder = StageRecorder()
+    try:
+        await init_tables()
+        patch_admission(patcher)
+        instrument(patcher, recorder)
+        # 只启动任务队列等启动项，不启动真实的定时调度器
+        patcher.setattr(scheduler, "start_scheduler", lambda: None)
+
+        scenarios = ["summarize", "batch", "scheduler"] if args.scenario == "all" else [args.scenario]
+        report: Dict[str, Any] = {"config": vars(args), "scenarios": {}}
+        with MemoryWatermark(trace_python_heap=args.trace_memory) as memory:
+            async with app.router.lifespan_context(app):
+                since = time.time()
+                if "summarize" in scenarios:
+                    videos = args.videos or args.clients * args.requests
+                    report["scenarios"]["summarize"] = await run_summarize(app, args.clients, args.requests, videos)
+                if "batch" in scenarios:
+                    report["scenarios"]["batch"] = await run_batch(args.batches, args.batch_size)
+                if "scheduler" in scenarios:
+                    report["scenarios"]["scheduler"] = await run_scheduler(
+                        args.subscriptions, args.rounds, recorder, patcher
+                    )
+                report["queue"] = queue_report(since)
+        report["stages"] = recorder.report()
+        report["memory"] = memory.report()
+        return report
+    finally:
+        patcher.restore()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线流水线基准测试")
+    parser.add_argument("--scenario", choices=["summarize", "batch", "scheduler", "all"], default="all")
+    parser.add_argument("--clients", type=int, default=8, help="并发 SSE 客户端数")
+    parser.add_argument("--requests", type=int, default=4, help="每个客户端的请求数")
+    parser.add_argument("--videos", type=int, default=0, help="不同视频数（默认每个请求一个新视频；更小则产生缓存命中）")
+    parser.add_argument("--batches", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--subscriptions", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--subtitle-ratio", type=float, default=0.5)
+    parser.add_argument("--download-latency", type=float, default=0.3)
+    parser.add_argument("--upload-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.1)
+    parser.add_argument("--llm-tokens", type=int, default=800)
+    parser.add_argument("--bili-latency", type=float, default=0.05)
+    parser.add_argument("--trace-memory", action="store_true", help="开启 tracemalloc 记录 Python 堆峰值（会拖慢运行）")
+    parser.add_argument("--workdir", default=None, help="临时数据库与假媒体目录（默认新建临时目录）")
+    parser.add_argument("--output", default=None, help="JSON 结果写入文件（默认输出到 stdout）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="bili-bench-") as tmp:
+        args.workdir = args.workdir or tmp
+        # 数据库路径在每次建连时读取，必须在任何查询之前指向临时库
+        os.environ["DB_PATH"] = str(Path(args.workdir) / "bench.db")
+        os.environ.setdefault("LLM_BACKEND", "stub")
+        logging.basicConfig(level=logging.WARNING)
+        # 流水线里的 print 进度输出转到 stderr，保证 stdout 只有 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(run(args))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        sys.stdout.write(output + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
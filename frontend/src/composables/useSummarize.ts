@@ -182,6 +182,12 @@ export function useSummarize() {
                             } else if (phase.value !== 'complete') {
                                 setPhase('transcript', '字幕完成', '正在生成总结...', 60)
                             }
+                        } else if (data.type === 'summary_delta') {
+                            // 流式正文：边生成边展示，最终以 summary_complete 的完整结果为准
+                            if (!summaryReceived) {
+                                result.value.summary = (result.value.summary || '') + (data.delta || '')
+                                setPhase('summarizing', '生成总结', 'AI 正在输出总结...', Math.max(progress.value, 75))
+                            }
                         } else if (data.type === 'summary_complete') {
                             result.value.summary = data.summary || ''
                             result.value.usage = data.usage || null
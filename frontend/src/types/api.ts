@@ -11,8 +11,9 @@ export interface SummarizeRequest {
 
 // SSE Event Types
 export interface SSEEvent {
-    type: 'status' | 'video_downloaded' | 'transcript_complete' | 'summary_complete' | 'error';
+    type: 'status' | 'video_downloaded' | 'transcript_complete' | 'summary_delta' | 'summary_complete' | 'error';
     status?: string;
+    delta?: string;
     video_file?: string;
     transcript?: string;
     summary?: string;
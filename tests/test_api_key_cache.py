@@ -0,0 +1,103 @@
+"""
+Tests for API key verification caching and write-behind usage accounting
+"""
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from web_app import api_key_cache, auth
+from web_app.db import get_connection
+from web_app.metrics import DB_QUERY_SECONDS
+
+API_KEY = "sk-bili-testkey0001"
+
+
+@pytest.fixture
+def key_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "keys.db"))
+    api_key_cache.clear_key_cache()
+    api_key_cache.flush_usage()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE api_keys (
+                id TEXT PRIMARY KEY, user_id TEXT NOT NULL, name TEXT NOT NULL, prefix TEXT NOT NULL,
+                key_hash TEXT NOT NULL UNIQUE, is_active INTEGER DEFAULT 1,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP, last_used_at TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE api_key_usage_daily (
+                key_id TEXT NOT NULL, user_id TEXT NOT NULL, date TEXT NOT NULL,
+                count INTEGER DEFAULT 0, PRIMARY KEY (key_id, date)
+            )
+        """)
+        cursor.execute(
+            "INSERT INTO api_keys (id, user_id, name, prefix, key_hash) VALUES (?, ?, ?, ?, ?)",
+            ("key-1", "user-1", "ci", API_KEY[:12], hashlib.sha256(API_KEY.encode()).hexdigest())
+        )
+    yield
+    api_key_cache.clear_key_cache()
+
+
+def _statements():
+    return sum(
+        DB_QUERY_SECONDS.count(backend="sqlite", operation=op) for op in ("SELECT", "INSERT", "UPDATE")
+    )
+
+
+def _verify_many(n):
+    async def scenario():
+        return [await auth.verify_api_key(API_KEY) for _ in range(n)]
+    return asyncio.run(scenario())
+
+
+def test_repeat_verifications_hit_cache_and_skip_writes(key_db):
+    before = _statements()
+    users = _verify_many(5)
+    assert {u["user_id"] for u in users} == {"user-1"}
+    assert _statements() - before == 1
+
+    assert api_key_cache.flush_usage() == 1
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT count FROM api_key_usage_daily WHERE key_id = ?", ("key-1",))
+        assert cursor.fetchone()["count"] == 5
+        cursor.execute("SELECT last_used_at FROM api_keys WHERE id = ?", ("key-1",))
+        assert cursor.fetchone()["last_used_at"] is not None
+
+
+def test_flush_accumulates_into_existing_daily_row(key_db):
+    _verify_many(2)
+    api_key_cache.flush_usage()
+    _verify_many(3)
+    api_key_cache.flush_usage()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT SUM(count) AS total FROM api_key_usage_daily")
+        assert cursor.fetchone()["total"] == 5
+
+
+def test_deleted_key_is_rejected_after_invalidation(key_db):
+    _verify_many(1)
+    with get_connection() as conn:
+        conn.cursor().execute("DELETE FROM api_keys WHERE id = ?", ("key-1",))
+    api_key_cache.invalidate_api_key("key-1")
+
+    with pytest.raises(HTTPException) as excinfo:
+        _verify_many(1)
+    assert excinfo.value.status_code == 401
+
+
+def test_failed_flush_keeps_usage_in_memory(key_db, monkeypatch):
+    _verify_many(2)
+
+    def broken():
+        raise RuntimeError("database is down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(api_key_cache, "get_connection", broken)
+        assert api_key_cache.flush_usage() == 0
+    assert api_key_cache.flush_usage() == 1
@@ -0,0 +1,74 @@
+"""
+Tests for cache-aware batch admission and per-item credit settlement
+"""
+import asyncio
+
+import pytest
+
+from web_app import cache, credit_ledger, credits, downloader, summarizer_gemini
+from web_app.batch_summarize import BatchSummarizeService
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "batch.db"))
+    cache.init_cache_db()
+    credits.init_credits_db()
+    credits.ensure_user_credits("u1", initial_credits=100)
+
+
+def _events(user_id):
+    return sorted((e["type"], e["cost"]) for e in credits.get_credit_history(user_id) if e["type"] != "grant")
+
+
+def test_batch_serves_cache_hits_and_refunds_failures(temp_db, monkeypatch):
+    hit = "https://www.bilibili.com/video/BVhit"
+    ok = "https://www.bilibili.com/video/BVok"
+    bad = "https://www.bilibili.com/video/BVbad"
+    cache.save_to_cache(hit, "smart", "default", "cached summary", "t", {})
+    downloaded = []
+
+    def fake_download(url, mode):
+        downloaded.append(url)
+        if url == bad:
+            raise RuntimeError("download failed")
+        return "/tmp/ok.txt", "text", "subtitle"
+
+    monkeypatch.setattr(downloader, "download_content", fake_download)
+    monkeypatch.setattr(summarizer_gemini, "summarize_content", lambda *args: ("summary", {}))
+
+    async def scenario():
+        service = BatchSummarizeService()
+        cached_results, misses = await service.plan_batch([hit, ok, bad, ok])
+        assert list(cached_results) == [hit]
+        assert misses == [ok, bad]
+
+        reserved = len(misses) * 10
+        hold_id = credit_ledger.reserve("u1", reserved)
+        assert hold_id
+        job_id = await service.create_batch(
+            "u1", [hit, ok, bad], cached_results=cached_results, credit_cost=10,
+            reserved_credits=reserved, credit_hold_id=hold_id
+        )
+        job = service.get_job_status(job_id)
+        while not job.finished:
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert downloaded == [ok, bad]
+    assert job.results[hit]["summary"] == "cached summary"
+    assert job.events[-1]["credits_charged"] == 10
+    assert job.events[-1]["credits_refunded"] == 10
+    assert credits.get_user_credits("u1")["credits"] == 90
+    assert credit_ledger.get_balance("u1")["held"] == 0
+    assert _events("u1") == [("consume", 10)]
+
+
+def test_unfinished_batch_hold_is_released_by_expiry_sweep(temp_db):
+    # 进程在结算前崩溃：预留只存在于 credit_holds，由定时任务整笔退还
+    assert credit_ledger.reserve("u1", 30, '{"source": "batch"}')
+
+    assert credit_ledger.release_expired_holds(max_age_seconds=-1) == 1
+    assert credits.get_user_credits("u1")["credits"] == 100
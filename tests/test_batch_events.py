@@ -0,0 +1,83 @@
+"""
+Tests for batch job lifecycle events - SSE source and delta cursor
+"""
+import asyncio
+import time
+
+from web_app import cache, downloader, summarizer_gemini
+from web_app.batch_summarize import BatchJob, BatchSummarizeService
+
+
+def _service(monkeypatch, fail_urls=()):
+    def fake_download(url, mode):
+        time.sleep(0.01)
+        return f"/tmp/{url}.txt", "text", "subtitle"
+
+    def fake_summarize(path, media_type, progress_callback, focus, remote_file):
+        if any(f"/tmp/{url}.txt" == path for url in fail_urls):
+            raise RuntimeError("boom")
+        return "summary", {}
+
+    monkeypatch.setattr(cache, "get_cached_result", lambda url, mode, focus: None)
+    monkeypatch.setattr(cache, "save_to_cache", lambda *args, **kwargs: None)
+    monkeypatch.setattr(downloader, "download_content", fake_download)
+    monkeypatch.setattr(summarizer_gemini, "summarize_content", fake_summarize)
+    return BatchSummarizeService()
+
+
+def test_events_cover_every_url_lifecycle(monkeypatch):
+    service = _service(monkeypatch, fail_urls={"u2"})
+    job = BatchJob(id="J1", user_id="user", urls=["u1", "u2"], mode="smart", focus="default")
+
+    asyncio.run(service._process_batch(job))
+
+    stages = {url: [e["stage"] for e in job.events if e["url"] == url] for url in job.urls}
+    assert stages["u1"] == ["queued", "downloading", "summarizing", "done"]
+    assert stages["u2"] == ["queued", "downloading", "summarizing", "error"]
+    assert job.events[-1]["stage"] == "complete"
+    assert job.events[-1]["status"] == "partial"
+    assert [e["seq"] for e in job.events] == list(range(len(job.events)))
+
+
+def test_events_since_cursor_returns_only_new_events(monkeypatch):
+    service = _service(monkeypatch)
+    job = BatchJob(id="J2", user_id="user", urls=["u1"], mode="smart", focus="default")
+    asyncio.run(service._process_batch(job))
+
+    cursor = len(job.events)
+    assert job.events_since(cursor) == []
+    assert job.events_since(cursor - 1) == [job.events[-1]]
+
+
+def test_waiter_wakes_on_new_event():
+    job = BatchJob(id="J3", user_id="user", urls=[], mode="smart", focus="default")
+
+    async def scenario():
+        waiter = asyncio.create_task(job.wait_for_events(0, timeout=1))
+        await asyncio.sleep(0.01)
+        job.emit("queued", "u1")
+        woke = await waiter
+        timed_out = await job.wait_for_events(len(job.events), timeout=0.01)
+        return woke, timed_out
+
+    woke, timed_out = asyncio.run(scenario())
+    assert woke is True
+    assert timed_out is False
+
+
+def test_failed_source_marks_partial_and_counts_received_items(monkeypatch):
+    service = _service(monkeypatch)
+    job = BatchJob(id="J4", user_id="user", urls=[], mode="smart", focus="default", expected_total=40)
+
+    async def source():
+        yield "u1"
+        yield "u2"
+        raise RuntimeError("page 2 failed")
+
+    asyncio.run(service._process_batch(job, source()))
+
+    assert job.expected_total == 2
+    assert job.source_error == "page 2 failed"
+    assert [e["stage"] for e in job.events if e["stage"] == "source_error"] == ["source_error"]
+    assert job.events[-1]["status"] == "partial"
+    assert job.events[-1]["source_error"] == "page 2 failed"
@@ -0,0 +1,94 @@
+"""
+Tests for the staged batch pipeline - per-stage limits, overlap and cache short-circuit
+"""
+import asyncio
+import threading
+import time
+
+from web_app import cache, downloader, summarizer_gemini
+from web_app.batch_summarize import BatchJob, BatchSummarizeService
+
+
+class _Gauge:
+    """记录某个阶段的最大同时执行数"""
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+def _patch(monkeypatch, cached_urls=()):
+    downloads, llm, overlap = _Gauge(), _Gauge(), []
+    downloaded = []
+
+    def fake_download(url, mode):
+        with downloads:
+            if llm.current:
+                overlap.append(url)
+            downloaded.append(url)
+            time.sleep(0.02)
+        return f"/tmp/{url}.mp4", "video", ""
+
+    def fake_llm(*args, **kwargs):
+        with llm:
+            time.sleep(0.03)
+        return "summary", {}
+
+    def fake_transcript(*args, **kwargs):
+        with llm:
+            time.sleep(0.03)
+        return "transcript"
+
+    def fake_cached(url, mode, focus):
+        if url in cached_urls:
+            return {"summary": "cached", "transcript": "t", "usage": {}}
+        return None
+
+    monkeypatch.setattr(cache, "get_cached_result", fake_cached)
+    monkeypatch.setattr(cache, "save_to_cache", lambda *args, **kwargs: None)
+    monkeypatch.setattr(downloader, "download_content", fake_download)
+    monkeypatch.setattr(summarizer_gemini, "upload_to_gemini", lambda path, cb: None)
+    monkeypatch.setattr(summarizer_gemini, "summarize_content", fake_llm)
+    monkeypatch.setattr(summarizer_gemini, "extract_ai_transcript", fake_transcript)
+    return downloads, llm, overlap, downloaded
+
+
+def test_stage_limits_and_network_llm_overlap(monkeypatch):
+    downloads, llm, overlap, _ = _patch(monkeypatch)
+    service = BatchSummarizeService(download_concurrency=3, upload_concurrency=2, llm_concurrency=4, queue_size=2)
+    urls = [f"u{i}" for i in range(10)]
+    job = BatchJob(id="P1", user_id="user", urls=urls, mode="video", focus="default")
+
+    asyncio.run(service._process_batch(job))
+
+    assert set(job.results) == set(urls)
+    assert all(r["transcript"] == "transcript" for r in job.results.values())
+    assert downloads.peak <= 3
+    assert downloads.peak > 1
+    assert llm.peak <= 4
+    # 总结与转录并发 → 单个条目即可占用 2 个 LLM 名额
+    assert llm.peak >= 2
+    # 后续下载与前面条目的 LLM 调用重叠
+    assert overlap
+
+
+def test_cache_hits_skip_download(monkeypatch):
+    _, _, _, downloaded = _patch(monkeypatch, cached_urls={"u0", "u2"})
+    service = BatchSummarizeService()
+    job = BatchJob(id="P2", user_id="user", urls=["u0", "u1", "u2"], mode="smart", focus="default")
+
+    asyncio.run(service._process_batch(job))
+
+    assert downloaded == ["u1"]
+    assert job.results["u0"]["summary"] == "cached"
+    assert [e["cached"] for e in job.events if e["stage"] == "done" and e["url"] == "u2"] == [True]
+    assert job.status.value == "completed"
@@ -0,0 +1,29 @@
+"""
+Smoke test for the offline pipeline benchmark harness
+"""
+import json
+
+from benchmarks.run_pipeline import main
+
+
+def test_summarize_scenario_reports_stage_percentiles(tmp_path, monkeypatch):
+    # main() 会改写 DB_PATH / LLM_BACKEND，先登记以便测试结束后还原
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "unused.db"))
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    output = tmp_path / "bench.json"
+
+    report = main([
+        "--scenario", "summarize", "--clients", "2", "--requests", "1",
+        "--download-latency", "0", "--upload-latency", "0",
+        "--llm-latency", "0.01", "--llm-first-token-latency", "0",
+        "--workdir", str(tmp_path), "--output", str(output),
+    ])
+
+    assert json.loads(output.read_text(encoding="utf-8")) == report
+    summarize = report["scenarios"]["summarize"]
+    assert summarize["outcomes"] == {"completed": 2}
+    assert summarize["sse"]["first_event"]["count"] == 2
+    assert summarize["sse"]["first_summary_delta"]["count"] == 2
+    assert report["stages"]["download"]["count"] == 2
+    assert "summarize" in report["queue"]
+    assert report["memory"]["process_rss_peak_mb"] > 0
@@ -0,0 +1,104 @@
+"""
+Tests for BilibiliVideoCache - LRU, negative caching and stale-while-revalidate
+"""
+import asyncio
+import time
+
+from web_app import bilibili_cache
+from web_app.bilibili_cache import BilibiliVideoCache, FAILURE_TTL, FAILURE_JITTER
+from web_app.db import close_all_connections
+
+
+def test_lru_evicts_least_recently_used():
+    cache = BilibiliVideoCache(max_entries=2)
+    cache.set_success("a", [{"bvid": "A"}])
+    cache.set_success("b", [{"bvid": "B"}])
+    assert cache.get("a") is not None  # touch a, b becomes LRU
+    cache.set_success("c", [{"bvid": "C"}])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [{"bvid": "A"}]
+    assert cache.get("c") == [{"bvid": "C"}]
+
+
+def test_failure_ttl_is_jittered():
+    cache = BilibiliVideoCache()
+    ttls = set()
+    for i in range(50):
+        cache.set_failure(f"mid{i}")
+        ttls.add(cache._cache[f"mid{i}"].ttl)
+    assert len(ttls) > 1
+    assert all(FAILURE_TTL * (1 - FAILURE_JITTER) - 1 <= t <= FAILURE_TTL * (1 + FAILURE_JITTER) for t in ttls)
+
+
+def test_stale_entry_served_while_single_refresh_runs():
+    cache = BilibiliVideoCache()
+    cache.set_success("mid", [{"bvid": "OLD"}])
+    cache._cache["mid"].timestamp = time.time() - cache._cache["mid"].ttl - 1
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{"bvid": "NEW"}]
+
+    async def scenario():
+        first = await cache.get_or_fetch("mid", fetcher)
+        second = await cache.get_or_fetch("mid", fetcher)
+        await asyncio.sleep(0.05)
+        third = await cache.get_or_fetch("mid", fetcher)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first == [{"bvid": "OLD"}]
+    assert second == [{"bvid": "OLD"}]
+    assert third == [{"bvid": "NEW"}]
+    assert len(calls) == 1
+
+
+def test_failed_refresh_keeps_stale_data():
+    cache = BilibiliVideoCache()
+    cache.set_success("mid", [{"bvid": "OLD"}])
+    cache._cache["mid"].timestamp = time.time() - cache._cache["mid"].ttl - 1
+
+    async def fetcher():
+        return []
+
+    async def scenario():
+        await cache.get_or_fetch("mid", fetcher)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert cache.get("mid") == [{"bvid": "OLD"}]
+
+
+def test_repeated_failures_do_not_extend_stale_window():
+    cache = BilibiliVideoCache()
+    cache.set_success("mid", [{"bvid": "OLD"}])
+    entry = cache._cache["mid"]
+    # 宽限期只剩 1 秒
+    entry.timestamp = time.time() - entry.ttl - entry.stale_ttl + 1
+    stamped = entry.timestamp
+
+    cache.set_failure("mid")
+    assert cache._cache["mid"].timestamp == stamped
+    assert cache.get("mid") == [{"bvid": "OLD"}]  # 推迟刷新期间继续返回旧数据
+
+    cache._cache["mid"].timestamp -= 2
+    assert cache.get("mid") is None
+
+
+def test_retry_after_survives_l2_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "bili.db"))
+    try:
+        bilibili_cache.init_bilibili_cache_db()
+        writer = BilibiliVideoCache(persistent=True)
+        writer.set_success("mid", [{"bvid": "OLD"}])
+        writer._cache["mid"].timestamp = time.time() - writer._cache["mid"].ttl - 1
+        writer.set_failure("mid")
+
+        loaded = BilibiliVideoCache(persistent=True)._load_l2("mid")
+        assert loaded.retry_after == writer._cache["mid"].retry_after
+        assert not loaded.is_expired()
+    finally:
+        close_all_connections()
@@ -0,0 +1,163 @@
+"""
+Tests for the credit ledger: reserve / commit / release, batched settlement and concurrency
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from web_app import credit_ledger, credits
+from web_app.db import close_all_connections, get_connection
+
+
+@pytest.fixture
+def ledger_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "ledger.db"))
+    credits.init_credits_db()
+    yield
+    close_all_connections()
+
+
+def _fund(user_id, amount):
+    credits.ensure_user_credits(user_id, initial_credits=amount)
+
+
+def _event_totals(user_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT event_type, COUNT(*) AS n, SUM(cost) AS total
+            FROM credit_events WHERE user_id = ? AND event_type != 'grant'
+            GROUP BY event_type
+        """, (user_id,))
+        return {row["event_type"]: (row["n"], row["total"]) for row in cursor.fetchall()}
+
+
+def _concurrently(fn, n):
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(run, range(n)))
+
+
+def test_commit_charges_actual_cost_and_refunds_rest(ledger_db):
+    _fund("u1", 100)
+    hold = credit_ledger.reserve("u1", 30, "job")
+    assert credit_ledger.get_balance("u1") == {"credits": 70, "held": 30}
+
+    assert credit_ledger.commit(hold, 10, "video")
+    assert credit_ledger.get_balance("u1") == {"credits": 90, "held": 0}
+    assert credits.get_user_credits("u1")["total_used"] == 1
+    assert _event_totals("u1") == {"consume": (1, 10)}
+
+    assert not credit_ledger.commit(hold, 10)
+    assert not credit_ledger.release(hold)
+    assert credit_ledger.get_balance("u1")["credits"] == 90
+
+
+def test_release_returns_full_hold(ledger_db):
+    _fund("u1", 50)
+    hold = credit_ledger.reserve("u1", 50)
+    assert credit_ledger.reserve("u1", 10) is None
+    assert credit_ledger.release(hold)
+    assert credit_ledger.get_balance("u1") == {"credits": 50, "held": 0}
+
+
+def test_batched_settlement_in_one_call(ledger_db):
+    _fund("u1", 100)
+    _fund("u2", 100)
+    holds = [credit_ledger.reserve("u1", 20), credit_ledger.reserve("u2", 20), credit_ledger.reserve("u2", 20)]
+
+    refunds = credit_ledger.settle([
+        (holds[0], [{"cost": 10}, {"cost": 10}]),
+        (holds[1], [{"cost": 10}]),
+        (holds[2], []),
+    ])
+    assert refunds == {holds[0]: 0, holds[1]: 10, holds[2]: 20}
+    assert credit_ledger.get_balance("u1")["credits"] == 80
+    assert credit_ledger.get_balance("u2")["credits"] == 90
+
+
+def test_expired_holds_are_released(ledger_db):
+    _fund("u1", 40)
+    credit_ledger.reserve("u1", 40)
+    assert credit_ledger.release_expired_holds(max_age_seconds=3600) == 0
+    assert credit_ledger.release_expired_holds(max_age_seconds=-60) == 1
+    assert credit_ledger.get_balance("u1") == {"credits": 40, "held": 0}
+
+
+def test_concurrent_reservations_never_overdraw(ledger_db):
+    _fund("u1", 500)
+    holds = _concurrently(lambda i: credit_ledger.reserve("u1", 10), 120)
+
+    granted = [h for h in holds if h]
+    assert len(granted) == 50
+    assert credit_ledger.get_balance("u1") == {"credits": 0, "held": 500}
+
+    def settle_one(i):
+        # 每笔预留有两个并发请求争抢：前 50 个里偶数号结算、奇数号释放，后 50 个全部释放
+        hold = granted[i % 50]
+        if i < 50 and i % 2 == 0:
+            return credit_ledger.commit(hold, 10)
+        return credit_ledger.release(hold)
+
+    results = _concurrently(settle_one, 100)
+    assert sum(results) == 50
+    balance = credit_ledger.get_balance("u1")
+    assert balance["held"] == 0
+    totals = _event_totals("u1")
+    consumed = totals.get("consume", (0, 0))[1]
+    assert balance["credits"] == 500 - consumed
+
+
+def test_concurrent_direct_charges_are_exact(ledger_db):
+    _fund("u1", 1000)
+    results = _concurrently(lambda i: credit_ledger.charge("u1", 7), 150)
+
+    assert sum(results) == 1000 // 7
+    assert credits.get_user_credits("u1")["credits"] == 1000 % 7
+    assert _event_totals("u1")["consume"] == (1000 // 7, (1000 // 7) * 7)
+
+
+def test_consumes_maintain_daily_usage_rollup(ledger_db):
+    _fund("u1", 100)
+    credit_ledger.charge("u1", 10)
+    hold = credit_ledger.reserve("u1", 30)
+    credit_ledger.settle([(hold, [{"cost": 10}, {"cost": 10}])])
+    credit_ledger.commit(credit_ledger.reserve("u1", 10), 10)
+
+    usage = credits.get_daily_usage("u1")
+    assert list(usage.values()) == [4]
+    assert sum(usage.values()) == _event_totals("u1")["consume"][0]
+
+
+def test_rollup_is_backfilled_from_history(ledger_db):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO credit_events (user_id, event_type, cost, created_at) VALUES (?, 'consume', 10, ?)",
+            [("old", "2025-01-01 08:00:00"), ("old", "2025-01-01 21:00:00"), ("old", "2025-01-03 09:00:00")]
+        )
+        cursor.execute("DELETE FROM usage_daily")
+    credits.init_credits_db()
+    assert credits.get_daily_usage("old") == {"2025-01-03": 1, "2025-01-01": 2}
+
+
+def _visible_history(user_id):
+    return [(e["type"], e["cost"]) for e in credits.get_credit_history(user_id) if e["type"] != "grant"]
+
+
+def test_history_shows_only_net_changes(ledger_db):
+    _fund("u1", 100)
+    succeeded = credit_ledger.reserve("u1", 10, '{"url": "ok"}')
+    credit_ledger.commit(succeeded, 10, '{"url": "ok"}')
+    assert _visible_history("u1") == [("consume", 10)]
+
+    failed = credit_ledger.reserve("u1", 10, '{"url": "bad"}')
+    credit_ledger.release(failed)
+    assert _visible_history("u1") == [("consume", 10)]
+    assert credits.get_user_credits("u1")["credits"] == 90
@@ -0,0 +1,54 @@
+"""
+Tests for the thread-offloaded async data-access layer in web_app.db_async
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from web_app import db, db_async
+
+
+@pytest.fixture
+def async_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "async.db"))
+    with db.get_connection() as conn:
+        conn.cursor().execute("CREATE TABLE items (name TEXT, qty INTEGER)")
+    yield
+    db.close_all_connections()
+
+
+def test_execute_and_fetch_use_question_mark_placeholders(async_db):
+    async def scenario():
+        inserted = await db_async.execute("INSERT INTO items (name, qty) VALUES (?, ?)", ("apple", 3))
+        row = await db_async.fetch_one("SELECT name, qty FROM items WHERE name = ?", ("apple",))
+        rows = await db_async.fetch_all("SELECT name FROM items")
+        missing = await db_async.fetch_one("SELECT name FROM items WHERE name = ?", ("pear",))
+        return inserted, row, rows, missing
+
+    inserted, row, rows, missing = asyncio.run(scenario())
+    assert inserted == 1
+    assert row["name"] == "apple" and row[1] == 3
+    assert len(rows) == 1
+    assert missing is None
+
+
+def test_transaction_rolls_back_on_error(async_db):
+    def insert_then_fail(cursor):
+        cursor.execute("INSERT INTO items (name, qty) VALUES (?, ?)", ("ghost", 1))
+        raise HTTPException(403, "denied")
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await db_async.transaction(insert_then_fail)
+        return await db_async.fetch_all("SELECT name FROM items")
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_work_runs_on_dedicated_db_threads(async_db):
+    async def scenario():
+        return await db_async.run_db(lambda: threading.current_thread().name)
+
+    assert asyncio.run(scenario()).startswith("db")
@@ -0,0 +1,90 @@
+"""
+Tests for the SQLite connection pool in web_app.db
+"""
+import threading
+
+import pytest
+
+from web_app import db
+
+
+@pytest.fixture
+def pooled_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "pool.db"))
+    monkeypatch.setattr(db, "SQLITE_POOL_ENABLED", True)
+    with db.get_connection() as conn:
+        conn.cursor().execute("CREATE TABLE items (name TEXT)")
+    yield
+    db.close_all_connections()
+
+
+def _raw(proxy):
+    return proxy._conn
+
+
+def _count():
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS n FROM items")
+        return cursor.fetchone()["n"]
+
+
+def test_connection_is_reused_within_a_thread(pooled_db):
+    first = db.get_connection()
+    raw = _raw(first)
+    first.close()
+    second = db.get_connection()
+    assert _raw(second) is raw
+    second.close()
+
+
+def test_nested_borrow_gets_a_separate_connection(pooled_db):
+    outer = db.get_connection()
+    inner = db.get_connection()
+    assert _raw(outer) is not _raw(inner)
+    inner.close()
+    outer.close()
+
+
+def test_connections_are_not_shared_across_threads(pooled_db):
+    conn = db.get_connection()
+    main_raw = _raw(conn)
+    conn.close()
+    seen = []
+
+    def worker():
+        other = db.get_connection()
+        seen.append(_raw(other))
+        other.close()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen and seen[0] is not main_raw
+
+
+def test_release_rolls_back_uncommitted_writes(pooled_db):
+    conn = db.get_connection()
+    conn.cursor().execute("INSERT INTO items (name) VALUES (?)", ("lost",))
+    conn.close()
+    conn.close()  # 重复 close 不会把连接归还两次
+    assert _count() == 0
+
+
+def test_context_manager_commits_or_rolls_back(pooled_db):
+    with db.get_connection() as conn:
+        conn.cursor().execute("INSERT INTO items (name) VALUES (?)", ("kept",))
+    with pytest.raises(RuntimeError):
+        with db.get_connection() as conn:
+            conn.cursor().execute("INSERT INTO items (name) VALUES (?)", ("dropped",))
+            raise RuntimeError("boom")
+    assert _count() == 1
+
+
+def test_pooled_connections_use_wal(pooled_db):
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode")
+        assert cursor.fetchone()[0] == "wal"
+        cursor.execute("PRAGMA synchronous")
+        assert cursor.fetchone()[0] == 1  # NORMAL
@@ -0,0 +1,104 @@
+"""
+Tests for Postgres placeholder rewriting and prepared statements in web_app.db.CursorProxy
+"""
+from collections import OrderedDict
+
+import pytest
+
+from web_app import db
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepared_statements = OrderedDict()
+        self.autocommit = False
+
+
+class FakeCursor:
+    def __init__(self, fail_prepare=False):
+        self.connection = FakeConnection()
+        self.executed = []
+        self.fail_prepare = fail_prepare
+
+    def execute(self, sql, params=None):
+        if self.fail_prepare and sql.startswith("PREPARE"):
+            raise RuntimeError("could not determine data type of parameter $1")
+        self.executed.append((sql, params))
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    db.compile_statement.cache_clear()
+    monkeypatch.setattr(db, "PG_PREPARE_THRESHOLD", 2)
+    monkeypatch.setattr(db, "PG_PREPARED_PER_CONN", 2)
+    yield
+    db.compile_statement.cache_clear()
+
+
+def test_translate_skips_literals_comments_and_escapes_percent():
+    query = "SELECT '?', \"a?\" FROM t WHERE a = ? AND b LIKE 'x%' -- ok?\n AND c = $$?$$ AND d = ?"
+    assert db.translate_query(query) == (
+        "SELECT '?', \"a?\" FROM t WHERE a = %s AND b LIKE 'x%%' -- ok?\n AND c = $$?$$ AND d = %s"
+    )
+    assert db.translate_query("SELECT E'\\'?' WHERE x = ?") == "SELECT E'\\'?' WHERE x = %s"
+
+
+def test_existing_percent_s_placeholders_are_kept(fresh_cache):
+    statement = db.compile_statement("DELETE FROM t WHERE last_accessed < NOW() - (%s)::interval AND k = ?")
+    assert statement.text == "DELETE FROM t WHERE last_accessed < NOW() - (%s)::interval AND k = %s"
+    assert statement.param_count == 2
+    assert statement.prepare_sql.endswith("NOW() - ($1)::interval AND k = $2")
+
+
+def test_like_literal_percent_is_escaped_once(fresh_cache):
+    statement = db.compile_statement("SELECT id FROM t WHERE title LIKE '%x%' AND user_id = ? AND r = 10 %% 3")
+    assert statement.text == "SELECT id FROM t WHERE title LIKE '%%x%%' AND user_id = %s AND r = 10 %% 3"
+    assert statement.param_count == 1
+    assert statement.prepare_sql.endswith("LIKE '%x%' AND user_id = $1 AND r = 10 % 3")
+
+
+def test_translation_is_memoized_by_query_text(fresh_cache):
+    first = db.compile_statement("SELECT credits FROM user_credits WHERE user_id = ?")
+    assert db.compile_statement("SELECT credits FROM user_credits WHERE user_id = ?") is first
+    assert first.prepare_sql.endswith("WHERE user_id = $1")
+
+
+def test_hot_statement_is_prepared_once_per_connection(fresh_cache):
+    cursor = FakeCursor()
+    proxy = db.CursorProxy(cursor, True)
+    query = "SELECT credits FROM user_credits WHERE user_id = ?"
+    for _ in range(3):
+        proxy.execute(query, ("u1",))
+
+    statements = [sql for sql, _ in cursor.executed]
+    name = db.compile_statement(query).name
+    assert statements[0] == "SELECT credits FROM user_credits WHERE user_id = %s"
+    assert statements.count(f"PREPARE {name} AS SELECT credits FROM user_credits WHERE user_id = $1") == 1
+    assert statements[-2:] == [f"EXECUTE {name} (%s)", f"EXECUTE {name} (%s)"]
+    assert cursor.executed[-1][1] == ("u1",)
+
+
+def test_prepared_statements_are_evicted_lru(fresh_cache):
+    cursor = FakeCursor()
+    proxy = db.CursorProxy(cursor, True)
+    queries = [f"SELECT {i} FROM t WHERE id = ?" for i in range(3)]
+    for query in queries:
+        for _ in range(2):
+            proxy.execute(query, (1,))
+
+    cache = cursor.connection.prepared_statements
+    assert list(cache) == [db.compile_statement(q).name for q in queries[1:]]
+    assert ("DEALLOCATE " + db.compile_statement(queries[0]).name, None) in cursor.executed
+
+
+def test_failed_prepare_falls_back_inside_savepoint(fresh_cache):
+    cursor = FakeCursor(fail_prepare=True)
+    proxy = db.CursorProxy(cursor, True)
+    query = "SELECT ? IS NULL"
+    for _ in range(3):
+        proxy.execute(query, (None,))
+
+    statements = [sql for sql, _ in cursor.executed]
+    assert "ROLLBACK TO SAVEPOINT bili_prepare" in statements
+    assert statements[-1] == "SELECT %s IS NULL"
+    assert not db.compile_statement(query).preparable
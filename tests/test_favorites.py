@@ -0,0 +1,86 @@
+"""
+Tests for favorites folder pagination - planned concurrent page prefetch
+"""
+import asyncio
+
+import pytest
+
+from web_app import favorites
+
+
+def _fake_pages(total: int, page_size: int = favorites.FAVORITES_PAGE_SIZE):
+    requested = []
+
+    async def fake_fetch(media_id, page=1, page_size=page_size):
+        requested.append(page)
+        # 后续页先返回也不能打乱产出顺序
+        await asyncio.sleep(0.01 * (10 - page % 10))
+        start = (page - 1) * page_size
+        end = min(start + page_size, total)
+        return {
+            "has_more": end < total,
+            "total": total,
+            "videos": [{"bvid": f"BV{i}", "url": f"https://www.bilibili.com/video/BV{i}"} for i in range(start, end)]
+        }
+
+    return fake_fetch, requested
+
+
+def test_iter_favorites_plans_pages_from_media_count(monkeypatch):
+    fake_fetch, requested = _fake_pages(total=95)
+    monkeypatch.setattr(favorites, "fetch_favorites_videos", fake_fetch)
+
+    videos = asyncio.run(favorites.fetch_all_favorites_videos("1", limit=100))
+
+    assert [v["bvid"] for v in videos] == [f"BV{i}" for i in range(95)]
+    assert sorted(requested) == [1, 2, 3, 4, 5]
+
+
+def test_iter_favorites_respects_limit(monkeypatch):
+    fake_fetch, requested = _fake_pages(total=500)
+    monkeypatch.setattr(favorites, "fetch_favorites_videos", fake_fetch)
+
+    videos = asyncio.run(favorites.fetch_all_favorites_videos("1", limit=30))
+
+    assert len(videos) == 30
+    assert sorted(requested) == [1, 2]
+
+
+def _flaky_pages(monkeypatch, total: int, failures: dict):
+    """failures: {页码: 失败次数}，失败次数用完后正常返回"""
+    fake_fetch, requested = _fake_pages(total)
+
+    async def flaky_fetch(media_id, page=1, page_size=favorites.FAVORITES_PAGE_SIZE):
+        if failures.get(page, 0) > 0:
+            failures[page] -= 1
+            requested.append(page)
+            raise RuntimeError("412 precondition failed")
+        return await fake_fetch(media_id, page, page_size)
+
+    monkeypatch.setattr(favorites, "fetch_favorites_videos", flaky_fetch)
+    monkeypatch.setattr(favorites, "FAVORITES_RETRY_BACKOFF", 0)
+    return requested
+
+
+def test_failed_page_is_retried(monkeypatch):
+    requested = _flaky_pages(monkeypatch, total=60, failures={2: 1})
+
+    videos = asyncio.run(favorites.fetch_all_favorites_videos("1", limit=100))
+
+    assert [v["bvid"] for v in videos] == [f"BV{i}" for i in range(60)]
+    assert requested.count(2) == 2
+
+
+def test_page_failing_after_retries_raises(monkeypatch):
+    _flaky_pages(monkeypatch, total=60, failures={2: favorites.FAVORITES_PAGE_RETRIES + 1})
+    received = []
+
+    async def consume():
+        async for video in favorites.iter_favorites_videos("1", limit=100):
+            received.append(video["bvid"])
+
+    with pytest.raises(favorites.FavoritesFetchError) as excinfo:
+        asyncio.run(consume())
+
+    assert excinfo.value.page == 2
+    assert received == [f"BV{i}" for i in range(20)]
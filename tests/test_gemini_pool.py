@@ -0,0 +1,138 @@
+"""
+Tests for GeminiPool - key routing, quota accounting and circuit breaker (local fake provider)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from web_app.gemini_pool import GeminiPool, GeminiUnavailableError
+
+
+class FakeError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+class FakeClient:
+    """本地假 provider：按 Key 记录调用，可注入错误"""
+    instances = {}
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.calls = 0
+        self.fail_with = None
+        self.tokens = 100
+        FakeClient.instances[api_key] = self
+
+    def model(self, model_name, **kwargs):
+        client = self
+
+        class _Model:
+            def generate_content(self, contents, **kw):
+                client.calls += 1
+                if client.fail_with:
+                    raise FakeError(client.fail_with)
+                return SimpleNamespace(
+                    text=f"{client.api_key}:{contents}",
+                    usage_metadata=SimpleNamespace(total_token_count=client.tokens)
+                )
+        return _Model()
+
+    def upload_file(self, path, mime_type=None):
+        return SimpleNamespace(name=f"files/{self.api_key}-{path}")
+
+    def get_file(self, name):
+        return SimpleNamespace(name=name)
+
+    def delete_file(self, name):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def reset_fakes():
+    FakeClient.instances = {}
+
+
+def _pool(keys=("a", "b"), **kwargs):
+    kwargs.setdefault("max_wait", 0.2)
+    return GeminiPool(keys=list(keys), client_factory=FakeClient, **kwargs)
+
+
+def test_clients_initialized_once_per_key():
+    pool = _pool()
+    for _ in range(6):
+        pool.generate("hi")
+    assert set(FakeClient.instances) == {"a", "b"}
+    # 最低负载路由：两个 Key 平均分摊
+    assert FakeClient.instances["a"].calls == 3
+    assert FakeClient.instances["b"].calls == 3
+
+
+def test_tpm_accounting_routes_away_from_heavy_key():
+    pool = _pool(tpm_limit=1000)
+    pool.generate("warmup")
+    heavy = next(c for c in FakeClient.instances.values() if c.calls)
+    heavy.tokens = 900
+    stats_before = {s["key"]: s["tpm"] for s in pool.stats()}
+    assert sum(stats_before.values()) == 100
+
+    pool.generate("x")  # 另一个 Key（负载更低）
+    pool.generate("y")  # 回到第一个 Key，消耗 900 token
+    usage = sorted(s["tpm"] for s in pool.stats())
+    assert usage == [100, 1000]
+
+    light = next(c for c in FakeClient.instances.values() if c is not heavy)
+    before = light.calls
+    pool.generate("z")
+    assert light.calls == before + 1
+
+
+def test_rpm_limit_exhaustion_raises_after_wait():
+    pool = _pool(keys=("a",), rpm_limit=2)
+    pool.generate("1")
+    pool.generate("2")
+    with pytest.raises(GeminiUnavailableError):
+        pool.generate("3")
+
+
+def test_429_opens_circuit_and_retries_on_other_key():
+    pool = _pool(failure_threshold=1, cooldown=60)
+    pool.generate("warm")
+    FakeClient.instances["a"].fail_with = 429
+
+    results = [pool.generate(str(i)).text for i in range(4)]
+
+    assert all(r.startswith("b:") for r in results)
+    assert [s["circuit_open"] for s in pool.stats()] == [True, False]
+    assert FakeClient.instances["a"].calls <= 2
+
+
+def test_non_retryable_error_is_raised_without_opening_circuit():
+    pool = _pool(keys=("a",), failure_threshold=1)
+    pool.generate("warm")
+    FakeClient.instances["a"].fail_with = 400
+    with pytest.raises(FakeError):
+        pool.generate("bad")
+    assert pool.stats()[0]["circuit_open"] is False
+
+
+def test_uploaded_file_pins_requests_to_its_key():
+    pool = _pool()
+    media = pool.upload_file("video.mp4", mime_type="video/mp4")
+    owner = media.name.split("/")[1].split("-")[0]
+
+    for _ in range(4):
+        assert pool.generate(["prompt", media], file=media).text.startswith(f"{owner}:")
+
+
+def test_per_key_client_binds_its_own_sdk_clients():
+    # GenaiKeyClient 依赖 SDK 内部接口；升级 google-generativeai 时这里先失败
+    pytest.importorskip("google.generativeai")
+    from web_app.gemini_pool import GenaiKeyClient
+
+    first, second = GenaiKeyClient("key-a"), GenaiKeyClient("key-b")
+    model_a, model_b = first.model("gemini-test"), second.model("gemini-test")
+
+    assert model_a._client is first._manager.get_default_client("generative")
+    assert model_a._client is not model_b._client
@@ -0,0 +1,28 @@
+"""
+Import-time regression budget for the application entry point
+"""
+import os
+
+from benchmarks.bench_import_time import measure, slowest
+
+# 全新解释器导入 web_app.main 的上限（毫秒）；延迟导入后本地约 0.9s，留出 CI 机器的波动余量
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+
+
+def test_entry_point_import_stays_within_budget():
+    result = measure("web_app.main")
+
+    assert result["heavy_loaded"] == [], f"heavy modules imported eagerly: {result['heavy_loaded']}"
+    assert result["total_ms"] <= IMPORT_TIME_BUDGET_MS, (
+        f"import web_app.main took {result['total_ms']:.0f}ms (budget {IMPORT_TIME_BUDGET_MS:.0f}ms); "
+        f"slowest: {slowest(result['modules'], 8)}"
+    )
+
+
+def test_lazy_module_defers_import_until_attribute_access():
+    from web_app.lazy_imports import lazy_module
+
+    proxy = lazy_module("json.tool")
+    assert not proxy.loaded
+    assert callable(proxy.main)
+    assert proxy.loaded
@@ -0,0 +1,66 @@
+"""
+Tests for the LLM backend layer - deterministic stub output and usage accounting
+"""
+import pytest
+
+from web_app.llm import StubBackend, get_llm_backend, set_llm_backend
+from web_app.summarizer_gemini import summarize_content
+
+
+@pytest.fixture
+def stub():
+    backend = StubBackend(latency=0.02, first_token_latency=0.01, output_tokens=200, chunks=10)
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+def test_stub_is_deterministic_per_prompt(stub):
+    first = stub.generate("prompt A", task="summary")
+    second = stub.generate("prompt A", task="summary")
+    other = stub.generate("prompt B", task="summary")
+
+    assert first.text == second.text
+    assert first.text != other.text
+    assert first.completion_tokens == 200
+    assert first.total_tokens == first.prompt_tokens + 200
+
+
+def test_stream_reports_first_token_latency_and_usage(stub):
+    pieces = []
+    response = stub.stream("hello", pieces.append, task="chat")
+
+    assert "".join(pieces) == response.text
+    assert 0 < response.first_token_latency < response.latency
+
+    stub.generate("x", task="chat")
+    usage = stub.usage()
+    assert usage["backend"] == "stub"
+    assert usage["tasks"]["chat"]["requests"] == 2
+    assert usage["tasks"]["chat"]["completion_tokens"] == 400
+    assert usage["tasks"]["chat"]["avg_first_token_latency"] is not None
+    assert usage["tasks"]["chat"]["estimated_cost"] == 0
+
+
+def test_env_selects_stub_backend(monkeypatch):
+    set_llm_backend(None)
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setenv("LLM_STUB_TOKENS", "42")
+    try:
+        backend = get_llm_backend()
+        assert isinstance(backend, StubBackend)
+        assert backend.output_tokens == 42
+    finally:
+        set_llm_backend(None)
+
+
+def test_summarize_content_runs_offline_on_stub(stub, tmp_path):
+    subtitle = tmp_path / "sub.txt"
+    subtitle.write_text("字幕内容", encoding="utf-8")
+
+    text, usage = summarize_content(subtitle, "subtitle")
+
+    assert "思维导图" in text
+    assert "```json" not in text
+    assert len(usage["keywords"]) == 5
+    assert usage["completion_tokens"] == 200
@@ -0,0 +1,96 @@
+"""
+Tests for in-process Prometheus metrics and batched failure telemetry
+"""
+import pytest
+
+from web_app import telemetry
+from web_app.db import get_connection
+from web_app.metrics import Counter, Histogram, render_metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("test_latency_seconds", "test", ["stage"], buckets=(0.1, 1))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    hist.observe(5, stage="a")
+
+    text = hist.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{stage="a"} 3' in text
+    assert 'test_latency_seconds_sum{stage="a"} 5.55' in text
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_events_total", "test", ["detail"])
+    counter.inc(detail='say "hi"\n')
+    counter.inc(2, detail='say "hi"\n')
+    assert 'test_events_total{detail="say \\"hi\\"\\n"} 3' in counter.render()
+
+
+@pytest.fixture
+def failure_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "telemetry.db"))
+    telemetry.init_telemetry_db()
+    telemetry.flush_failures()
+    yield
+    with telemetry._pending_lock:
+        telemetry._pending.clear()
+
+
+def _failure_rows():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, code, stage, detail, created_at FROM failure_events ORDER BY id")
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def test_record_failure_buffers_until_flush(failure_db):
+    telemetry.record_failure("u1", "DOWNLOAD_FAILED", "download", "boom")
+    telemetry.record_failure(None, "AUTH_REQUIRED", "auth")
+    assert _failure_rows() == []
+
+    assert telemetry.flush_failures() == 2
+    rows = _failure_rows()
+    assert [(r["user_id"], r["code"], r["stage"]) for r in rows] == [
+        ("u1", "DOWNLOAD_FAILED", "download"),
+        (None, "AUTH_REQUIRED", "auth"),
+    ]
+    assert rows[0]["created_at"]
+    assert 'bili_failures_total{code="DOWNLOAD_FAILED",stage="download"}' in render_metrics()
+
+
+def test_failed_flush_keeps_events_for_next_attempt(failure_db, monkeypatch):
+    telemetry.record_failure("u1", "SUMMARY_FAILED", "summary", "x")
+
+    def broken_connection():
+        raise RuntimeError("db down")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(telemetry, "_get_connection", broken_connection)
+        assert telemetry.flush_failures() == 0
+
+    assert telemetry.flush_failures() == 1
+
+
+def test_metrics_endpoint_serves_prometheus_text(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from web_app.routers import health
+
+    app = FastAPI()
+    app.include_router(health.router)
+    client = TestClient(app)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE bili_stage_duration_seconds histogram" in response.text
+
+    monkeypatch.setattr(health, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
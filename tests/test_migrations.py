@@ -0,0 +1,128 @@
+"""
+Tests for the versioned schema migration runner
+"""
+import pytest
+
+from web_app import credits, migrations
+from web_app.db import close_all_connections, get_connection
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "migrations.db"))
+    yield
+    close_all_connections()
+
+
+def _counting(monkeypatch, extra=()):
+    calls = []
+
+    def wrap(version, migrate):
+        def run():
+            calls.append(version)
+            migrate()
+        return run
+
+    entries = [(version, name, wrap(version, fn)) for version, name, fn in list(migrations.MIGRATIONS) + list(extra)]
+    monkeypatch.setattr(migrations, "MIGRATIONS", entries)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", entries[-1][0])
+    return calls
+
+
+def _schema():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name != 'schema_migrations'"
+        )
+        objects = sorted((row["type"], row["name"]) for row in cursor.fetchall())
+        columns = {}
+        for kind, name in objects:
+            if kind == "table":
+                cursor.execute(f"PRAGMA table_info({name})")
+                columns[name] = [(row[1], row[2], row[3], row[5]) for row in cursor.fetchall()]
+    return objects, columns
+
+
+def _index_names():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        return {row["name"] for row in cursor.fetchall()}
+
+
+def test_fresh_database_applies_all_and_rerun_skips_ddl(empty_db, monkeypatch):
+    calls = _counting(monkeypatch)
+
+    assert migrations.run_migrations() == len(migrations.MIGRATIONS)
+    assert calls == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version() == migrations.LATEST_VERSION
+
+    calls.clear()
+    assert migrations.run_migrations() == 0
+    assert calls == []
+
+
+def test_hot_path_indexes_exist(empty_db):
+    migrations.run_migrations()
+    assert {
+        "idx_credit_events_user_time",
+        "idx_notification_queue_status",
+        "idx_comments_summary",
+        "idx_team_summaries_team",
+        "idx_up_subscriptions_mid",
+    } <= _index_names()
+
+
+def test_existing_database_is_upgraded_in_place(empty_db):
+    # 升级前由旧的初始化函数建好的库：没有 schema_migrations，已有数据
+    credits.init_credits_db()
+    credits.ensure_user_credits("u1", initial_credits=30)
+
+    assert migrations.current_version() == 0
+    migrations.run_migrations()
+
+    assert migrations.current_version() == migrations.LATEST_VERSION
+    assert credits.get_user_credits("u1")["credits"] == 30
+
+
+def test_only_pending_migrations_run(empty_db, monkeypatch):
+    migrations.run_migrations()
+
+    def create_probe_table():
+        with get_connection() as conn:
+            conn.cursor().execute("CREATE TABLE IF NOT EXISTS migration_probe (id TEXT PRIMARY KEY)")
+
+    next_version = migrations.LATEST_VERSION + 1
+    calls = _counting(monkeypatch, extra=[(next_version, "probe", create_probe_table)])
+
+    assert migrations.run_migrations() == 1
+    assert calls == [next_version]
+    assert migrations.current_version() == next_version
+
+
+def test_init_functions_build_the_migrated_schema(tmp_path, monkeypatch):
+    # 各模块的 init_* 函数执行同一份迁移步骤，建出的结构与完整迁移一致
+    from web_app import bilibili_cache, cache, near_duplicate, telemetry
+    from web_app.init_favorites_table import init_favorites_table
+    from web_app.init_teams_tables import init_teams_tables
+    from web_app.startup.db_init import create_core_tables
+
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "migrated.db"))
+    migrations.run_migrations()
+    migrated = _schema()
+    close_all_connections()
+
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "initialized.db"))
+    for init in (
+        create_core_tables, cache.init_cache_db, credits.init_credits_db, telemetry.init_telemetry_db,
+        bilibili_cache.init_bilibili_cache_db, near_duplicate.init_near_duplicate_db,
+        init_favorites_table, init_teams_tables,
+    ):
+        init()
+    # 9、10 建的表与索引不属于任何 init_* 函数
+    migrations.apply_steps("team_summary_tables", "hot_path_indexes")
+    initialized = _schema()
+    close_all_connections()
+
+    assert migrated == initialized
@@ -0,0 +1,67 @@
+"""
+Tests for near-duplicate detection - fingerprints and the download-time cache check
+"""
+import pytest
+
+from web_app import cache, near_duplicate
+from web_app.near_duplicate import (
+    NearDuplicateFound,
+    build_fingerprint,
+    check_near_duplicate,
+    hamming_distance,
+    minhash_similarity,
+    title_minhash,
+)
+
+TRANSCRIPT = "\n".join(
+    f"[{i // 60:02d}:{i % 60:02d}] 第{i}句：今天我们讨论机器学习中的梯度下降方法与学习率调度策略，编号{i * 7 % 13}。"
+    for i in range(80)
+)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "dup.db"))
+    cache.init_cache_db()
+    near_duplicate.init_near_duplicate_db()
+
+
+def test_reupload_is_close_and_other_content_is_far():
+    original = build_fingerprint("深入理解梯度下降", 600, TRANSCRIPT)
+    # 转载：时间戳偏移、个别字差异、标题加了转载标签
+    shifted = TRANSCRIPT.replace("[00:", "[10:").replace("第3句", "第三句")
+    reupload = build_fingerprint("【转载】深入理解梯度下降", 605, shifted)
+    other = build_fingerprint("今天吃什么", 600, TRANSCRIPT.replace("梯度下降方法与学习率调度", "红烧肉和糖醋排骨做法"))
+
+    assert hamming_distance(original.simhash, reupload.simhash) <= 3
+    assert minhash_similarity(original.title_minhash, reupload.title_minhash) == 1.0
+    assert hamming_distance(original.simhash, other.simhash) > 3
+    assert minhash_similarity(original.title_minhash, other.title_minhash) < 0.5
+
+
+def test_short_or_unknown_duration_is_not_fingerprinted():
+    assert build_fingerprint("标题", 600, "太短") is None
+    assert build_fingerprint("标题", None, TRANSCRIPT) is None
+    assert title_minhash("") == []
+
+
+def test_check_offers_summary_of_near_duplicate(temp_db):
+    original_url = "https://www.bilibili.com/video/BV1orig"
+    cache.save_to_cache(original_url, "smart", "default", "原总结", TRANSCRIPT, {"total_tokens": 1})
+    lookup = lambda candidate: cache.get_cached_result(candidate, "smart", "default")
+    check_near_duplicate("bili:BV1orig", original_url, "深入理解梯度下降", 600, TRANSCRIPT, lookup)
+
+    with pytest.raises(NearDuplicateFound) as exc:
+        check_near_duplicate(
+            "bili:BV1copy", "https://www.bilibili.com/video/BV1copy",
+            "深入理解梯度下降（搬运）", 598, TRANSCRIPT, lookup
+        )
+    assert exc.value.source_url == original_url
+    assert exc.value.cached["summary"] == "原总结"
+
+    # 其他输出语言没有缓存：只登记指纹，不抛出
+    check_near_duplicate(
+        "bili:BV1copy", "https://www.bilibili.com/video/BV1copy",
+        "深入理解梯度下降", 600, TRANSCRIPT,
+        lambda candidate: cache.get_cached_result(candidate, "smart", "default", output_language="en")
+    )
@@ -0,0 +1,157 @@
+"""
+Tests for predictive pre-summarization ranking, budget and queue priority
+"""
+import asyncio
+
+import pytest
+
+from web_app.prewarm import PrewarmService
+from web_app.queue_manager import TaskQueue, TaskPriority
+
+
+def test_candidates_ranked_by_expected_demand():
+    service = PrewarmService()
+    service.add_candidate({"bvid": "BVpopular", "view": 1_000_000}, "trending")
+    service.add_candidate({"bvid": "BVsubbed", "view": 10}, "subscription", subscribers=1)
+    for _ in range(9):
+        service.add_candidate({"bvid": "BVsubbed"}, "subscription", subscribers=1)
+
+    ranked = [c.bvid for c in service.rank_candidates()]
+    assert ranked == ["BVsubbed", "BVpopular"]
+
+
+def test_budget_blocks_when_exhausted():
+    service = PrewarmService(daily_tokens=100_000, daily_videos=5)
+    service._avg_tokens = 40_000
+    assert service._has_budget()
+    service._record_usage(40_000)
+    service._inflight.add("BVinflight")
+    assert not service._has_budget()
+
+
+def test_hit_rate_counts_prewarmed_videos():
+    service = PrewarmService()
+    service.prewarmed.update({"BV1", "BV2"})
+    service.record_hit("https://www.bilibili.com/video/BV1?p=1")
+    service.record_hit("https://www.bilibili.com/video/BV1")
+    stats = service.stats()
+    assert stats["hit_requests"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+def test_interactive_tasks_run_before_background():
+    order = []
+
+    async def scenario():
+        queue = TaskQueue(max_workers=2)
+
+        async def handler(payload):
+            order.append(payload["name"])
+
+        queue.register_handler("job", handler)
+        await queue.submit("job", {"name": "background"}, priority=TaskPriority.BACKGROUND)
+        await queue.submit("job", {"name": "interactive"})
+        await queue.start()
+        await asyncio.sleep(0.2)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert order[0] == "interactive"
+    assert set(order) == {"background", "interactive"}
+
+
+
+def test_background_tasks_wait_for_a_free_slot_without_requeuing():
+    order = []
+    running = {"now": 0, "peak": 0}
+
+    async def scenario():
+        queue = TaskQueue(max_workers=3)
+
+        async def handler(payload):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.05)
+            running["now"] -= 1
+            order.append(payload["name"])
+
+        queue.register_handler("job", handler)
+        for name in ("bg1", "bg2", "bg3"):
+            await queue.submit("job", {"name": name}, priority=TaskPriority.BACKGROUND)
+        await queue.start()
+        await asyncio.sleep(0.02)
+        # 另外两个后台任务被暂存，而不是在队列里反复出队
+        assert len(queue._deferred) == 2
+        assert queue.queue.empty()
+        await asyncio.sleep(0.3)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert order == ["bg1", "bg2", "bg3"]
+    assert running["peak"] == 1
+
+def _failing_attempt(monkeypatch, fail_in):
+    from web_app import downloader, summarizer_gemini
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(downloader, "download_content", fail if fail_in == "download" else (
+        lambda url, mode: ("video.mp4", "video", "")
+    ))
+    monkeypatch.setattr(summarizer_gemini, "upload_to_gemini", fail)
+    monkeypatch.setattr(summarizer_gemini, "delete_gemini_file", lambda remote: None)
+
+
+def test_failed_prewarm_is_charged_and_not_requeued(monkeypatch):
+    service = PrewarmService(daily_tokens=1_000_000, daily_videos=10)
+    service._avg_tokens = 40_000
+    _failing_attempt(monkeypatch, fail_in="upload")
+    service._inflight.add("BVfail")
+    payload = {"url": "https://www.bilibili.com/video/BVfail", "bvid": "BVfail"}
+
+    # 第一次失败还会重试：计入 token，保留 inflight
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.handle_task(payload))
+    assert service._tokens_today == 40_000
+    assert "BVfail" in service._inflight
+
+    # 最终失败：占用视频名额，释放 inflight，并在 TTL 内跳过该视频
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.handle_task(payload))
+    assert service._tokens_today == 80_000
+    assert service._videos_today == 1
+    assert "BVfail" not in service._inflight
+    service.add_candidate({"bvid": "BVfail", "view": 10}, "trending")
+    assert "BVfail" not in service.candidates
+
+
+def test_download_failure_spends_no_tokens(monkeypatch):
+    service = PrewarmService()
+    _failing_attempt(monkeypatch, fail_in="download")
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.handle_task({"url": "u", "bvid": "BVdl", "attempt": 1}))
+    assert service._tokens_today == 0
+    assert service._videos_today == 1
+
+
+def test_prewarm_fills_the_base_extraction_cache(monkeypatch, tmp_path):
+    from pathlib import Path
+
+    from web_app import cache, downloader
+    from web_app.llm import StubBackend, set_llm_backend
+
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "prewarm.db"))
+    cache.init_cache_db()
+    monkeypatch.setattr(downloader, "download_content", lambda url, mode: (Path("video.mp4"), "video", "字幕"))
+    set_llm_backend(StubBackend(latency=0, first_token_latency=0, output_tokens=50))
+    url = "https://www.bilibili.com/video/BVwarm"
+    try:
+        asyncio.run(PrewarmService().handle_task({"url": url, "bvid": "BVwarm"}))
+    finally:
+        set_llm_backend(None)
+
+    assert cache.get_cached_result(url, "smart", "default")["usage"]["prewarmed"] is True
+    base = cache.get_base_extraction(url, "smart")
+    assert base["notes"].startswith("[00:00]")
+    assert base["transcript"] == "字幕"
@@ -0,0 +1,128 @@
+"""
+Tests for local Supabase session token verification (HS secret, JWKS, cache, remote fallback)
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from web_app import auth, session_tokens
+from web_app.session_tokens import SessionTokenVerifier
+
+SECRET = "test-jwt-secret-with-enough-entropy-0123456789"
+
+
+def _mint(key=SECRET, algorithm="HS256", headers=None, **claims):
+    payload = {
+        "sub": "user-1",
+        "email": "u1@example.com",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 3600,
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.calls = 0
+        self.auth = self
+
+    def get_user(self, token):
+        self.calls += 1
+        return SimpleNamespace(user=SimpleNamespace(id="remote-user", email="remote@example.com"))
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(auth, "supabase", fake)
+    return fake
+
+
+def _use(monkeypatch, verifier):
+    monkeypatch.setattr(auth, "session_verifier", verifier)
+    return verifier
+
+
+def test_hs256_token_is_verified_locally_and_cached(monkeypatch, remote):
+    verifier = _use(monkeypatch, SessionTokenVerifier(secret=SECRET))
+    token = _mint()
+
+    user = asyncio.run(auth.verify_session_token(token))
+    assert user == {"user_id": "user-1", "email": "u1@example.com", "source": "session"}
+    assert remote.calls == 0
+
+    monkeypatch.setattr(jwt, "decode", lambda *a, **k: pytest.fail("cached token was decoded again"))
+    assert asyncio.run(auth.verify_session_token(token)) == user
+    assert verifier._cached(token) == user
+
+
+@pytest.mark.parametrize("token", [
+    _mint(exp=int(time.time()) - 3600),
+    _mint(key="another-secret-of-sufficient-length-0000"),
+    _mint(aud="anon"),
+    "not-a-jwt",
+])
+def test_invalid_tokens_are_rejected_without_remote_call(monkeypatch, remote, token):
+    _use(monkeypatch, SessionTokenVerifier(secret=SECRET))
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(auth.verify_session_token(token))
+    assert excinfo.value.status_code == 401
+    assert remote.calls == 0
+
+
+def test_rs256_token_is_verified_against_jwks(monkeypatch, remote):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "k1", "alg": "RS256", "use": "sig"})
+
+    verifier = _use(monkeypatch, SessionTokenVerifier(jwks_url="https://auth.test/jwks"))
+    verifier.load_jwks({"keys": [jwk]})
+
+    token = _mint(key=private_key, algorithm="RS256", headers={"kid": "k1"})
+    assert asyncio.run(auth.verify_session_token(token))["user_id"] == "user-1"
+
+    rotated = _mint(key=private_key, algorithm="RS256", headers={"kid": "k2"}, sub="user-2")
+    refreshed = []
+
+    async def fake_refresh(force=False):
+        refreshed.append(force)
+
+    monkeypatch.setattr(verifier, "refresh_keys", fake_refresh)
+    assert asyncio.run(auth.verify_session_token(rotated))["user_id"] == "remote-user"
+    assert remote.calls == 1
+    assert refreshed == [False]
+
+
+def test_unknown_signing_key_falls_back_to_remote_and_caches(monkeypatch, remote):
+    _use(monkeypatch, SessionTokenVerifier())
+    token = _mint()
+
+    assert asyncio.run(auth.verify_session_token(token))["user_id"] == "remote-user"
+    assert asyncio.run(auth.verify_session_token(token))["user_id"] == "remote-user"
+    assert remote.calls == 1
+
+
+def test_refresh_keys_loads_jwks(monkeypatch):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "k1", "alg": "RS256"})
+
+    def handler(request):
+        return httpx.Response(200, json={"keys": [jwk]})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        session_tokens.httpx, "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)
+    )
+    verifier = SessionTokenVerifier(jwks_url="https://auth.test/jwks")
+    asyncio.run(verifier.refresh_keys(force=True))
+    assert set(verifier._keys) == {"k1"}
@@ -0,0 +1,80 @@
+"""
+Tests for the single-pass structured output parser
+"""
+import json
+
+import pytest
+
+from web_app.structured_output import parse_cot_steps, parse_structured_output
+
+RESPONSE = (
+    "[COT_START]\n"
+    "### 步骤 1: 内容识别\n[思考]: 这是一个科普视频\n\n"
+    "### 步骤 2：结构梳理\n[思考]：分为三部分\n第二行\n"
+    "[COT_END]\n\n---\n\n"
+    "核心摘要：正文。\n\n---\n\n"
+    "```python\nprint('kept')\n```\n\n"
+    "【思维导图】\n- 主题\n  - 分支A\n  - 分支B\n\n"
+    '```json\n{"charts": [{"type": "bar"}]}\n```\n\n'
+    '```json\n{"keywords": [{"text": "AI", "value": 10}]}\n```'
+)
+
+
+def test_extracts_cot_blocks_and_mindmap():
+    parsed = parse_structured_output(RESPONSE)
+
+    assert parsed.body.startswith("核心摘要：正文。")
+    assert "COT" not in parsed.body and "charts" not in parsed.body and "keywords" not in parsed.body
+    # 非图表代码块与正文中的分隔线保留
+    assert "print('kept')" in parsed.body and "---" in parsed.body
+    assert parsed.charts == [{"type": "bar"}]
+    assert parsed.keywords == [{"text": "AI", "value": 10}]
+    assert parsed.mindmap == "- 主题\n  - 分支A\n  - 分支B"
+    assert [s["title"] for s in parsed.cot_steps] == ["内容识别", "结构梳理"]
+    assert parsed.cot_steps[1]["thinking"] == "分为三部分\n第二行"
+
+
+def test_unstructured_cot_falls_back_to_single_step():
+    assert parse_cot_steps("随便想想") == []
+    parsed = parse_structured_output("[COT_START]随便想想[COT_END]正文")
+    assert parsed.cot_steps == [{"step": 0, "title": "AI 分析过程", "thinking": "随便想想"}]
+    assert parsed.body == "正文"
+
+
+def test_unclosed_fence_keeps_text():
+    text = "正文\n```json\n{"
+    assert parse_structured_output(text).body == text.strip()
+
+
+def test_unterminated_cot_ends_at_next_section():
+    text = (
+        "[COT_START]\n### 步骤 1: 识别\n[思考]: 科普\n\n---\n\n核心摘要：正文。\n\n"
+        '```json\n{"charts": [{"type": "bar"}]}\n```\n'
+        '```json\n{"keywords": [{"text": "AI", "value": 10}]}\n```'
+    )
+    parsed = parse_structured_output(text)
+
+    assert parsed.cot_steps == [{"step": 1, "title": "识别", "thinking": "科普"}]
+    assert parsed.body == "核心摘要：正文。"
+    assert parsed.charts == [{"type": "bar"}]
+    assert parsed.keywords == [{"text": "AI", "value": 10}]
+
+
+def test_unterminated_cot_without_sections_runs_to_end():
+    parsed = parse_structured_output("正文 [COT_START] 没有结束")
+    assert parsed.body == "正文"
+    assert parsed.cot_raw == "没有结束"
+
+
+@pytest.mark.parametrize("text", [
+    '说明\n```json\n{"a": 1}\n```',
+    '```\n{"a": 1}\n```',
+    '  {"a": 1}  ',
+])
+def test_first_json_for_compare(text):
+    assert parse_structured_output(text).first_json() == {"a": 1}
+
+
+def test_first_json_raises_on_garbage():
+    with pytest.raises(json.JSONDecodeError):
+        parse_structured_output("不是 JSON").first_json()
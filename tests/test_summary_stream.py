@@ -0,0 +1,61 @@
+"""
+Tests for streaming summary deltas - marker filtering across chunk boundaries
+"""
+import pytest
+
+from web_app.llm import StubBackend, set_llm_backend
+from web_app.summarizer_gemini import SummaryDeltaFilter, summarize_content
+
+RESPONSE = (
+    "[COT_START]\n步骤 1: 内容识别\n[思考]: 科普视频\n[COT_END]\n\n---\n\n"
+    "核心摘要：这是正文。\n\n# 🔑 关键概念\n- 要点\n\n"
+    '```json\n{"keywords": [{"text": "AI", "value": 10}]}\n```'
+)
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_filter_hides_cot_and_trailing_json_for_any_chunking():
+    for size in (1, 3, 7, 64):
+        delta_filter = SummaryDeltaFilter()
+        streamed = "".join(delta_filter.feed(c) for c in _chunks(RESPONSE, size)) + delta_filter.flush()
+        assert streamed.startswith("核心摘要：这是正文。")
+        assert "[COT" not in streamed and "思考" not in streamed
+        assert "```" not in streamed and "keywords" not in streamed
+
+
+def test_filter_passes_plain_markdown_through():
+    delta_filter = SummaryDeltaFilter()
+    text = "# 标题\n正文 [链接](http://x) `code`"
+    streamed = "".join(delta_filter.feed(c) for c in _chunks(text, 4)) + delta_filter.flush()
+    assert streamed == text
+
+
+@pytest.fixture
+def stub_backend():
+    backend = StubBackend(latency=0, first_token_latency=0, chunks=40, responses={"summary": RESPONSE})
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+def test_summarize_content_streams_deltas_and_keeps_final_result(stub_backend, tmp_path):
+    subtitle = tmp_path / "sub.txt"
+    subtitle.write_text("字幕内容", encoding="utf-8")
+    deltas = []
+
+    text, usage = summarize_content(subtitle, "subtitle", enable_cot=True, stream_callback=deltas.append)
+
+    assert "".join(deltas).strip() == text
+    assert usage["keywords"] == [{"text": "AI", "value": 10}]
+    assert usage["cot_steps"][0]["title"] == "内容识别"
+
+
+def test_filter_stops_at_base_notes_marker():
+    text = "正文段落\n\n[BASE_NOTES]\n[00:00] 笔记"
+    for size in (1, 5, 64):
+        delta_filter = SummaryDeltaFilter()
+        streamed = "".join(delta_filter.feed(c) for c in _chunks(text, size)) + delta_filter.flush()
+        assert streamed.strip() == "正文段落"
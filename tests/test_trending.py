@@ -0,0 +1,48 @@
+"""
+Tests for /api/trending/videos - snapshot serving and conditional requests
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from web_app.services.trending_service import trending_service, TrendingSnapshot
+
+
+@pytest.fixture
+def trending_snapshot():
+    original = trending_service.snapshot
+    trending_service.snapshot = TrendingSnapshot(
+        videos=[{"bvid": f"BV{i}"} for i in range(5)],
+        etag="abc",
+        updated_at=1700000000
+    )
+    yield trending_service.snapshot
+    trending_service.snapshot = original
+
+
+def test_trending_served_from_snapshot(client: TestClient, trending_snapshot):
+    response = client.get("/api/trending/videos?limit=2")
+    assert response.status_code == 200
+    assert response.json() == {"videos": [{"bvid": "BV0"}, {"bvid": "BV1"}]}
+    assert response.headers["etag"]
+    assert response.headers["last-modified"]
+
+
+def test_trending_conditional_requests_return_304(client: TestClient, trending_snapshot):
+    first = client.get("/api/trending/videos")
+
+    by_etag = client.get("/api/trending/videos", headers={"If-None-Match": first.headers["etag"]})
+    assert by_etag.status_code == 304
+
+    other_limit = client.get("/api/trending/videos?limit=3", headers={"If-None-Match": first.headers["etag"]})
+    assert other_limit.status_code == 200
+
+
+def test_if_modified_since_alone_is_not_shared_across_limits(client: TestClient, trending_snapshot):
+    first = client.get("/api/trending/videos?limit=2")
+
+    # Last-Modified 各 limit 共用，不能证明客户端持有 limit=3 的响应
+    other_limit = client.get(
+        "/api/trending/videos?limit=3", headers={"If-Modified-Since": first.headers["last-modified"]}
+    )
+    assert other_limit.status_code == 200
+    assert len(other_limit.json()["videos"]) == 3
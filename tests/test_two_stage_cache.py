@@ -0,0 +1,90 @@
+"""
+Tests for the two-stage summary cache - variant keys and base-derived summaries
+"""
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from web_app import cache
+from web_app.llm import StubBackend, set_llm_backend
+from web_app.structured_output import BASE_NOTES_MARKER
+from web_app.summarizer_gemini import summarize_from_base, summarize_with_base_notes
+
+URL = "https://www.bilibili.com/video/BV1abc"
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "cache.db"))
+    cache.init_cache_db()
+
+
+@pytest.fixture
+def stub():
+    backend = StubBackend(latency=0, first_token_latency=0, output_tokens=100)
+    set_llm_backend(backend)
+    yield backend
+    set_llm_backend(None)
+
+
+def test_template_and_language_are_part_of_the_key():
+    default = cache.generate_cache_key(URL, "smart", "default")
+    # 默认变体保持旧键格式，已有缓存不失效
+    assert default == hashlib.md5(b"BV1abc:smart:default").hexdigest()
+    assert cache.generate_cache_key(URL, "smart", "default", output_language="en") != default
+    assert cache.generate_cache_key(URL, "smart", "default", template_id="t1") != default
+
+
+def test_variants_are_cached_separately(temp_db):
+    cache.save_to_cache(URL, "smart", "default", "中文总结", "t", {})
+    cache.save_to_cache(URL, "smart", "default", "English summary", "t", {}, output_language="en")
+
+    assert cache.get_cached_result(URL, "smart", "default")["summary"] == "中文总结"
+    assert cache.get_cached_result(URL, "smart", "default", output_language="en")["summary"] == "English summary"
+    assert cache.get_cached_result(URL, "smart", "default", template_id="t1") is None
+
+
+def test_base_extraction_roundtrip(temp_db):
+    assert cache.get_base_extraction(URL, "smart") is None
+    cache.save_base_extraction(URL, "smart", "笔记", "转录", {"total_tokens": 5})
+    # 同一视频的其他链接形式也能命中
+    base = cache.get_base_extraction(URL + "?p=1", "smart")
+    assert base == {"notes": "笔记", "transcript": "转录", "usage": {"total_tokens": 5}}
+    assert cache.get_base_extraction(URL, "video") is None
+
+
+def test_cold_miss_is_one_streamed_call_that_also_yields_base_notes(stub):
+    deltas = []
+    summary, usage, notes = summarize_with_base_notes(
+        Path("video.mp4"), "video", uploaded_file=stub.upload("video.mp4"), stream_callback=deltas.append
+    )
+
+    assert notes and notes.startswith("[00:00]")
+    assert BASE_NOTES_MARKER not in summary and "[00:00]" not in summary
+    # 笔记不会流式下发给用户
+    assert "".join(deltas) and BASE_NOTES_MARKER not in "".join(deltas) and "[00:00]" not in "".join(deltas)
+    assert stub.usage()["tasks"]["summary_base"]["requests"] == 1
+
+
+def test_variants_are_text_only_calls_on_the_base(stub):
+    _, _, notes = summarize_with_base_notes(Path("video.mp4"), "video", uploaded_file=stub.upload("video.mp4"))
+
+    study, _ = summarize_from_base(notes, focus="study")
+    english, _ = summarize_from_base(notes, output_language="en")
+
+    assert study != english
+    tasks = stub.usage()["tasks"]
+    assert tasks["summary_base"]["requests"] == 1
+    assert tasks["summary"]["requests"] == 2
+
+
+def test_missing_marker_returns_summary_without_notes():
+    backend = StubBackend(latency=0, first_token_latency=0, responses={"summary_base": "只有总结正文"})
+    set_llm_backend(backend)
+    try:
+        summary, _, notes = summarize_with_base_notes(Path("a.m4a"), "audio", uploaded_file=backend.upload("a.m4a"))
+    finally:
+        set_llm_backend(None)
+    assert summary == "只有总结正文"
+    assert notes is None
@@ -0,0 +1,64 @@
+"""
+Tests for the request-scoped user context (credits + subscription in one query)
+"""
+import pytest
+
+from web_app import credits
+from web_app.metrics import DB_QUERY_SECONDS
+from web_app.routers.dashboard import is_subscription_active
+from web_app.user_context import user_context_scope
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "context.db"))
+    credits.init_credits_db()
+
+
+def _selects():
+    return DB_QUERY_SECONDS.count(backend="sqlite", operation="SELECT")
+
+
+def _activate_pro(user_id):
+    from web_app.db import get_connection
+    with get_connection() as conn:
+        conn.cursor().execute(
+            "INSERT INTO subscriptions (user_id, plan, status) VALUES (?, 'pro', 'active')", (user_id,)
+        )
+
+
+def test_summarize_admission_reads_credits_and_subscription_once(temp_db):
+    credits.ensure_user_credits("u1")
+    with user_context_scope():
+        before = _selects()
+        credits.ensure_user_credits("u1")
+        assert is_subscription_active("u1") is False
+        assert credits.get_user_credits("u1")["credits"] == credits.INITIAL_CREDITS
+        assert credits.should_charge_credits("u1") is True
+        assert _selects() - before == 1
+
+
+def test_writes_invalidate_the_request_context(temp_db):
+    with user_context_scope():
+        credits.ensure_user_credits("u1")
+        assert credits.charge_user_credits("u1", 10)
+        assert credits.get_user_credits("u1")["credits"] == credits.INITIAL_CREDITS - 10
+        credits.grant_credits("u1", 5)
+        assert credits.get_user_credits("u1")["credits"] == credits.INITIAL_CREDITS - 5
+
+
+def test_pro_subscription_is_loaded_with_credits(temp_db):
+    credits.ensure_user_credits("pro")
+    _activate_pro("pro")
+    with user_context_scope():
+        assert is_subscription_active("pro") is True
+        assert credits.charge_user_credits("pro", 10) is True
+        assert credits.get_user_credits("pro")["credits"] == credits.INITIAL_CREDITS
+
+
+def test_no_caching_outside_a_request_scope(temp_db):
+    credits.ensure_user_credits("u1")
+    before = _selects()
+    credits.get_user_credits("u1")
+    credits.get_user_credits("u1")
+    assert _selects() - before == 2
@@ -0,0 +1,133 @@
+"""
+API Key 校验缓存与用量写回
+
+程序化调用方每次请求都要查 api_keys、更新 last_used_at、再 upsert 一次 api_key_usage_daily，
+三次写入里两次只是统计。这里：
+- 按 key_hash 缓存 (key_id, user_id, is_active)，删除 / 吊销时立即失效；
+  多 worker 部署时其他进程的缓存最多在 API_KEY_CACHE_TTL 秒后失效
+- 用量与最后使用时间只在内存累加，由后台任务按 API_KEY_USAGE_FLUSH_INTERVAL 批量写库
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from .db import get_connection
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "60"))
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+API_KEY_USAGE_FLUSH_INTERVAL = float(os.getenv("API_KEY_USAGE_FLUSH_INTERVAL", "10"))
+
+_keys: "OrderedDict[str, Tuple[str, str, bool, float]]" = OrderedDict()
+_hash_by_id: Dict[str, str] = {}
+_keys_lock = threading.Lock()
+
+# (key_id, user_id, date) -> 次数；key_id -> 最后使用时间
+_usage: Dict[Tuple[str, str, str], int] = {}
+_last_used: Dict[str, str] = {}
+_usage_lock = threading.Lock()
+
+
+def get_cached_key(key_hash: str) -> Optional[Tuple[str, str, bool]]:
+    """返回缓存的 (key_id, user_id, is_active)，未命中或已过期返回 None"""
+    with _keys_lock:
+        entry = _keys.get(key_hash)
+        if entry is not None and time.monotonic() - entry[3] < API_KEY_CACHE_TTL:
+            _keys.move_to_end(key_hash)
+            CACHE_LOOKUPS.inc(cache="api_key", result="hit")
+            return entry[:3]
+        if entry is not None:
+            del _keys[key_hash]
+            _hash_by_id.pop(entry[0], None)
+    CACHE_LOOKUPS.inc(cache="api_key", result="miss")
+    return None
+
+
+def cache_key(key_hash: str, key_id: str, user_id: str, is_active: bool) -> None:
+    with _keys_lock:
+        _keys[key_hash] = (key_id, user_id, bool(is_active), time.monotonic())
+        _keys.move_to_end(key_hash)
+        _hash_by_id[key_id] = key_hash
+        while len(_keys) > API_KEY_CACHE_SIZE:
+            _, (evicted_id, _, _, _) = _keys.popitem(last=False)
+            _hash_by_id.pop(evicted_id, None)
+
+
+def invalidate_api_key(key_id: str) -> None:
+    """删除或吊销 Key 后调用"""
+    with _keys_lock:
+        key_hash = _hash_by_id.pop(key_id, None)
+        if key_hash is not None:
+            _keys.pop(key_hash, None)
+
+
+def clear_key_cache() -> None:
+    with _keys_lock:
+        _keys.clear()
+        _hash_by_id.clear()
+
+
+def record_usage(key_id: str, user_id: str) -> None:
+    """登记一次调用（不访问数据库）"""
+    now = datetime.now()
+    # 与原 DATE('now') 一致按 UTC 归日
+    day = datetime.utcnow().strftime("%Y-%m-%d")
+    with _usage_lock:
+        bucket = (key_id, user_id, day)
+        _usage[bucket] = _usage.get(bucket, 0) + 1
+        _last_used[key_id] = now.isoformat()
+
+
+def flush_usage() -> int:
+    """
+    把累加的用量一次性写入 api_key_usage_daily，并更新 api_keys.last_used_at
+
+    Returns:
+        写入的 (key, 日期) 行数；写库失败时用量放回内存，返回 0
+    """
+    with _usage_lock:
+        usage = dict(_usage)
+        last_used = dict(_last_used)
+        _usage.clear()
+        _last_used.clear()
+    if not usage and not last_used:
+        return 0
+
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            if usage:
+                cursor.executemany("""
+                    INSERT INTO api_key_usage_daily (key_id, user_id, date, count)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key_id, date)
+                    DO UPDATE SET count = api_key_usage_daily.count + excluded.count
+                """, [(key_id, user_id, day, count) for (key_id, user_id, day), count in usage.items()])
+            if last_used:
+                cursor.executemany("""
+                    UPDATE api_keys SET last_used_at = ? WHERE id = ?
+                """, [(used_at, key_id) for key_id, used_at in last_used.items()])
+    except Exception as e:
+        # 统计写入失败不能影响鉴权：放回内存，下一轮再写
+        logger.warning(f"Failed to flush API key usage ({len(usage)} rows): {e}")
+        with _usage_lock:
+            for bucket, count in usage.items():
+                _usage[bucket] = _usage.get(bucket, 0) + count
+            for key_id, used_at in last_used.items():
+                _last_used[key_id] = max(used_at, _last_used.get(key_id, used_at))
+        return 0
+    return len(usage)
+
+
+async def run_usage_flusher(interval: float = API_KEY_USAGE_FLUSH_INTERVAL):
+    """后台定期写入 API Key 用量（应用启动时创建，关闭时再补一次 flush）"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(flush_usage)
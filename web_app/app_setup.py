@@ -4,6 +4,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
+from .user_context import UserContextMiddleware
+
 
 def configure_app(app: FastAPI) -> None:
     """应用级配置：环境变量、CORS 与静态资源挂载。"""
@@ -17,6 +19,8 @@ def configure_app(app: FastAPI) -> None:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # 请求级用户上下文缓存（积分 + 订阅一次查询，请求结束即失效）
+    app.add_middleware(UserContextMiddleware)
 
     # 允许前端访问 videos 目录下的文件用于播放（CI 环境可能没有）
     videos_dir = Path("videos")
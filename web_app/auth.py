@@ -1,57 +1,68 @@
+import asyncio
 import secrets
 import hashlib
-from datetime import datetime
 from fastapi import Request, Header, HTTPException
-from supabase import create_client
+import jwt
 import os
-from .db import get_connection, using_postgres
+from .api_key_cache import cache_key, get_cached_key, record_usage
+from .db_async import fetch_one, run_db
+from .metrics import AUTH_VERIFICATIONS
+from .session_tokens import session_verifier
 
 # Supabase 客户端（如果配置）
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_ANON_KEY")
-supabase = create_client(supabase_url, supabase_key) if supabase_url and supabase_key else None
+# 首次远程校验时才创建（supabase 包导入约 0.3s，本地校验命中时用不到）
+supabase = None
+
+
+def _remote_client():
+    global supabase
+    if supabase is None and supabase_url and supabase_key:
+        from supabase import create_client
+        supabase = create_client(supabase_url, supabase_key)
+    return supabase
+
 
 async def verify_session_token(token: str) -> dict:
-    """验证 Supabase JWT Token"""
-    if not supabase:
+    """验证 Supabase JWT Token（优先本地校验签名，无法本地判断时回退到 Supabase）"""
+    if not session_verifier.configured and not _remote_client():
         raise HTTPException(
             status_code=401, 
             detail="Authentication service not configured"
         )
     
     try:
-        response = supabase.auth.get_user(token)
+        user = session_verifier.verify(token)
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(401, f"Session verification failed: {str(e)}")
+    if user:
+        return user
+    
+    if session_verifier.needs_key_refresh(token):
+        # 签名密钥可能已轮换：后台补刷 JWKS，本次先走远程校验
+        asyncio.create_task(session_verifier.refresh_keys())
+    client = _remote_client()
+    if not client:
+        raise HTTPException(401, "Session verification failed: signing key unavailable")
+    
+    try:
+        # supabase-py 是同步 HTTP 调用，放到线程中避免阻塞事件循环
+        response = await asyncio.to_thread(client.auth.get_user, token)
         if not response or not response.user:
             raise HTTPException(401, "Invalid session token")
-        return {"user_id": response.user.id, "email": response.user.email, "source": "session"}
+        user = {"user_id": response.user.id, "email": response.user.email, "source": "session"}
     except Exception as e:
+        AUTH_VERIFICATIONS.inc(method="remote", result="rejected")
         raise HTTPException(401, f"Session verification failed: {str(e)}")
+    AUTH_VERIFICATIONS.inc(method="remote", result="ok")
+    session_verifier.remember(token, user)
+    return user
 
 def record_api_key_usage(key_id: str, user_id: str) -> None:
-    """记录 API Key 使用次数（按天汇总）"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        if using_postgres():
-            cursor.execute("""
-                INSERT INTO api_key_usage_daily (key_id, user_id, date, count)
-                VALUES (?, ?, CURRENT_DATE, 1)
-                ON CONFLICT(key_id, date)
-                DO UPDATE SET count = count + 1
-            """, (key_id, user_id))
-        else:
-            cursor.execute("""
-                INSERT INTO api_key_usage_daily (key_id, user_id, date, count)
-                VALUES (?, ?, DATE('now'), 1)
-                ON CONFLICT(key_id, date)
-                DO UPDATE SET count = count + 1
-            """, (key_id, user_id))
-        conn.commit()
-    except Exception:
-        # Usage tracking should never block auth
-        conn.rollback()
-    finally:
-        conn.close()
+    """记录 API Key 使用次数（内存累加，后台按天汇总写库，见 api_key_cache.flush_usage）"""
+    record_usage(key_id, user_id)
+
 
 async def verify_api_key(api_key: str) -> dict:
     """验证 API Key 并返回用户信息"""
@@ -60,40 +71,28 @@ async def verify_api_key(api_key: str) -> dict:
     
     key_hash = hashlib.sha256(api_key.encode()).hexdigest()
     
-    # 从数据库查询
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
+    entry = get_cached_key(key_hash)
+    if entry is None:
+        row = await fetch_one("""
             SELECT id, user_id, is_active 
             FROM api_keys 
             WHERE key_hash = ?
         """, (key_hash,))
         
-        row = cursor.fetchone()
-        
         if not row:
             raise HTTPException(401, "Invalid API key")
         
-        key_id, user_id, is_active = row
-        
-        if not is_active:
-            raise HTTPException(401, "API key has been revoked")
-        
-        # 更新最后使用时间（后台异步）
-        cursor.execute("""
-            UPDATE api_keys 
-            SET last_used_at = ? 
-            WHERE key_hash = ?
-        """, (datetime.now().isoformat(), key_hash))
-        conn.commit()
-        
-        record_api_key_usage(key_id, user_id)
-        return {"user_id": user_id, "source": "api_key", "api_key_id": key_id}
+        entry = (row[0], row[1], bool(row[2]))
+        cache_key(key_hash, *entry)
+    
+    key_id, user_id, is_active = entry
+    
+    if not is_active:
+        raise HTTPException(401, "API key has been revoked")
     
-    finally:
-        conn.close()
+    # 最后使用时间与当日用量在内存累加，由后台任务批量写库
+    record_api_key_usage(key_id, user_id)
+    return {"user_id": user_id, "source": "api_key", "api_key_id": key_id}
 
 async def get_current_user(
     request: Request,
@@ -112,7 +111,7 @@ async def get_current_user(
     if x_api_key:
         user = await verify_api_key(x_api_key)
         from .credits import ensure_user_credits
-        ensure_user_credits(user["user_id"])
+        await run_db(ensure_user_credits, user["user_id"])
         return user
     
     # 优先级2: Session Token
@@ -120,7 +119,7 @@ async def get_current_user(
     if auth_header.startswith("Bearer "):
         user = await verify_session_token(auth_header[7:])
         from .credits import ensure_user_credits
-        ensure_user_credits(user["user_id"])
+        await run_db(ensure_user_credits, user["user_id"])
         return user
     
     # 两者都无
@@ -1,17 +1,34 @@
 """
 批量总结服务
-支持多视频并发处理
+支持多视频分阶段流水线处理
 """
 import asyncio
+import json
+import os
 import uuid
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 各阶段并发上限（LLM 为同时进行的 Gemini 调用数，总结与转录各占一个名额）
+BATCH_DOWNLOAD_CONCURRENCY = int(os.getenv("BATCH_DOWNLOAD_CONCURRENCY", "3"))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "2"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_STAGE_QUEUE_SIZE = int(os.getenv("BATCH_STAGE_QUEUE_SIZE", "4"))
+
+# 单个 URL 的生命周期阶段
+EVENT_QUEUED = "queued"
+EVENT_DOWNLOADING = "downloading"
+EVENT_SUMMARIZING = "summarizing"
+EVENT_DONE = "done"
+EVENT_ERROR = "error"
+EVENT_COMPLETE = "complete"  # 整个批次结束（url 为空）
+EVENT_SOURCE_ERROR = "source_error"  # 流式来源中途失败，批次只包含部分条目（url 为空）
+
 class BatchStatus(Enum):
     PENDING = "pending"
     RUNNING = "running"
@@ -32,21 +49,108 @@ class BatchJob:
     created_at: float = field(default_factory=time.time)
     completed_at: Optional[float] = None
     progress: int = 0  # 0-100
+    expected_total: int = 0  # 流式任务的预计总数（URL 仍在陆续加入时用于计算进度）
+    credit_cost: int = 0  # 每个成功条目的积分单价
+    reserved_credits: int = 0  # 创建时预留的积分，完成后按条目结算
+    credit_hold_id: Optional[str] = None  # credit_ledger 预留 ID（进程崩溃时由过期释放任务退还）
+    cached_urls: Set[str] = field(default_factory=set)  # 直接由缓存返回的 URL（不计费）
+    source_error: Optional[str] = None  # 流式来源失败原因（此时 urls 只是部分条目）
+    events: List[Dict[str, Any]] = field(default_factory=list)  # 只追加的生命周期事件，下标即游标
+    _updated: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.completed_at is not None
+
+    def emit(self, stage: str, url: str = "", **data) -> Dict[str, Any]:
+        """追加一条生命周期事件并唤醒所有等待者"""
+        event = {"seq": len(self.events), "url": url, "stage": stage, "ts": time.time(), **data}
+        self.events.append(event)
+        # 唤醒当前等待者后换一个新的 Event，后续等待者等下一次更新
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+        return event
+
+    def events_since(self, cursor: int) -> List[Dict[str, Any]]:
+        """返回游标之后的事件（游标为已收到的事件数）"""
+        return self.events[max(cursor, 0):]
+
+    async def wait_for_events(self, cursor: int, timeout: float) -> bool:
+        """等待游标之后出现新事件；超时返回 False"""
+        if cursor < len(self.events):
+            return True
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return cursor < len(self.events)
+
+@dataclass
+class _PipelineItem:
+    """在流水线各阶段之间传递的单个 URL 的中间状态"""
+    url: str
+    video_path: Any = None
+    media_type: Optional[str] = None
+    transcript: Optional[str] = None
+    remote_file: Any = None
 
 class BatchSummarizeService:
-    def __init__(self, max_concurrent: int = 2):
+    """
+    批量总结流水线
+    - 下载 / 上传 / LLM 三个阶段各自限流（全局共享，跨批次生效）
+    - 阶段之间用有界队列衔接，网络与 LLM 调用可以重叠
+    """
+    def __init__(
+        self,
+        download_concurrency: int = BATCH_DOWNLOAD_CONCURRENCY,
+        upload_concurrency: int = BATCH_UPLOAD_CONCURRENCY,
+        llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+        queue_size: int = BATCH_STAGE_QUEUE_SIZE
+    ):
         self.jobs: Dict[str, BatchJob] = {}
-        self.max_concurrent = max_concurrent
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.download_concurrency = download_concurrency
+        self.upload_concurrency = upload_concurrency
+        self.llm_concurrency = llm_concurrency
+        self.queue_size = queue_size
+        self.download_slots = asyncio.Semaphore(download_concurrency)
+        self.upload_slots = asyncio.Semaphore(upload_concurrency)
+        self.llm_slots = asyncio.Semaphore(llm_concurrency)
+    
+    async def plan_batch(
+        self,
+        urls: List[str],
+        mode: str = "smart",
+        focus: str = "default"
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """
+        批次规划：先用一次查询把所有 URL 对照缓存
+        
+        Returns:
+            (命中的缓存结果 {url: result}, 需要实际处理的 URL 列表)
+        """
+        from .cache import get_cached_results
+        
+        unique_urls = list(dict.fromkeys(urls))
+        try:
+            hits = await asyncio.to_thread(get_cached_results, unique_urls, mode, focus)
+        except Exception as e:
+            logger.warning(f"Batch cache planning failed: {e}")
+            hits = {}
+        misses = [url for url in unique_urls if url not in hits]
+        return hits, misses
     
     async def create_batch(
         self,
         user_id: str,
         urls: List[str],
         mode: str = "smart",
-        focus: str = "default"
+        focus: str = "default",
+        cached_results: Optional[Dict[str, Dict[str, Any]]] = None,
+        credit_cost: int = 0,
+        reserved_credits: int = 0,
+        credit_hold_id: Optional[str] = None
     ) -> str:
-        """创建批量对任务"""
+        """创建批量对任务（cached_results 中的 URL 立即返回，不进入流水线）"""
         if len(urls) > 20:
             raise ValueError("单个批次最多支持 20 个 URL")
         
@@ -55,15 +159,50 @@ class BatchSummarizeService:
         job = BatchJob(
             id=job_id,
             user_id=user_id,
-            urls=urls,
+            urls=list(dict.fromkeys(urls)),
             mode=mode,
-            focus=focus
+            focus=focus,
+            credit_cost=credit_cost,
+            reserved_credits=reserved_credits,
+            credit_hold_id=credit_hold_id
         )
         
         self.jobs[job_id] = job
         
         # 启动异步后台处理
-        asyncio.create_task(self._process_batch(job))
+        asyncio.create_task(self._process_batch(job, cached_results=cached_results))
+        
+        return job_id
+    
+    async def create_streaming_batch(
+        self,
+        user_id: str,
+        url_source: AsyncIterator[str],
+        mode: str = "smart",
+        focus: str = "default",
+        expected_total: int = 0,
+        max_urls: int = 100,
+        credit_cost: int = 0,
+        reserved_credits: int = 0,
+        credit_hold_id: Optional[str] = None
+    ) -> str:
+        """创建流式批量任务：URL 边抓取边入队，无需等待来源全部返回"""
+        job_id = f"BATCH_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        
+        job = BatchJob(
+            id=job_id,
+            user_id=user_id,
+            urls=[],
+            mode=mode,
+            focus=focus,
+            expected_total=min(expected_total, max_urls),
+            credit_cost=credit_cost,
+            reserved_credits=reserved_credits,
+            credit_hold_id=credit_hold_id
+        )
+        
+        self.jobs[job_id] = job
+        asyncio.create_task(self._process_batch(job, url_source, max_urls))
         
         return job_id
     
@@ -71,74 +210,231 @@ class BatchSummarizeService:
         """获取任务状态"""
         return self.jobs.get(job_id)
     
-    async def _process_batch(self, job: BatchJob):
-        """核心处理循环"""
+    async def _process_batch(
+        self,
+        job: BatchJob,
+        url_source: Optional[AsyncIterator[str]] = None,
+        max_urls: int = 100,
+        cached_results: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        """
+        核心处理流水线：
+        缓存检查 → 下载 → 上传 Gemini → 总结/转录（并发），
+        各阶段独立限流，阶段之间通过有界队列衔接（下游拥塞时上游自动等待）。
+        """
+        from .cache import get_cached_result
+        
         job.status = BatchStatus.RUNNING
-        total = len(job.urls)
-        completed = 0
         
-        async def process_single(url: str):
-            nonlocal completed
-            async with self.semaphore:
+        download_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        upload_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        llm_q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        
+        workers = (
+            [asyncio.create_task(self._stage_worker(job, download_q, upload_q, self._download))
+             for _ in range(self.download_concurrency)]
+            + [asyncio.create_task(self._stage_worker(job, upload_q, llm_q, self._upload))
+               for _ in range(self.upload_concurrency)]
+            + [asyncio.create_task(self._stage_worker(job, llm_q, None, self._summarize))
+               for _ in range(self.llm_concurrency)]
+        )
+        
+        async def admit(url: str):
+            job.emit(EVENT_QUEUED, url)
+            if cached_results is not None:
+                # 规划阶段已批量查过缓存
+                cached = cached_results.get(url)
+            else:
                 try:
-                    # 调用单个总结逻辑
-                    result = await self._summarize_single(url, job.mode, job.focus)
-                    job.results[url] = result
+                    cached = await asyncio.to_thread(get_cached_result, url, job.mode, job.focus)
                 except Exception as e:
-                    logger.error(f"Batch item failed: {url} - {e}")
-                    job.errors[url] = str(e)
-                finally:
-                    completed += 1
-                    job.progress = int(completed / total * 100)
+                    logger.warning(f"Batch cache lookup failed: {url} - {e}")
+                    cached = None
+            if cached:
+                # 缓存命中：不进入下载阶段
+                self._record_result(job, url, {
+                    "summary": cached["summary"],
+                    "transcript": cached["transcript"],
+                    "url": url
+                }, cached=True)
+                return
+            await download_q.put(_PipelineItem(url=url))
         
-        # 并发执行
-        await asyncio.gather(*[process_single(url) for url in job.urls])
+        try:
+            if url_source is None:
+                for url in job.urls:
+                    await admit(url)
+            else:
+                # 流式来源：每到一个 URL 立即入队
+                try:
+                    async for url in url_source:
+                        if len(job.urls) >= max_urls:
+                            break
+                        if url in job.urls:
+                            continue
+                        job.urls.append(url)
+                        await admit(url)
+                except Exception as e:
+                    logger.error(f"BatchJob {job.id} url source failed: {e}")
+                    job.source_error = str(e)
+                    job.emit(EVENT_SOURCE_ERROR, error=str(e), received=len(job.urls))
+                # 来源已结束：预计总数改为实际入队的条目数（收藏夹 media_count 含失效视频）
+                job.expected_total = len(job.urls)
+                self._update_progress(job)
+            
+            # 依次排空各阶段（上游 task_done 之前已将条目放入下游队列）
+            await download_q.join()
+            await upload_q.join()
+            await llm_q.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        total = len(job.urls)
         
         # 设置完成状态
         job.completed_at = time.time()
-        if len(job.results) == total:
+        job.progress = 100
+        if total and len(job.results) == total and not job.source_error:
             job.status = BatchStatus.COMPLETED
         elif len(job.results) > 0:
             job.status = BatchStatus.PARTIAL
         else:
             job.status = BatchStatus.FAILED
+        settlement = await self._settle_credits(job)
+        if job.source_error:
+            settlement["source_error"] = job.source_error
+        job.emit(EVENT_COMPLETE, status=job.status.value, progress=job.progress, **settlement)
             
         logger.info(f"BatchJob {job.id} completed. Success: {len(job.results)}, Fail: {len(job.errors)}")
 
-    async def _summarize_single(self, url: str, mode: str, focus: str) -> Dict[str, Any]:
-        """执行单次总结的完整链路"""
-        # 注意：这里我们尽量重用 main.py/queue_manager 的逻辑
-        # 为了避免循环依赖和冗余代码，我们直接调用底层的实现函数
+    async def _stage_worker(
+        self,
+        job: BatchJob,
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue],
+        handler: Callable[[BatchJob, "_PipelineItem"], Awaitable[Optional[Dict[str, Any]]]]
+    ):
+        """阶段工作协程：处理条目后交给下一阶段；最后一个阶段负责记录结果"""
+        while True:
+            item = await inbox.get()
+            try:
+                result = await handler(job, item)
+                if outbox is not None:
+                    await outbox.put(item)
+                else:
+                    self._record_result(job, item.url, result)
+            except Exception as e:
+                logger.error(f"Batch item failed: {item.url} - {e}")
+                self._release_remote_file(item)
+                self._record_error(job, item.url, e)
+            finally:
+                inbox.task_done()
+
+    async def _settle_credits(self, job: BatchJob) -> Dict[str, int]:
+        """按条目结算预留积分：只有实际跑完流水线的成功条目计费，缓存命中与失败条目退还"""
+        if not job.credit_hold_id:
+            return {}
+        from .credit_ledger import settle
+        
+        consumed = [
+            {"cost": job.credit_cost, "metadata": json.dumps({"batch_job_id": job.id, "url": url})}
+            for url in job.results
+            if url not in job.cached_urls
+        ][:job.reserved_credits // max(job.credit_cost, 1)]
+        try:
+            refunds = await asyncio.to_thread(settle, [(job.credit_hold_id, consumed)])
+        except Exception as e:
+            logger.error(f"BatchJob {job.id} credit settlement failed: {e}")
+            return {}
+        if job.credit_hold_id not in refunds:
+            # 预留已被过期释放任务整笔退还
+            logger.warning(f"BatchJob {job.id} credit hold already settled or released")
+            return {}
+        refunded = refunds[job.credit_hold_id]
+        return {"credits_charged": job.reserved_credits - refunded, "credits_refunded": refunded}
+
+    def _update_progress(self, job: BatchJob) -> None:
+        finished = len(job.results) + len(job.errors)
+        job.progress = int(finished / max(len(job.urls), job.expected_total, 1) * 100)
+
+    def _record_result(self, job: BatchJob, url: str, result: Dict[str, Any], cached: bool = False) -> None:
+        job.results[url] = result
+        if cached:
+            job.cached_urls.add(url)
+        self._update_progress(job)
+        job.emit(EVENT_DONE, url, progress=job.progress, cached=cached)
+
+    def _record_error(self, job: BatchJob, url: str, error: Exception) -> None:
+        job.errors[url] = str(error)
+        self._update_progress(job)
+        job.emit(EVENT_ERROR, url, progress=job.progress, error=str(error))
+
+    def _release_remote_file(self, item: "_PipelineItem") -> None:
+        if item.remote_file is None:
+            return
+        from .summarizer_gemini import delete_gemini_file
+        remote_file, item.remote_file = item.remote_file, None
+        asyncio.get_running_loop().run_in_executor(None, delete_gemini_file, remote_file)
+
+    # ---- 流水线阶段 ----
+    # 注意：这里我们尽量重用 main.py/queue_manager 的逻辑
+    # 为了避免循环依赖和冗余代码，我们直接调用底层的实现函数
+
+    async def _download(self, job: BatchJob, item: "_PipelineItem") -> None:
+        """阶段 1：下载（字幕优先，同步函数转异步）"""
         from .downloader import download_content
-        from .summarizer_gemini import summarize_content, extract_ai_transcript, upload_to_gemini
-        from .cache import save_to_cache  # 添加缓存导入
         
-        loop = asyncio.get_event_loop()
+        async with self.download_slots:
+            job.emit(EVENT_DOWNLOADING, item.url)
+            item.video_path, item.media_type, item.transcript = await asyncio.to_thread(
+                download_content, item.url, job.mode
+            )
+
+    async def _upload(self, job: BatchJob, item: "_PipelineItem") -> None:
+        """阶段 2：上传 Gemini（仅音视频）"""
+        from .summarizer_gemini import upload_to_gemini
         
-        # 1. 下载 (同步函数转异步)
-        video_path, media_type, transcript = await loop.run_in_executor(
-            None, download_content, url, mode
-        )
+        job.emit(EVENT_SUMMARIZING, item.url)
+        if item.media_type not in ['video', 'audio']:
+            return
+        async with self.upload_slots:
+            item.remote_file = await asyncio.to_thread(upload_to_gemini, item.video_path, None)
+
+    async def _summarize(self, job: BatchJob, item: "_PipelineItem") -> Dict[str, Any]:
+        """阶段 3：总结与转录并发执行，完成后写入缓存/历史记录"""
+        from .summarizer_gemini import summarize_content, extract_ai_transcript
+        from .cache import save_to_cache
         
-        # 2. 上传 Gemini
-        remote_file = None
-        if media_type in ['video', 'audio']:
-            remote_file = await loop.run_in_executor(
-                None, upload_to_gemini, video_path, None
-            )
+        async def run_summary():
+            async with self.llm_slots:
+                return await asyncio.to_thread(
+                    summarize_content, item.video_path, item.media_type, None, job.focus, item.remote_file
+                )
         
-        # 3. 总结
-        summary = await loop.run_in_executor(
-            None, summarize_content, video_path, media_type, None, focus, remote_file
-        )
+        async def run_transcript():
+            if item.transcript or item.media_type not in ['audio', 'video']:
+                return item.transcript
+            async with self.llm_slots:
+                return await asyncio.to_thread(
+                    extract_ai_transcript, item.video_path, None, item.remote_file
+                )
         
-        # 4. 转录 (如果需要)
-        if not transcript and media_type in ['audio', 'video']:
-            transcript = await loop.run_in_executor(
-                None, extract_ai_transcript, video_path, None, remote_file
+        try:
+            summary, transcript = await asyncio.gather(
+                run_summary(), run_transcript(), return_exceptions=True
             )
+        finally:
+            self._release_remote_file(item)
+        
+        if isinstance(summary, BaseException):
+            raise summary
+        if isinstance(transcript, BaseException):
+            # 与交互式路径一致：转录失败不影响总结结果
+            logger.warning(f"Batch transcript failed: {item.url} - {transcript}")
+            transcript = None
         
-        # 5. 保存到缓存/历史记录（关键！）
         # 注意：summary 是元组 (summary_text, usage_dict)
         if isinstance(summary, tuple):
             summary_text, usage = summary
@@ -147,12 +443,12 @@ class BatchSummarizeService:
             usage = None
         
         # 保存到 cache 表（会自动成为历史记录）
-        save_to_cache(url, mode, focus, summary_text, transcript or '', usage)
+        await asyncio.to_thread(save_to_cache, item.url, job.mode, job.focus, summary_text, transcript or '', usage)
             
         return {
             "summary": summary_text,
             "transcript": transcript,
-            "url": url
+            "url": item.url
         }
 
-batch_service = BatchSummarizeService(max_concurrent=2)
+batch_service = BatchSummarizeService()
@@ -1,11 +1,33 @@
 """
 B站视频缓存管理
 避免重复请求同一个UP主的视频列表
+
+- L1：进程内 LRU（有容量上限）
+- L2：可选的数据库持久层（重启不丢失，多 worker 共享）
+- stale-while-revalidate：过期但仍在宽限期内的数据立即返回，同时只触发一次后台刷新
 """
-import time
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+import asyncio
 import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from dataclasses import dataclass, replace
+
+from .db import get_connection
+from .metrics import CACHE_LOOKUPS
+from .migrations import apply_steps
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_TTL = 3600       # 成功数据新鲜期：1小时
+STALE_TTL = 86400        # 过期后仍可返回旧数据的宽限期：24小时
+FAILURE_TTL = 300        # 失败缓存：5分钟
+FAILURE_JITTER = 0.2     # 失败 TTL 抖动比例（±20%），避免集中过期
+
 
 @dataclass
 class CacheEntry:
@@ -13,75 +35,262 @@ class CacheEntry:
     data: Any
     timestamp: float
     ttl: int  # 存活时间（秒）
-    
+    stale_ttl: int = 0  # 过期后仍可作为旧数据返回的时间（秒）
+    failed: bool = False
+    retry_after: float = 0  # 刷新失败后，到此时刻之前不再刷新（不延长旧数据的宽限期）
+
     def is_expired(self) -> bool:
-        """检查是否过期"""
-        return time.time() - self.timestamp > self.ttl
+        """检查是否过期（需要刷新）"""
+        now = time.time()
+        return now - self.timestamp > self.ttl and now >= self.retry_after
+
+    def is_servable(self) -> bool:
+        """检查是否仍可返回（新鲜或处于宽限期内）"""
+        return time.time() - self.timestamp <= self.ttl + self.stale_ttl
+
+
+def init_bilibili_cache_db():
+    """初始化 L2 缓存表（表结构定义在 migrations 中）"""
+    apply_steps("bilibili_cache_tables", "bilibili_cache_retry_after")
 
 
 class BilibiliVideoCache:
     """
     UP主视频列表缓存
-    - 成功获取的数据缓存1小时
-    - 失败的请求缓存5分钟（避免重复失败）
+    - 成功获取的数据缓存1小时，之后24小时内可作为旧数据返回并后台刷新
+    - 失败的请求缓存5分钟（带随机抖动，避免重复失败与集中过期）
+    - 超过容量上限时淘汰最久未使用的条目
     """
-    def __init__(self):
-        self._cache: Dict[str, CacheEntry] = {}
-    
+    def __init__(self, max_entries: int = 512, persistent: bool = False):
+        self._cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._max_entries = max_entries
+        self._persistent = persistent
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
     def get(self, mid: str) -> Optional[List[Dict[str, Any]]]:
         """
         获取缓存的视频列表
-        
+
         Args:
             mid: UP主ID
-            
+
         Returns:
             视频列表，如果未命中或过期则返回None
         """
-        entry = self._cache.get(mid)
+        entry = self._get_entry(mid)
         if entry and not entry.is_expired():
             return entry.data
-        elif entry and entry.is_expired():
-            # 清理过期条目
-            del self._cache[mid]
         return None
-    
+
     def set_success(self, mid: str, videos: List[Dict[str, Any]]) -> None:
         """
         缓存成功获取的视频列表
-        
+
         Args:
             mid: UP主ID
             videos: 视频列表
         """
-        self._cache[mid] = CacheEntry(
+        self._put(mid, CacheEntry(
             data=videos,
             timestamp=time.time(),
-            ttl=3600  # 1小时
-        )
-    
+            ttl=SUCCESS_TTL,
+            stale_ttl=STALE_TTL
+        ))
+
     def set_failure(self, mid: str) -> None:
         """
         缓存失败的请求（避免短时间内重复请求）
-        
+
+        如果已有可用的旧数据，则保留旧数据继续返回，只推迟下一次刷新；
+        旧数据的时间戳不变，宽限期（stale_ttl）到期后不再返回。
+
         Args:
             mid: UP主ID
         """
-        self._cache[mid] = CacheEntry(
+        ttl = int(FAILURE_TTL * random.uniform(1 - FAILURE_JITTER, 1 + FAILURE_JITTER))
+        previous = self._get_entry(mid)
+        if previous and not previous.failed and previous.is_servable():
+            self._put(mid, replace(previous, retry_after=time.time() + ttl))
+            return
+        self._put(mid, CacheEntry(
             data=[],
             timestamp=time.time(),
-            ttl=300  # 5分钟
-        )
-    
+            ttl=ttl,
+            failed=True
+        ))
+
+    async def get_or_fetch(
+        self,
+        mid: str,
+        fetcher: Callable[[], Awaitable[Optional[List[Dict[str, Any]]]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        按 stale-while-revalidate 语义获取视频列表
+
+        - 新鲜命中：直接返回
+        - 旧数据命中：立即返回旧数据，并发起（唯一的）后台刷新
+        - 未命中：等待抓取结果，同一 mid 的并发请求共享一次抓取
+
+        Args:
+            mid: 缓存键（通常为 UP主ID）
+            fetcher: 抓取函数，返回空列表/None 视为失败
+        """
+        entry = self._get_entry(mid)
+        if entry is None and self._persistent:
+            entry = await asyncio.to_thread(self._load_l2, mid)
+
+        if entry and not entry.is_expired():
+            CACHE_LOOKUPS.inc(cache="bilibili_videos", result="hit")
+            return entry.data
+
+        if entry and not entry.failed and entry.is_servable():
+            CACHE_LOOKUPS.inc(cache="bilibili_videos", result="stale")
+            self._refresh(mid, fetcher)
+            return entry.data
+
+        CACHE_LOOKUPS.inc(cache="bilibili_videos", result="miss")
+        return await asyncio.shield(self._refresh(mid, fetcher))
+
     def clear(self) -> None:
         """清空缓存"""
-        self._cache.clear()
-    
+        with self._lock:
+            self._cache.clear()
+
     def remove(self, mid: str) -> None:
         """删除特定UP主的缓存"""
-        if mid in self._cache:
-            del self._cache[mid]
+        with self._lock:
+            self._cache.pop(mid, None)
+        if self._persistent:
+            self._delete_l2(mid)
+
+    def _get_entry(self, mid: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._cache.get(mid)
+            if entry is None:
+                return None
+            if not entry.is_servable():
+                # 清理过期条目
+                del self._cache[mid]
+                return None
+            self._cache.move_to_end(mid)
+            return entry
+
+    def _put(self, mid: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._cache[mid] = entry
+            self._cache.move_to_end(mid)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        if self._persistent:
+            self._store_l2(mid, entry)
+
+    def _refresh(self, mid: str, fetcher) -> asyncio.Task:
+        """发起后台刷新；同一 mid 同时只有一个刷新任务"""
+        task = self._inflight.get(mid)
+        if task is None or task.done():
+            task = asyncio.create_task(self._do_refresh(mid, fetcher))
+            self._inflight[mid] = task
+        return task
+
+    async def _do_refresh(self, mid: str, fetcher) -> List[Dict[str, Any]]:
+        try:
+            videos = await fetcher()
+        except Exception as e:
+            logger.warning(f"Bilibili cache refresh failed (key={mid}): {e}")
+            videos = None
+
+        try:
+            if videos:
+                await asyncio.to_thread(self.set_success, mid, videos)
+            else:
+                await asyncio.to_thread(self.set_failure, mid)
+            entry = self._get_entry(mid)
+            return entry.data if entry else []
+        finally:
+            self._inflight.pop(mid, None)
+
+    def _load_l2(self, mid: str) -> Optional[CacheEntry]:
+        try:
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT data, failed, ttl, stale_ttl, cached_at, retry_after
+                    FROM bilibili_video_cache
+                    WHERE cache_key = ?
+                """, (mid,))
+                row = cursor.fetchone()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Bilibili L2 cache read failed: {e}")
+            return None
+
+        if not row:
+            return None
+        entry = CacheEntry(
+            data=json.loads(row["data"]),
+            timestamp=float(row["cached_at"]),
+            ttl=int(row["ttl"]),
+            stale_ttl=int(row["stale_ttl"]),
+            failed=bool(row["failed"]),
+            retry_after=float(row["retry_after"])
+        )
+        if not entry.is_servable():
+            return None
+        with self._lock:
+            self._cache[mid] = entry
+            self._cache.move_to_end(mid)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _store_l2(self, mid: str, entry: CacheEntry) -> None:
+        try:
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO bilibili_video_cache (cache_key, data, failed, ttl, stale_ttl, cached_at, retry_after)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        data = EXCLUDED.data,
+                        failed = EXCLUDED.failed,
+                        ttl = EXCLUDED.ttl,
+                        stale_ttl = EXCLUDED.stale_ttl,
+                        cached_at = EXCLUDED.cached_at,
+                        retry_after = EXCLUDED.retry_after
+                """, (
+                    mid,
+                    json.dumps(entry.data, ensure_ascii=False),
+                    1 if entry.failed else 0,
+                    entry.ttl,
+                    entry.stale_ttl,
+                    entry.timestamp,
+                    entry.retry_after
+                ))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Bilibili L2 cache write failed: {e}")
+
+    def _delete_l2(self, mid: str) -> None:
+        try:
+            conn = get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM bilibili_video_cache WHERE cache_key = ?", (mid,))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Bilibili L2 cache delete failed: {e}")
 
 
 # 全局缓存实例
-video_cache = BilibiliVideoCache()
+video_cache = BilibiliVideoCache(
+    max_entries=int(os.getenv("BILIBILI_CACHE_MAX_ENTRIES", "512")),
+    persistent=os.getenv("BILIBILI_CACHE_PERSIST", "1") == "1"
+)
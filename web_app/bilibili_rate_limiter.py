@@ -40,6 +40,7 @@ class BilibiliRateLimiter:
                 wait_time = (1 - self.tokens) / self.rate
                 await asyncio.sleep(wait_time)
                 self.tokens = 0
+                self.last_update = time.time()
             else:
                 self.tokens -= 1
 
@@ -1,83 +1,85 @@
 """
 缓存模块 - 使用 SQLite 存储视频总结结果
 避免重复分析相同视频，节省 API 费用
+
+两级缓存：
+- video_base_cache：每个视频一份昂贵的基础提取（详细笔记 + 转录），与视角/模板/语言无关
+- video_cache：按 侧重点 / 模板 / 输出语言 区分的总结变体，可由基础提取以纯文本调用廉价生成
 """
 
 import hashlib
 import json
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from .db import get_connection, using_postgres
+from .metrics import CACHE_LOOKUPS, STAGE_SECONDS
+from .migrations import apply_steps
 
 
 def init_cache_db():
-    """初始化缓存数据库"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    if using_postgres():
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS video_cache (
-                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                video_id TEXT NOT NULL,
-                url TEXT NOT NULL,
-                mode TEXT NOT NULL,
-                focus TEXT NOT NULL,
-                cache_key TEXT UNIQUE NOT NULL,
-                summary TEXT,
-                transcript TEXT,
-                mindmap TEXT,
-                usage_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    else:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS video_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT NOT NULL,
-                url TEXT NOT NULL,
-                mode TEXT NOT NULL,
-                focus TEXT NOT NULL,
-                cache_key TEXT UNIQUE NOT NULL,
-                summary TEXT,
-                transcript TEXT,
-                mindmap TEXT,
-                usage_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    
-    # 创建索引
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_key ON video_cache(cache_key)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_video_id ON video_cache(video_id)")
-    
-    conn.commit()
-    conn.close()
+    """初始化缓存数据库（表结构定义在 migrations 中）"""
+    apply_steps("cache_tables")
 
 
-def generate_cache_key(url: str, mode: str, focus: str) -> str:
-    """生成缓存键"""
-    # 提取视频 ID（BV号）
+def _extract_video_id(url: str) -> str:
+    """提取视频 ID（BV号），提取不到时使用完整 URL"""
     import re
     bv_match = re.search(r'BV[a-zA-Z0-9]+', url)
-    video_id = bv_match.group(0) if bv_match else url
+    return bv_match.group(0) if bv_match else url
+
+
+def generate_cache_key(
+    url: str,
+    mode: str,
+    focus: str,
+    template_id: Optional[str] = None,
+    output_language: str = "zh"
+) -> str:
+    """
+    生成缓存键
     
-    # 组合生成唯一键
-    key_string = f"{video_id}:{mode}:{focus}"
+    模板与输出语言都会改变总结内容，必须参与缓存键；
+    默认变体（无模板、中文）保持旧的键格式，已有缓存继续有效。
+    """
+    key_string = f"{_extract_video_id(url)}:{mode}:{focus}"
+    if template_id or output_language != "zh":
+        key_string += f":{template_id or ''}:{output_language}"
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def get_cached_result(url: str, mode: str, focus: str) -> Optional[Dict[str, Any]]:
+def generate_base_key(url: str, mode: str) -> str:
+    """基础提取的缓存键：只与视频和下载模式有关"""
+    return hashlib.md5(f"base:{_extract_video_id(url)}:{mode}".encode()).hexdigest()
+
+
+def get_cached_result(
+    url: str,
+    mode: str,
+    focus: str,
+    template_id: Optional[str] = None,
+    output_language: str = "zh"
+) -> Optional[Dict[str, Any]]:
     """
     获取缓存的总结结果
     
     Returns:
         如果有缓存返回 dict，否则返回 None
     """
-    cache_key = generate_cache_key(url, mode, focus)
+    with STAGE_SECONDS.time(stage="cache_lookup"):
+        result = _get_cached_result(url, mode, focus, template_id, output_language)
+    CACHE_LOOKUPS.inc(cache="summary", result="hit" if result else "miss")
+    return result
+
+
+def _get_cached_result(
+    url: str,
+    mode: str,
+    focus: str,
+    template_id: Optional[str],
+    output_language: str
+) -> Optional[Dict[str, Any]]:
+    cache_key = generate_cache_key(url, mode, focus, template_id, output_language)
     
     conn = get_connection()
     cursor = conn.cursor()
@@ -112,14 +114,75 @@ def get_cached_result(url: str, mode: str, focus: str) -> Optional[Dict[str, Any
     return None
 
 
-def save_to_cache(url: str, mode: str, focus: str, summary: str, transcript: str, usage: Dict) -> bool:
+def get_cached_results(urls: List[str], mode: str, focus: str) -> Dict[str, Dict[str, Any]]:
+    """
+    批量获取缓存结果（一次查询）
+    
+    Returns:
+        {url: 缓存结果}，只包含命中的 URL
+    """
+    keys: Dict[str, List[str]] = {}
+    for url in urls:
+        keys.setdefault(generate_cache_key(url, mode, focus), []).append(url)
+    if not keys:
+        return {}
+    
+    placeholders = ", ".join("?" for _ in keys)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT cache_key, summary, transcript, usage_data, created_at
+            FROM video_cache
+            WHERE cache_key IN ({placeholders})
+        """, tuple(keys))
+        rows = cursor.fetchall()
+        
+        if rows:
+            hit_keys = [row["cache_key"] for row in rows]
+            cursor.execute(f"""
+                UPDATE video_cache
+                SET last_accessed = CURRENT_TIMESTAMP
+                WHERE cache_key IN ({", ".join("?" for _ in hit_keys)})
+            """, tuple(hit_keys))
+            conn.commit()
+    finally:
+        conn.close()
+    
+    hits = sum(len(keys[row["cache_key"]]) for row in rows)
+    CACHE_LOOKUPS.inc(hits, cache="summary", result="hit")
+    CACHE_LOOKUPS.inc(len(urls) - hits, cache="summary", result="miss")
+    
+    results = {}
+    for row in rows:
+        for url in keys[row["cache_key"]]:
+            results[url] = {
+                "summary": row["summary"],
+                "transcript": row["transcript"],
+                "usage": json.loads(row["usage_data"]) if row["usage_data"] else {},
+                "cached": True,
+                "cached_at": row["created_at"]
+            }
+    return results
+
+
+def save_to_cache(
+    url: str,
+    mode: str,
+    focus: str,
+    summary: str,
+    transcript: str,
+    usage: Dict,
+    template_id: Optional[str] = None,
+    output_language: str = "zh"
+) -> bool:
     """
     保存总结结果到缓存
     """
     import re
     bv_match = re.search(r'BV[a-zA-Z0-9]+', url)
     video_id = bv_match.group(0) if bv_match else "unknown"
-    cache_key = generate_cache_key(url, mode, focus)
+    cache_key = generate_cache_key(url, mode, focus, template_id, output_language)
     
     conn = get_connection()
     cursor = conn.cursor()
@@ -170,23 +233,101 @@ def save_to_cache(url: str, mode: str, focus: str, summary: str, transcript: str
         return False
 
 
+def get_base_extraction(url: str, mode: str) -> Optional[Dict[str, Any]]:
+    """
+    获取视频的基础提取（详细笔记 + 转录）
+    
+    Returns:
+        {"notes", "transcript", "usage"}，未命中返回 None
+    """
+    with STAGE_SECONDS.time(stage="base_cache_lookup"):
+        result = _get_base_extraction(url, mode)
+    CACHE_LOOKUPS.inc(cache="base", result="hit" if result else "miss")
+    return result
+
+
+def _get_base_extraction(url: str, mode: str) -> Optional[Dict[str, Any]]:
+    base_key = generate_base_key(url, mode)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT notes, transcript, usage_data
+            FROM video_base_cache
+            WHERE base_key = ?
+        """, (base_key,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute("""
+            UPDATE video_base_cache
+            SET last_accessed = CURRENT_TIMESTAMP
+            WHERE base_key = ?
+        """, (base_key,))
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return {
+        "notes": row["notes"] or "",
+        "transcript": row["transcript"] or "",
+        "usage": json.loads(row["usage_data"]) if row["usage_data"] else {}
+    }
+
+
+def save_base_extraction(url: str, mode: str, notes: str, transcript: str, usage: Dict) -> bool:
+    """保存基础提取（同一视频重复保存时覆盖）"""
+    base_key = generate_base_key(url, mode)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        params = (base_key, _extract_video_id(url), url, mode, notes, transcript, json.dumps(usage))
+        if using_postgres():
+            cursor.execute("""
+                INSERT INTO video_base_cache
+                (base_key, video_id, url, mode, notes, transcript, usage_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (base_key)
+                DO UPDATE SET
+                    notes = EXCLUDED.notes,
+                    transcript = EXCLUDED.transcript,
+                    usage_data = EXCLUDED.usage_data,
+                    last_accessed = CURRENT_TIMESTAMP
+            """, params)
+        else:
+            cursor.execute("""
+                INSERT OR REPLACE INTO video_base_cache
+                (base_key, video_id, url, mode, notes, transcript, usage_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, params)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"基础提取缓存保存失败: {e}")
+        return False
+    finally:
+        conn.close()
+
+
 def clear_old_cache(days: int = 30):
     """清理超过指定天数的缓存"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    if using_postgres():
-        cursor.execute("""
-            DELETE FROM video_cache 
-            WHERE last_accessed < NOW() - (%s)::interval
-        """, (f"{days} days",))
-    else:
-        cursor.execute("""
-            DELETE FROM video_cache 
-            WHERE last_accessed < datetime('now', ?)
-        """, (f'-{days} days',))
+    deleted = 0
+    for table in ("video_cache", "video_base_cache"):
+        if using_postgres():
+            cursor.execute(f"""
+                DELETE FROM {table} 
+                WHERE last_accessed < NOW() - CAST(? AS interval)
+            """, (f"{days} days",))
+        else:
+            cursor.execute(f"""
+                DELETE FROM {table} 
+                WHERE last_accessed < datetime('now', ?)
+            """, (f'-{days} days',))
+        deleted += cursor.rowcount
     
-    deleted = cursor.rowcount
     conn.commit()
     conn.close()
     
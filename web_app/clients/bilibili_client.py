@@ -8,6 +8,7 @@ from typing import Any, Dict, List, Optional
 
 import httpx
 
+from ..metrics import record_bilibili_code
 from ..wbi import sign_wbi, parse_wbi_keys
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,34 @@ logger = logging.getLogger(__name__)
 BILIBILI_API = "https://api.bilibili.com"
 BILIBILI_SESSDATA = os.getenv("BILIBILI_SESSDATA", "")
 
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "Referer": "https://www.bilibili.com"
+}
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """获取进程内共享的 httpx 客户端（连接池复用，避免每次请求重新握手）"""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return _shared_client
+
+
+async def close_shared_client() -> None:
+    """关闭共享客户端（应用退出时调用）"""
+    global _shared_client
+    if _shared_client is not None and not _shared_client.is_closed:
+        await _shared_client.aclose()
+    _shared_client = None
+
 
 async def search_up(keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
     """搜索 UP 主"""
@@ -36,6 +65,7 @@ async def search_up(keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
         try:
             response = await client.get(url, params=params, headers=headers)
             data = response.json()
+            record_bilibili_code("search/type", data.get("code"))
 
             if data.get("code") != 0:
                 logger.error(f"Search UP failed: {data.get('message')}")
@@ -112,6 +142,7 @@ async def get_up_latest_video(
 
         response = await client.get(url, params=signed_params)
         data = response.json()
+        record_bilibili_code("arc/search", data.get("code"))
 
         if data.get("code") != 0:
             code = data.get("code")
@@ -131,6 +162,7 @@ async def get_up_latest_video(
                         signed_params = sign_wbi(params, img_key, sub_key)
                         retry_resp = await client.get(url, params=signed_params)
                         retry_data = retry_resp.json()
+                        record_bilibili_code("arc/search", retry_data.get("code"))
                         if retry_data.get("code") == 0:
                             data = retry_data
                         else:
@@ -297,6 +329,7 @@ async def get_up_latest_videos(
         data = response.json()
 
         code = data.get("code")
+        record_bilibili_code("arc/search", code)
         if code != 0:
             msg = data.get("message", '')
             logger.warning(f"Get UP latest videos failed (mid={mid}): {msg} code={code}")
@@ -332,6 +365,7 @@ async def get_up_latest_videos(
 
                     response = await client.get(url, params=signed_params, headers=video_headers)
                     data = response.json()
+                    record_bilibili_code("arc/search", data.get("code"))
                     if data.get("code") != 0:
                         logger.error(f"Retry failed for mid={mid}")
                         return []
@@ -1,10 +1,13 @@
 """
 视频总结对比服务
 """
+import asyncio
 import json
 import logging
 from typing import List, Dict, Any
-import google.generativeai as genai
+
+from .llm import get_llm_backend
+from .structured_output import parse_structured_output
 
 logger = logging.getLogger(__name__)
 
@@ -91,26 +94,19 @@ async def compare_summaries(
     )
     
     try:
-        model = genai.GenerativeModel("gemini-3-flash-preview")
-        
-        response = model.generate_content(
+        # SDK 调用是同步的，放到线程中避免阻塞事件循环
+        response = await asyncio.to_thread(
+            get_llm_backend().generate,
             prompt,
+            task="compare",
             generation_config={
                 "temperature": 0.3,
                 "max_output_tokens": 4096,
             }
         )
         
-        # 解析 JSON
-        result_text = response.text
-        
-        # 提取 JSON 部分
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0]
-        elif "```" in result_text:
-            result_text = result_text.split("```")[1].split("```")[0]
-        
-        result = json.loads(result_text.strip())
+        # 解析 JSON（优先 ```json 代码块，其次任意代码块，最后整段文本）
+        result = parse_structured_output(response.text).first_json()
         
         # 添加元信息
         result["video_count"] = len(summaries)
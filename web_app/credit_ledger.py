@@ -0,0 +1,212 @@
+"""
+积分账本：预留（hold）→ 结算（commit）/ 释放（release）
+
+user_credits.credits 是物化的可用余额，credit_events 是流水，credit_holds 记录尚未结算的预留。
+所有余额变更都是带条件的单条 UPDATE（WHERE credits >= ?），在 SQLite 上由写锁串行化，
+在 Postgres 上由行锁串行化，并发请求不会把余额扣成负数；预留的状态迁移同样是条件 UPDATE
+（WHERE status = 'held'），同一笔预留只会被结算或释放一次。
+
+/summarize 在开始处理前预留积分，成功后按实际费用结算，失败或断开时释放；
+批量总结与收藏夹导入整批预留一次，任务结束后按成功条目结算（settle），其余退还；
+进程崩溃遗留的预留由定时任务按 CREDIT_HOLD_TTL 释放。
+
+credit_events 只记录用户可见的净变动（consume / grant / purchase）：预留与退还只体现在 credit_holds
+与余额上，否则一次成功的总结会在积分明细里多出一笔“预留”与一笔“退还”。
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .db import get_connection
+from .user_context import invalidate_user_context
+
+logger = logging.getLogger(__name__)
+
+CREDIT_HOLD_TTL = int(os.getenv("CREDIT_HOLD_TTL", "7200"))
+
+HOLD_HELD = "held"
+HOLD_COMMITTED = "committed"
+HOLD_RELEASED = "released"
+
+
+def _now() -> str:
+    # 与列默认值 CURRENT_TIMESTAMP 同格式（UTC）
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_daily_usage(cursor, user_id: str, count: int = 1) -> None:
+    """在写入 consume 流水的同一事务内累加当日用量"""
+    if count <= 0:
+        return
+    cursor.execute("""
+        INSERT INTO usage_daily (user_id, date, count)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id, date)
+        DO UPDATE SET count = usage_daily.count + excluded.count
+    """, (user_id, _now()[:10], count))
+
+
+def reserve(user_id: str, amount: int, metadata: Optional[str] = None) -> Optional[str]:
+    """
+    预留积分
+
+    Returns:
+        预留 ID；余额不足（或用户不存在）时返回 None，余额不变
+    """
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    hold_id = uuid.uuid4().hex
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE user_credits
+            SET credits = credits - ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND credits >= ?
+        """, (amount, user_id, amount))
+        if cursor.rowcount == 0:
+            return None
+        cursor.execute("""
+            INSERT INTO credit_holds (id, user_id, amount, status, metadata, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (hold_id, user_id, amount, HOLD_HELD, metadata, _now()))
+    invalidate_user_context(user_id)
+    return hold_id
+
+
+def settle(settlements: Iterable[Tuple[str, List[Dict]]]) -> Dict[str, int]:
+    """
+    批量结算预留（一个事务、一次连接）
+
+    Args:
+        settlements: [(hold_id, consumed)]，consumed 为实际消耗条目 [{"cost": 10, "metadata": "..."}]，
+            每条写一条 consume 流水；为空表示整笔释放（不写流水）
+
+    Returns:
+        {hold_id: 退还积分}；已结算或已释放的预留会被跳过，不出现在结果中
+    """
+    refunds: Dict[str, int] = {}
+    users = set()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for hold_id, consumed in settlements:
+            status = HOLD_COMMITTED if consumed else HOLD_RELEASED
+            cursor.execute("""
+                UPDATE credit_holds
+                SET status = ?, settled_at = ?
+                WHERE id = ? AND status = ?
+            """, (status, _now(), hold_id, HOLD_HELD))
+            if cursor.rowcount == 0:
+                continue
+            cursor.execute("SELECT user_id, amount FROM credit_holds WHERE id = ?", (hold_id,))
+            row = cursor.fetchone()
+            user_id, amount = row["user_id"], row["amount"]
+            refund = amount - min(sum(item["cost"] for item in consumed), amount)
+            cursor.execute("""
+                UPDATE user_credits
+                SET credits = credits + ?,
+                    total_used = total_used + ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ?
+            """, (refund, len(consumed), user_id))
+            if consumed:
+                cursor.executemany("""
+                    INSERT INTO credit_events (user_id, event_type, cost, metadata)
+                    VALUES (?, ?, ?, ?)
+                """, [(user_id, "consume", item["cost"], item.get("metadata")) for item in consumed])
+                record_daily_usage(cursor, user_id, len(consumed))
+            refunds[hold_id] = refund
+            users.add(user_id)
+    for user_id in users:
+        invalidate_user_context(user_id)
+    return refunds
+
+
+def commit(hold_id: str, cost: int, metadata: Optional[str] = None) -> bool:
+    """按实际费用结算一笔预留（多余部分退还）；预留已被结算或释放时返回 False"""
+    return hold_id in settle([(hold_id, [{"cost": cost, "metadata": metadata}])])
+
+
+def release(hold_id: str) -> bool:
+    """整笔释放预留；预留已被结算或释放时返回 False"""
+    return hold_id in settle([(hold_id, [])])
+
+
+def charge(user_id: str, cost: int, metadata: Optional[str] = None) -> bool:
+    """一次性扣费（不经过预留）；余额不足时返回 False"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE user_credits
+            SET credits = credits - ?,
+                total_used = total_used + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND credits >= ?
+        """, (cost, user_id, cost))
+        success = cursor.rowcount > 0
+        if success:
+            cursor.execute("""
+                INSERT INTO credit_events (user_id, event_type, cost, metadata)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, "consume", cost, metadata))
+            record_daily_usage(cursor, user_id)
+    invalidate_user_context(user_id)
+    return success
+
+
+def grant(user_id: str, credits: int, event_type: str = "purchase") -> bool:
+    """发放积分；用户不存在时返回 False"""
+    if credits <= 0:
+        return False
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE user_credits
+            SET credits = credits + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ?
+        """, (credits, user_id))
+        success = cursor.rowcount > 0
+        if success:
+            cursor.execute("""
+                INSERT INTO credit_events (user_id, event_type, cost)
+                VALUES (?, ?, ?)
+            """, (user_id, event_type, credits))
+    invalidate_user_context(user_id)
+    return success
+
+
+def get_balance(user_id: str) -> Optional[Dict]:
+    """可用余额与尚未结算的预留总额"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.credits,
+                   (SELECT COALESCE(SUM(h.amount), 0) FROM credit_holds h
+                    WHERE h.user_id = c.user_id AND h.status = ?) AS held
+            FROM user_credits c
+            WHERE c.user_id = ?
+        """, (HOLD_HELD, user_id))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    return {"credits": row["credits"], "held": int(row["held"])}
+
+
+def release_expired_holds(max_age_seconds: int = CREDIT_HOLD_TTL) -> int:
+    """释放超过 max_age_seconds 仍未结算的预留（进程崩溃或任务丢失时遗留），返回释放笔数"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=max_age_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id FROM credit_holds
+            WHERE status = ? AND created_at < ?
+        """, (HOLD_HELD, cutoff))
+        hold_ids = [row["id"] for row in cursor.fetchall()]
+    if not hold_ids:
+        return 0
+    released = settle([(hold_id, []) for hold_id in hold_ids])
+    logger.info(f"Released {len(released)} expired credit holds")
+    return len(released)
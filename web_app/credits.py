@@ -1,6 +1,9 @@
 from typing import Optional, Dict
 
-from .db import get_connection, using_postgres
+from . import credit_ledger
+from .db import get_connection
+from .migrations import apply_steps
+from .user_context import get_user_context, invalidate_user_context, is_pro_active
 INITIAL_CREDITS = 50
 FIRST_SUMMARY_BONUS = 10
 
@@ -10,137 +13,41 @@ def _get_connection():
 
 
 def init_credits_db():
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_credits (
-            user_id TEXT PRIMARY KEY,
-            credits INTEGER NOT NULL DEFAULT 0,
-            total_used INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    if using_postgres():
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS credit_events (
-                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                event_type TEXT NOT NULL,
-                cost INTEGER NOT NULL,
-                metadata TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Migration for existing table
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'credit_events' AND column_name = 'metadata'
-            """)
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE credit_events ADD COLUMN metadata TEXT")
-        except Exception:
-            pass
-    else:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS credit_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                event_type TEXT NOT NULL,
-                cost INTEGER NOT NULL,
-                metadata TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        try:
-            # Check if metadata column exists in sqlite
-            cursor.execute("PRAGMA table_info(credit_events)")
-            columns = [info[1] for info in cursor.fetchall()]
-            if "metadata" not in columns:
-                cursor.execute("ALTER TABLE credit_events ADD COLUMN metadata TEXT")
-        except Exception:
-            pass
-
-    conn.commit()
-    conn.close()
+    # 积分、流水、订阅、预留与每日用量表（定义在 migrations 中，用户上下文 JOIN 需要它们同时存在）
+    apply_steps("credit_tables")
 
 
-def ensure_user_credits(user_id: str, initial_credits: int = INITIAL_CREDITS) -> Dict:
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT credits, total_used, created_at, updated_at FROM user_credits WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    if row:
-        conn.close()
-        return {
-            "credits": row["credits"],
-            "total_used": row["total_used"],
-            "created_at": row["created_at"],
-            "updated_at": row["updated_at"]
-        }
-    cursor.execute("""
-        INSERT INTO user_credits (user_id, credits)
-        VALUES (?, ?)
-    """, (user_id, initial_credits))
-    cursor.execute("""
-        INSERT INTO credit_events (user_id, event_type, cost)
-        VALUES (?, ?, ?)
-    """, (user_id, "grant", 0))
-    conn.commit()
-    conn.close()
+def _credit_fields(context: Dict) -> Dict:
     return {
-        "credits": initial_credits,
-        "total_used": 0,
-        "created_at": None,
-        "updated_at": None
+        "credits": context["credits"],
+        "total_used": context["total_used"],
+        "created_at": context["created_at"],
+        "updated_at": context["updated_at"]
     }
 
 
+def ensure_user_credits(user_id: str, initial_credits: int = INITIAL_CREDITS) -> Dict:
+    """读取积分（没有记录时开户），同时把订阅状态缓存进本次请求的用户上下文"""
+    return _credit_fields(get_user_context(user_id, initial_credits))
+
+
 def get_user_credits(user_id: str) -> Optional[Dict]:
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT credits, total_used, created_at, updated_at FROM user_credits WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if not row:
+    context = get_user_context(user_id)
+    if not context:
         return None
-    return {
-        "credits": row["credits"],
-        "total_used": row["total_used"],
-        "created_at": row["created_at"],
-        "updated_at": row["updated_at"]
-    }
+    return _credit_fields(context)
 
 
 def should_charge_credits(user_id: str) -> bool:
     """检查是否应该扣除积分（Pro 用户在订阅期内不扣除）"""
-    from .db import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("""
-            SELECT plan, status, current_period_end
-            FROM subscriptions
-            WHERE user_id = ?
-        """, (user_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            return True  # 无订阅记录，需要扣除积分
-        
-        # 检查是否为激活的 Pro 订阅
-        if row["plan"] == "pro" and row["status"] == "active":
-            # TODO: 可以进一步检查 current_period_end 是否未过期
-            return False  # Pro 用户不扣除
-        
-        return True  # 其他情况需要扣除
+        context = get_user_context(user_id)
+        if not context:
+            return True  # 无积分记录，按需扣除处理（扣费本身会失败）
+        # TODO: 可以进一步检查 current_period_end 是否未过期
+        return not is_pro_active(context["subscription"])
     except Exception:
         return True  # 出错时默认扣除
-    finally:
-        conn.close()
 
 
 def charge_user_credits(user_id: str, cost: int, metadata: Optional[str] = None) -> bool:
@@ -148,47 +55,11 @@ def charge_user_credits(user_id: str, cost: int, metadata: Optional[str] = None)
     # Pro 用户直接返回成功，不扣除积分
     if not should_charge_credits(user_id):
         return True
-    
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE user_credits
-        SET credits = credits - ?,
-            total_used = total_used + 1,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE user_id = ? AND credits >= ?
-    """, (cost, user_id, cost))
-    if cursor.rowcount > 0:
-        cursor.execute("""
-            INSERT INTO credit_events (user_id, event_type, cost, metadata)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, "consume", cost, metadata))
-    conn.commit()
-    success = cursor.rowcount > 0
-    conn.close()
-    return success
+    return credit_ledger.charge(user_id, cost, metadata)
 
 
 def grant_credits(user_id: str, credits: int, event_type: str = "purchase") -> bool:
-    if credits <= 0:
-        return False
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE user_credits
-        SET credits = credits + ?,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE user_id = ?
-    """, (credits, user_id))
-    if cursor.rowcount > 0:
-        cursor.execute("""
-            INSERT INTO credit_events (user_id, event_type, cost)
-            VALUES (?, ?, ?)
-        """, (user_id, event_type, credits))
-    conn.commit()
-    success = cursor.rowcount > 0
-    conn.close()
-    return success
+    return credit_ledger.grant(user_id, credits, event_type)
 
 
 def grant_first_summary_bonus(user_id: str, bonus: int = FIRST_SUMMARY_BONUS) -> bool:
@@ -216,17 +87,18 @@ def grant_first_summary_bonus(user_id: str, bonus: int = FIRST_SUMMARY_BONUS) ->
         return True
     finally:
         conn.close()
+        invalidate_user_context(user_id)
 
 
 def get_daily_usage(user_id: str, days: int = 14):
+    """最近 days 个有消耗的日期及次数（读 usage_daily 汇总表，不扫描流水）"""
     conn = _get_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT DATE(created_at) as day, COUNT(*) as count
-        FROM credit_events
-        WHERE user_id = ? AND event_type = 'consume'
-        GROUP BY DATE(created_at)
-        ORDER BY day DESC
+        SELECT date AS day, count
+        FROM usage_daily
+        WHERE user_id = ?
+        ORDER BY date DESC
         LIMIT ?
     """, (user_id, days))
     rows = cursor.fetchall()
@@ -235,12 +107,13 @@ def get_daily_usage(user_id: str, days: int = 14):
 
 
 def get_credit_history(user_id: str, limit: int = 50):
+    """用户可见的积分明细（不含旧版本写入的 reserve / refund 预留流水）"""
     conn = _get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT event_type, cost, metadata, created_at
         FROM credit_events
-        WHERE user_id = ?
+        WHERE user_id = ? AND event_type NOT IN ('reserve', 'refund')
         ORDER BY created_at DESC
         LIMIT ?
     """, (user_id, limit))
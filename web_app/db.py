@@ -1,8 +1,22 @@
+import functools
+import hashlib
 import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import urlparse
 from typing import Any, Optional, Callable
 
+from .metrics import (
+    DB_CONNECTIONS_IN_USE,
+    DB_CONNECTIONS_OPENED,
+    DB_POOL_WAIT_SECONDS,
+    DB_PREPARED_STATEMENTS,
+    DB_QUERY_SECONDS,
+)
+
 
 _PG_POOL = None
 
@@ -12,67 +26,392 @@ def using_postgres() -> bool:
     return db_url.startswith("postgres://") or db_url.startswith("postgresql://")
 
 
+# 同一条 SQL 执行满这么多次后，才在连接上 PREPARE（一次性语句不值得多两次往返）
+PG_PREPARE_THRESHOLD = int(os.getenv("PG_PREPARE_THRESHOLD", "3"))
+# 每条连接最多保留的预备语句数，超出按 LRU DEALLOCATE
+PG_PREPARED_PER_CONN = int(os.getenv("PG_PREPARED_PER_CONN", "64"))
+# ? 占位符改写结果的缓存条数（按 SQL 文本）
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "512"))
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_PREPARABLE_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _rewrite_placeholders(query: str, placeholder: Callable[[int], str], escape_percent: bool) -> tuple:
+    """
+    把 ? 占位符改写为 placeholder(n)，跳过字符串、带引号标识符、注释与 $tag$ 字符串中的 ?；
+    字符串外的 %s 同样按占位符处理，%% 按一个字面量 % 处理
+
+    escape_percent=True 时把 % 转义成 %%（psycopg2 带参数执行时会对整条 SQL 做 % 格式化）。
+    返回 (改写后的 SQL, 占位符个数, 是否包含多条语句)。
+    """
+    out = []
+    count = 0
+    multiple = False
+    length = len(query)
+    i = 0
+    while i < length:
+        ch = query[i]
+        end = i + 1
+        if ch == "?" or query.startswith("%s", i):
+            # 个别旧代码直接写了 psycopg2 的 %s，与 ? 同样视为占位符
+            count += 1
+            out.append(placeholder(count))
+            i += 1 if ch == "?" else 2
+            continue
+        if query.startswith("%%", i):
+            # 已转义的 %% 是一个字面量 %
+            out.append("%%" if escape_percent else "%")
+            i += 2
+            continue
+        if ch in ("'", '"'):
+            # E'...' 字符串里反斜杠是转义符；'' / "" 是引号本身
+            backslash = (
+                ch == "'" and i > 0 and query[i - 1] in "eE"
+                and (i == 1 or not (query[i - 2].isalnum() or query[i - 2] == "_"))
+            )
+            while end < length:
+                if backslash and query[end] == "\\":
+                    end += 2
+                    continue
+                if query[end] == ch:
+                    if end + 1 < length and query[end + 1] == ch:
+                        end += 2
+                        continue
+                    end += 1
+                    break
+                end += 1
+        elif query.startswith("--", i):
+            newline = query.find("\n", i)
+            end = length if newline == -1 else newline + 1
+        elif query.startswith("/*", i):
+            close = query.find("*/", i + 2)
+            end = length if close == -1 else close + 2
+        elif ch == "$" and _DOLLAR_TAG.match(query, i):
+            tag = _DOLLAR_TAG.match(query, i).group(0)
+            close = query.find(tag, i + len(tag))
+            end = length if close == -1 else close + len(tag)
+        elif ch == ";" and query[i + 1:].strip():
+            multiple = True
+        chunk = query[i:end]
+        out.append(chunk.replace("%", "%%") if escape_percent else chunk)
+        i = end
+    return "".join(out), count, multiple
+
+
+class _Statement:
+    """一条 SQL 在 Postgres 下的编译结果（按 SQL 文本缓存，跨连接共享）"""
+
+    __slots__ = ("text", "param_count", "name", "prepare_sql", "execute_sql", "preparable", "executions")
+
+    def __init__(self, query: str) -> None:
+        self.text, self.param_count, multiple = _rewrite_placeholders(query, lambda n: "%s", True)
+        body, _, _ = _rewrite_placeholders(query, lambda n: f"${n}", False)
+        operation = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+        self.name = "bili_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+        self.prepare_sql = f"PREPARE {self.name} AS {body.strip().rstrip(';')}"
+        params = ", ".join(["%s"] * self.param_count)
+        self.execute_sql = f"EXECUTE {self.name} ({params})" if self.param_count else f"EXECUTE {self.name}"
+        self.preparable = not multiple and operation in _PREPARABLE_OPERATIONS
+        self.executions = 0
+
+
+@functools.lru_cache(maxsize=DB_STATEMENT_CACHE_SIZE)
+def compile_statement(query: str) -> _Statement:
+    return _Statement(query)
+
+
+def translate_query(query: str) -> str:
+    """把 ? 占位符 SQL 改写为 psycopg2 的 %s 形式（结果按 SQL 文本缓存）"""
+    return compile_statement(query).text
+
+
 class CursorProxy:
     def __init__(self, cursor: Any, is_postgres: bool) -> None:
         self._cursor = cursor
         self._is_postgres = is_postgres
 
+    def _observe(self, query: str, started: float) -> None:
+        operation = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+        DB_QUERY_SECONDS.observe(
+            time.perf_counter() - started,
+            backend="postgres" if self._is_postgres else "sqlite",
+            operation=operation
+        )
+
+    def _prepared(self, statement: _Statement, params: Any) -> bool:
+        """语句是否已（或刚刚）在当前连接上 PREPARE"""
+        cache = getattr(getattr(self._cursor, "connection", None), "prepared_statements", None)
+        if cache is None or not statement.preparable or not isinstance(params, (tuple, list)):
+            return False
+        if statement.name in cache:
+            cache.move_to_end(statement.name)
+            return True
+        statement.executions += 1
+        if statement.executions < PG_PREPARE_THRESHOLD:
+            return False
+        # PREPARE 失败（如参数类型推断不出）会让整个事务失效，用保存点隔离
+        use_savepoint = not getattr(self._cursor.connection, "autocommit", False)
+        try:
+            if use_savepoint:
+                self._cursor.execute("SAVEPOINT bili_prepare")
+            self._cursor.execute(statement.prepare_sql)
+            if use_savepoint:
+                self._cursor.execute("RELEASE SAVEPOINT bili_prepare")
+        except Exception:
+            if use_savepoint:
+                try:
+                    self._cursor.execute("ROLLBACK TO SAVEPOINT bili_prepare")
+                    self._cursor.execute("RELEASE SAVEPOINT bili_prepare")
+                except Exception:
+                    pass
+            statement.preparable = False
+            DB_PREPARED_STATEMENTS.inc(event="failed")
+            return False
+        cache[statement.name] = statement
+        DB_PREPARED_STATEMENTS.inc(event="prepared")
+        while len(cache) > PG_PREPARED_PER_CONN:
+            evicted, _ = cache.popitem(last=False)
+            self._cursor.execute(f"DEALLOCATE {evicted}")
+            DB_PREPARED_STATEMENTS.inc(event="evicted")
+        return True
+
     def execute(self, query: str, params: Optional[tuple] = None) -> Any:
-        if self._is_postgres:
-            query = query.replace("?", "%s")
-        return self._cursor.execute(query, params or ())
+        if not self._is_postgres:
+            started = time.perf_counter()
+            try:
+                return self._cursor.execute(query, params or ())
+            finally:
+                self._observe(query, started)
+
+        statement = compile_statement(query)
+        sql = statement.execute_sql if self._prepared(statement, params or ()) else statement.text
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params or ())
+        finally:
+            self._observe(query, started)
 
     def executemany(self, query: str, params: list) -> Any:
         if self._is_postgres:
-            query = query.replace("?", "%s")
-        return self._cursor.executemany(query, params)
+            query = translate_query(query)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, params)
+        finally:
+            self._observe(query, started)
 
     def __getattr__(self, name: str) -> Any:
         return getattr(self._cursor, name)
 
 
 class ConnectionProxy:
+    """
+    借出的连接
+
+    close() 把连接归还连接池（SQLite 为线程内复用，Postgres 为全局池），未提交的事务会被回滚。
+    也可作为上下文管理器使用：正常退出提交、异常回滚，最后一定归还。
+    """
+
     def __init__(self, conn: Any, is_postgres: bool, releaser: Optional[Callable[[Any], None]] = None) -> None:
         self._conn = conn
         self._is_postgres = is_postgres
         self._releaser = releaser
+        self._released = False
 
     def cursor(self) -> CursorProxy:
         return CursorProxy(self._conn.cursor(), self._is_postgres)
 
     def close(self) -> None:
+        # 重复 close 不能把同一连接归还两次
+        if self._released:
+            return
+        self._released = True
         if self._releaser:
             self._releaser(self._conn)
         else:
             self._conn.close()
 
+    def __enter__(self) -> "ConnectionProxy":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+
     def __getattr__(self, name: str) -> Any:
         return getattr(self._conn, name)
 
 
-def get_connection() -> ConnectionProxy:
-    if using_postgres():
-        import psycopg2
+SQLITE_POOL_ENABLED = os.getenv("SQLITE_POOL_ENABLED", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# 每个线程最多保留的空闲连接数（同一线程内嵌套借用时才会超过 1）
+SQLITE_IDLE_PER_THREAD = int(os.getenv("SQLITE_IDLE_PER_THREAD", "2"))
+# sqlite3 模块按连接缓存已编译语句（默认 128 条），连接复用后调大才有意义
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+_sqlite_local = threading.local()
+# close_all_connections() 递增代数，各线程下次借用时丢弃旧代的空闲连接
+_sqlite_generation = 0
+
+
+def _open_sqlite(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, cached_statements=SQLITE_STATEMENT_CACHE
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL：读写互不阻塞；NORMAL 在 WAL 下只在检查点 fsync，断电最多丢最后几个事务、不会损坏
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_MMAP_SIZE > 0:
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    DB_CONNECTIONS_OPENED.inc(backend="sqlite")
+    return conn
+
+
+def _sqlite_idle(db_path: str) -> list:
+    if getattr(_sqlite_local, "generation", None) != _sqlite_generation:
+        for conns in getattr(_sqlite_local, "idle", {}).values():
+            for conn in conns:
+                conn.close()
+        _sqlite_local.idle = {}
+        _sqlite_local.generation = _sqlite_generation
+    return _sqlite_local.idle.setdefault(db_path, [])
+
+
+def _get_sqlite_connection() -> ConnectionProxy:
+    db_path = os.getenv("DB_PATH", "cache.db")
+    started = time.perf_counter()
+    if not SQLITE_POOL_ENABLED:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        DB_CONNECTIONS_OPENED.inc(backend="sqlite")
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, backend="sqlite")
+        return ConnectionProxy(conn, False)
+
+    idle = _sqlite_idle(db_path)
+    conn = idle.pop() if idle else _open_sqlite(db_path)
+    generation = _sqlite_generation
+    owner = threading.get_ident()
+    DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, backend="sqlite")
+    DB_CONNECTIONS_IN_USE.inc(backend="sqlite")
+
+    def release(raw: sqlite3.Connection) -> None:
+        DB_CONNECTIONS_IN_USE.dec(backend="sqlite")
+        if threading.get_ident() != owner:
+            # sqlite3 连接不能跨线程操作，交给垃圾回收关闭
+            return
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except sqlite3.Error:
+            raw.close()
+            return
+        pool = getattr(_sqlite_local, "idle", {}).get(db_path)
+        if (
+            pool is None
+            or generation != _sqlite_generation
+            or len(pool) >= SQLITE_IDLE_PER_THREAD
+        ):
+            raw.close()
+            return
+        pool.append(raw)
+
+    return ConnectionProxy(conn, False, releaser=release)
+
+
+class _PostgresPool:
+    """
+    线程安全的 Postgres 连接池
+
+    ThreadedConnectionPool 在连接耗尽时直接抛 PoolError，这里用信号量让借用方排队等待，
+    超过 PG_POOL_TIMEOUT 秒仍借不到才报错。
+    """
+
+    def __init__(self, dsn: str, min_conn: int, max_conn: int, timeout: float):
         from psycopg2 import pool
+        from psycopg2.extensions import connection
         from psycopg2.extras import DictCursor
-        global _PG_POOL
-        if _PG_POOL is None:
-            min_conn = int(os.getenv("PG_POOL_MIN", "1"))
-            max_conn = int(os.getenv("PG_POOL_MAX", "5"))
-            _PG_POOL = pool.SimpleConnectionPool(
-                min_conn,
-                max_conn,
-                os.getenv("DATABASE_URL"),
-                cursor_factory=DictCursor
-            )
 
-        conn = _PG_POOL.getconn()
-        return ConnectionProxy(conn, True, releaser=_PG_POOL.putconn)
+        class PreparingConnection(connection):
+            """附带预备语句 LRU 的连接（预备语句属于会话，随连接存活）"""
 
-    db_path = os.getenv("DB_PATH", "cache.db")
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return ConnectionProxy(conn, False)
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared_statements = OrderedDict()
+
+        self._pool = pool.ThreadedConnectionPool(
+            min_conn, max_conn, dsn, cursor_factory=DictCursor, connection_factory=PreparingConnection
+        )
+        self._slots = threading.BoundedSemaphore(max_conn)
+        self._timeout = timeout
+
+    def acquire(self) -> ConnectionProxy:
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self._timeout):
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, backend="postgres")
+            raise TimeoutError(f"Timed out after {self._timeout}s waiting for a database connection")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, backend="postgres")
+        DB_CONNECTIONS_IN_USE.inc(backend="postgres")
+        return ConnectionProxy(conn, True, releaser=self.release)
+
+    def release(self, conn: Any) -> None:
+        # putconn 会回滚未结束的事务，并关闭状态异常的连接
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            DB_CONNECTIONS_IN_USE.dec(backend="postgres")
+            self._slots.release()
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+_PG_POOL_LOCK = threading.Lock()
+
+
+def _get_postgres_pool() -> _PostgresPool:
+    global _PG_POOL
+    if _PG_POOL is None:
+        with _PG_POOL_LOCK:
+            if _PG_POOL is None:
+                _PG_POOL = _PostgresPool(
+                    os.getenv("DATABASE_URL"),
+                    int(os.getenv("PG_POOL_MIN", "1")),
+                    int(os.getenv("PG_POOL_MAX", "10")),
+                    float(os.getenv("PG_POOL_TIMEOUT", "30"))
+                )
+    return _PG_POOL
+
+
+def get_connection() -> ConnectionProxy:
+    """借出一个连接；调用方负责 close()（或使用 with get_connection() as conn）"""
+    if using_postgres():
+        return _get_postgres_pool().acquire()
+    return _get_sqlite_connection()
+
+
+def close_all_connections() -> None:
+    """关闭池中的连接（应用关闭时调用）；SQLite 各线程的空闲连接在下次借用时丢弃"""
+    global _PG_POOL, _sqlite_generation
+    _sqlite_generation += 1
+    _sqlite_idle(os.getenv("DB_PATH", "cache.db"))
+    with _PG_POOL_LOCK:
+        if _PG_POOL is not None:
+            _PG_POOL.close()
+            _PG_POOL = None
 
 
 def get_backend_info() -> dict:
@@ -0,0 +1,79 @@
+"""
+异步数据访问层
+
+请求处理函数直接调用阻塞的 get_connection() / cursor.execute() 时，一条慢查询会卡住
+同一进程里所有 SSE 流。这里把数据库操作放到专用线程池中执行：
+- 与 run_in_executor 的默认线程池隔离，长时间的 LLM / 下载任务占满默认池时数据库请求不排队
+- SQL 与 CursorProxy 相同，使用 ? 占位符（Postgres 下自动改写）
+- 每个数据库线程复用 db.py 连接池中的同一条 SQLite 连接
+
+已有的同步 DAL 函数（如 ensure_user_credits）用 run_db 包一层即可，不必重写。
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+from .db import get_connection
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """在数据库线程池中执行同步函数（带上当前上下文，请求级用户上下文缓存在线程中同样可见）"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+def _fetch_one(query: str, params: Sequence[Any]) -> Any:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        return cursor.fetchone()
+
+
+def _fetch_all(query: str, params: Sequence[Any]) -> List[Any]:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+
+def _execute(query: str, params: Sequence[Any]) -> int:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        return cursor.rowcount
+
+
+def _transaction(fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    with get_connection() as conn:
+        return fn(conn.cursor(), *args, **kwargs)
+
+
+async def fetch_one(query: str, params: Sequence[Any] = ()) -> Optional[Any]:
+    """查询单行（行对象与同步接口一致，可按列名或下标取值）"""
+    return await run_db(_fetch_one, query, params)
+
+
+async def fetch_all(query: str, params: Sequence[Any] = ()) -> List[Any]:
+    return await run_db(_fetch_all, query, params)
+
+
+async def execute(query: str, params: Sequence[Any] = ()) -> int:
+    """执行单条写语句并提交，返回影响行数"""
+    return await run_db(_execute, query, params)
+
+
+async def transaction(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在一个事务中执行 fn(cursor, *args, **kwargs)
+
+    正常返回时提交，抛出异常（包括 HTTPException）时回滚；fn 在数据库线程中运行，不能 await。
+    """
+    return await run_db(_transaction, fn, args, kwargs)
@@ -4,7 +4,6 @@ import sys
 import re
 from pathlib import Path
 from typing import Optional
-import yt_dlp
 import subprocess
 import glob
 import urllib.request
@@ -20,6 +19,12 @@ from .douyin_resolver import (
     extract_download_url,
     extract_metadata,
 )
+from .lazy_imports import lazy_module
+from .metrics import STAGE_SECONDS
+from .near_duplicate import NearDuplicateFound, check_near_duplicate
+
+# yt_dlp 导入约 0.2s，第一次下载时才加载
+yt_dlp = lazy_module("yt_dlp")
 
 # 定义视频存储目录
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -46,7 +51,8 @@ def extract_audio_for_transcript(video_path: Path) -> Optional[Path]:
             "64k",
             str(audio_path)
         ]
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with STAGE_SECONDS.time(stage="ffmpeg"):
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         if audio_path.exists():
             return audio_path
         return None
@@ -335,16 +341,24 @@ def get_douyin_metadata_via_savetik(url: str) -> dict:
         print(f"SaveTik Metadata 流程失败: {e}", file=sys.stderr)
         return None
 
-def download_content(url: str, mode: str = "smart", progress_callback=None) -> tuple[Path, str, str]:
+def download_content(url: str, mode: str = "smart", progress_callback=None, dedupe_lookup=None) -> tuple[Path, str, str]:
     """
     下载内容：
     - smart模式: 优先下载字幕，其次视频, 最后音频。
     - video模式: 直接下载视频。
     
+    传入 dedupe_lookup（按候选 URL 查询缓存总结）时，拿到字幕后先查内容指纹库：
+    若有近重复视频（转载/搬运）已有总结，抛出 NearDuplicateFound，跳过媒体下载与 AI 调用。
+    
     Returns:
         (file_path, media_type)
         media_type: 'subtitle', 'audio', 'video'
     """
+    with STAGE_SECONDS.time(stage="download"):
+        return _download_content(url, mode, progress_callback, dedupe_lookup)
+
+
+def _download_content(url: str, mode: str, progress_callback, dedupe_lookup) -> tuple[Path, str, str]:
     # Pre-process URL
     url = _normalize_douyin_url(url)
     print(f"准备智能处理: {url}")
@@ -577,7 +591,14 @@ def download_content(url: str, mode: str = "smart", progress_callback=None) -> t
             if valid_subs:
                 best_sub = valid_subs[0]
                 print(f"发现字幕文件: {best_sub.name}")
-                transcript_text = parse_transcript(best_sub)
+                with STAGE_SECONDS.time(stage="subtitle_parse"):
+                    transcript_text = parse_transcript(best_sub)
+                
+                if dedupe_lookup is not None and transcript_text.strip():
+                    check_near_duplicate(
+                        f"{info.get('extractor_key') or ''}:{video_id}", url, info.get('title') or '', info.get('duration'),
+                        transcript_text, dedupe_lookup
+                    )
                 
                 if mode == "smart" and transcript_text.strip():
                     if progress_callback:
@@ -590,6 +611,8 @@ def download_content(url: str, mode: str = "smart", progress_callback=None) -> t
                      if progress_callback:
                         progress_callback("Subtitles found (saved for transcript).")
 
+    except NearDuplicateFound:
+        raise
     except Exception as e:
         print(f"字幕提取尝试失败: {e}", file=sys.stderr)
 
@@ -5,14 +5,33 @@ B 站收藏夹解析服务
 import re
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-import httpx
+import math
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from .bilibili_rate_limiter import bilibili_limiter
+from .clients.bilibili_client import get_shared_client
+from .metrics import record_bilibili_code
 
 logger = logging.getLogger(__name__)
 
 # B 站 API 基础路径
 BILIBILI_API = "https://api.bilibili.com"
 
+# 收藏夹分页大小与并发预取页数
+FAVORITES_PAGE_SIZE = 20
+FAVORITES_PREFETCH_PAGES = 4
+# 单页失败后的重试次数（每次重试同样经过共享限流器）
+FAVORITES_PAGE_RETRIES = 2
+FAVORITES_RETRY_BACKOFF = 0.5  # 秒，按重试次数指数增长
+
+
+class FavoritesFetchError(Exception):
+    """收藏夹某一页重试后仍获取失败；已产出的视频只是部分结果"""
+
+    def __init__(self, page: int, cause: Exception):
+        super().__init__(f"收藏夹第 {page} 页获取失败: {cause}")
+        self.page = page
+
 
 def parse_favorites_url(url: str) -> Optional[str]:
     """
@@ -39,28 +58,29 @@ async def fetch_favorites_info(media_id: str) -> Dict[str, Any]:
     url = f"{BILIBILI_API}/x/v3/fav/folder/info"
     params = {"media_id": media_id}
     
-    async with httpx.AsyncClient(timeout=10) as client:
-        response = await client.get(url, params=params)
-        data = response.json()
-        
-        if data.get("code") != 0:
-            error_msg = data.get("message", "获取收藏夹信息失败")
-            logger.error(f"Failed to fetch favorites info: {error_msg}")
-            raise ValueError(error_msg)
-        
-        info = data.get("data", {})
-        return {
-            "title": info.get("title", "未知收藏夹"),
-            "owner": info.get("upper", {}).get("name", "未知用户"),
-            "media_count": info.get("media_count", 0),
-            "cover": info.get("cover", "")
-        }
+    await bilibili_limiter.acquire()
+    response = await get_shared_client().get(url, params=params)
+    data = response.json()
+    record_bilibili_code("fav/folder/info", data.get("code"))
+    
+    if data.get("code") != 0:
+        error_msg = data.get("message", "获取收藏夹信息失败")
+        logger.error(f"Failed to fetch favorites info: {error_msg}")
+        raise ValueError(error_msg)
+    
+    info = data.get("data", {})
+    return {
+        "title": info.get("title", "未知收藏夹"),
+        "owner": info.get("upper", {}).get("name", "未知用户"),
+        "media_count": info.get("media_count", 0),
+        "cover": info.get("cover", "")
+    }
 
 
 async def fetch_favorites_videos(
     media_id: str,
     page: int = 1,
-    page_size: int = 20
+    page_size: int = FAVORITES_PAGE_SIZE
 ) -> Dict[str, Any]:
     """
     分页获取收藏夹中的视频列表
@@ -77,59 +97,114 @@ async def fetch_favorites_videos(
         "platform": "web"
     }
     
-    async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
-        response = await client.get(url, params=params)
-        data = response.json()
-        
-        if data.get("code") != 0:
-            error_msg = data.get("message", "获取视频列表失败")
-            logger.error(f"Failed to fetch favorites videos: {error_msg}")
-            raise ValueError(error_msg)
-        
-        result = data.get("data", {})
-        medias = result.get("medias") or []
-        
-        videos = []
-        for item in medias:
-            # 过滤失效视频
-            if item.get("attr") == 1:
-                continue
-                
-            videos.append({
-                "bvid": item.get("bvid", ""),
-                "title": item.get("title", ""),
-                "cover": item.get("cover", ""),
-                "duration": item.get("duration", 0),
-                "url": f"https://www.bilibili.com/video/{item.get('bvid', '')}",
-                "pubtime": item.get("pubtime", 0)
-            })
-        
-        return {
-            "has_more": result.get("has_more", False),
-            "total": result.get("info", {}).get("media_count", len(videos)),
-            "videos": videos
-        }
+    # 共享限流器负责控制请求节奏，共享连接池避免每页重新握手
+    await bilibili_limiter.acquire()
+    response = await get_shared_client().get(url, params=params)
+    data = response.json()
+    record_bilibili_code("fav/resource/list", data.get("code"))
+    
+    if data.get("code") != 0:
+        error_msg = data.get("message", "获取视频列表失败")
+        logger.error(f"Failed to fetch favorites videos: {error_msg}")
+        raise ValueError(error_msg)
+    
+    result = data.get("data", {})
+    medias = result.get("medias") or []
+    
+    videos = []
+    for item in medias:
+        # 过滤失效视频
+        if item.get("attr") == 1:
+            continue
+            
+        videos.append({
+            "bvid": item.get("bvid", ""),
+            "title": item.get("title", ""),
+            "cover": item.get("cover", ""),
+            "duration": item.get("duration", 0),
+            "url": f"https://www.bilibili.com/video/{item.get('bvid', '')}",
+            "pubtime": item.get("pubtime", 0)
+        })
+    
+    return {
+        "has_more": result.get("has_more", False),
+        "total": result.get("info", {}).get("media_count", len(videos)),
+        "videos": videos
+    }
+
+
+async def _fetch_page_with_retry(media_id: str, page: int, page_size: int) -> Dict[str, Any]:
+    for attempt in range(FAVORITES_PAGE_RETRIES + 1):
+        try:
+            return await fetch_favorites_videos(media_id, page, page_size)
+        except Exception as e:
+            if attempt == FAVORITES_PAGE_RETRIES:
+                raise FavoritesFetchError(page, e) from e
+            logger.warning(f"Favorites page {page} failed (attempt {attempt + 1}), retrying: {e}")
+            await asyncio.sleep(FAVORITES_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def iter_favorites_videos(
+    media_id: str,
+    limit: int = 100,
+    first_page: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    逐个产出收藏夹视频（带上限）
+
+    先取第 1 页，用 media_count 规划剩余页数，再以有限并发预取后续页，
+    按页序产出，调用方无需等待全部抓取完成即可开始处理。
+    media_count 包含失效视频，实际产出数可能更少，调用方应以产出数为准。
+
+    Raises:
+        FavoritesFetchError: 某一页重试后仍失败（此前已产出的视频为部分结果）
+
+    Args:
+        media_id: 收藏夹 ID
+        limit: 最多产出的视频数
+        first_page: 已获取的第 1 页结果（可选，避免重复请求）
+    """
+    page_size = FAVORITES_PAGE_SIZE
+    if first_page is None:
+        first_page = await _fetch_page_with_retry(media_id, 1, page_size)
+
+    yielded = 0
+    for video in first_page.get("videos", []):
+        if yielded >= limit:
+            return
+        yield video
+        yielded += 1
+
+    if not first_page.get("has_more"):
+        return
+
+    total = min(first_page.get("total") or 0, limit)
+    last_page = math.ceil(total / page_size)
+    if last_page < 2:
+        return
+
+    semaphore = asyncio.Semaphore(FAVORITES_PREFETCH_PAGES)
+
+    async def fetch_page(page: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await _fetch_page_with_retry(media_id, page, page_size)
+
+    tasks = [asyncio.create_task(fetch_page(page)) for page in range(2, last_page + 1)]
+    try:
+        for task in tasks:
+            result = await task
+            for video in result.get("videos", []):
+                if yielded >= limit:
+                    return
+                yield video
+                yielded += 1
+            if not result.get("has_more"):
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def fetch_all_favorites_videos(media_id: str, limit: int = 100) -> List[Dict[str, Any]]:
     """获取收藏夹中的全部视频（带上限）"""
-    all_videos = []
-    page = 1
-    page_size = 20
-    
-    while len(all_videos) < limit:
-        result = await fetch_favorites_videos(media_id, page, page_size)
-        videos = result.get("videos", [])
-        
-        if not videos:
-            break
-            
-        all_videos.extend(videos)
-        
-        if not result.get("has_more") or len(all_videos) >= limit:
-            break
-            
-        page += 1
-        await asyncio.sleep(0.5)  # 避免请求过快
-        
-    return all_videos[:limit]
+    return [video async for video in iter_favorites_videos(media_id, limit)]
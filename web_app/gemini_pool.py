@@ -0,0 +1,415 @@
+"""
+Gemini 客户端池
+- 进程内只初始化一次：每个 API Key 一套 SDK client，不再每次调用 configure / 新建
+- 支持多个 API Key（GOOGLE_API_KEYS 逗号分隔，兼容单个 GOOGLE_API_KEY）
+- 每个 Key 独立统计 RPM / TPM（60 秒滑动窗口），请求路由到负载最低的 Key
+- 429 / 5xx 连续出现时熔断该 Key，冷却后放行一次试探请求（半开）
+- 上传的文件只能由上传它的 Key 访问，后续请求自动固定到该 Key
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import logging
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
+GEMINI_KEY_RPM = int(os.getenv("GEMINI_KEY_RPM", "60"))
+GEMINI_KEY_TPM = int(os.getenv("GEMINI_KEY_TPM", "1000000"))
+GEMINI_CIRCUIT_THRESHOLD = int(os.getenv("GEMINI_CIRCUIT_THRESHOLD", "3"))
+GEMINI_CIRCUIT_COOLDOWN = float(os.getenv("GEMINI_CIRCUIT_COOLDOWN", "30"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "60"))
+
+WINDOW_SECONDS = 60
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_TRACKED_FILES = 2048
+
+
+class GeminiUnavailableError(Exception):
+    """没有可用的 API Key（未配置或全部熔断）"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """从 SDK 异常中提取 HTTP 状态码（google.api_core 异常的 code 为 int）"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _usage_tokens(response: Any) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return int(getattr(usage, "total_token_count", 0) or 0)
+
+
+class GenaiKeyClient:
+    """
+    绑定单个 API Key 的 google.generativeai 客户端（不修改全局 configure）
+
+    使用了 SDK 的内部接口 _ClientManager / GenerativeModel._client，requirements.txt 因此固定了 SDK 版本；
+    内部接口不存在时在初始化时直接报错，而不是在调用时静默使用全局 Key。
+    """
+
+    def __init__(self, api_key: str):
+        try:
+            from google.generativeai.client import _ClientManager
+        except ImportError as e:
+            raise RuntimeError(
+                "google-generativeai internals changed; pin the version in requirements.txt"
+            ) from e
+
+        self._manager = _ClientManager()
+        self._manager.configure(api_key=api_key)
+
+    def model(self, model_name: str, **kwargs) -> Any:
+        import google.generativeai as genai
+
+        model = genai.GenerativeModel(model_name=model_name, **kwargs)
+        if not hasattr(model, "_client"):
+            raise RuntimeError(
+                "google-generativeai internals changed; pin the version in requirements.txt"
+            )
+        model._client = self._manager.get_default_client("generative")
+        return model
+
+    def upload_file(self, path: str, mime_type: Optional[str] = None) -> Any:
+        import mimetypes
+        from pathlib import Path
+        from google.generativeai.types import file_types
+
+        path = Path(path)
+        if mime_type is None:
+            mime_type, _ = mimetypes.guess_type(path)
+        if mime_type is None:
+            raise ValueError(f"Unknown mime type: {path.name}")
+        response = self._manager.get_default_client("file").create_file(
+            path=path, mime_type=mime_type, name=None, display_name=path.name, resumable=True
+        )
+        return file_types.File(response)
+
+    def get_file(self, name: str) -> Any:
+        from google.generativeai.types import file_types
+
+        return file_types.File(self._manager.get_default_client("file").get_file(name=name))
+
+    def delete_file(self, name: str) -> None:
+        from google.generativeai import protos
+
+        self._manager.get_default_client("file").delete_file(request=protos.DeleteFileRequest(name=name))
+
+
+class KeySlot:
+    """单个 API Key 的配额窗口与熔断状态"""
+
+    def __init__(self, label: str, client: Any, rpm_limit: int, tpm_limit: int):
+        self.label = label
+        self.client = client
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.requests: Deque[float] = deque()
+        self.tokens: Deque[Tuple[float, int]] = deque()
+        self.token_sum = 0
+        self.inflight = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.half_open = False
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_errors = 0
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - WINDOW_SECONDS
+        while self.requests and self.requests[0] <= cutoff:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] <= cutoff:
+            self.token_sum -= self.tokens.popleft()[1]
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+    def has_quota(self, now: float) -> bool:
+        self._trim(now)
+        return (
+            len(self.requests) + self.inflight < self.rpm_limit
+            and self.token_sum < self.tpm_limit
+        )
+
+    def load(self, now: float) -> float:
+        """负载：RPM / TPM 使用率中较高者（进行中的请求计入 RPM）"""
+        self._trim(now)
+        rpm = (len(self.requests) + self.inflight) / max(self.rpm_limit, 1)
+        tpm = self.token_sum / max(self.tpm_limit, 1)
+        return max(rpm, tpm)
+
+    def next_free_at(self, now: float) -> float:
+        """预计最早恢复可用的时间点"""
+        candidates = [now + 0.05]
+        if self.is_open(now):
+            candidates.append(self.open_until)
+        if self.requests:
+            candidates.append(self.requests[0] + WINDOW_SECONDS)
+        if self.tokens and self.token_sum >= self.tpm_limit:
+            candidates.append(self.tokens[0][0] + WINDOW_SECONDS)
+        return max(candidates)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        self._trim(now)
+        return {
+            "key": self.label,
+            "rpm": len(self.requests),
+            "tpm": self.token_sum,
+            "inflight": self.inflight,
+            "circuit_open": self.is_open(now),
+            "requests": self.total_requests,
+            "tokens": self.total_tokens,
+            "errors": self.total_errors
+        }
+
+
+class GeminiLease:
+    """一次借出的 Key；调用方通过 add_tokens 上报用量"""
+
+    def __init__(self, slot: KeySlot):
+        self.slot = slot
+        self.client = slot.client
+        self.tokens = 0
+
+    def add_tokens(self, tokens: int) -> None:
+        self.tokens += max(int(tokens or 0), 0)
+
+    def record_response(self, response: Any) -> Any:
+        self.add_tokens(_usage_tokens(response))
+        return response
+
+
+class GeminiPool:
+    """
+    多 Key 客户端池
+    - lease()：借出负载最低的 Key（或文件所属的 Key），退出时记录用量/错误
+    - generate()：一次完整的 generate_content 调用，可重试的错误会换 Key 重试
+    """
+
+    def __init__(
+        self,
+        keys: Optional[List[str]] = None,
+        client_factory: Callable[[str], Any] = GenaiKeyClient,
+        rpm_limit: int = GEMINI_KEY_RPM,
+        tpm_limit: int = GEMINI_KEY_TPM,
+        failure_threshold: int = GEMINI_CIRCUIT_THRESHOLD,
+        cooldown: float = GEMINI_CIRCUIT_COOLDOWN,
+        max_wait: float = GEMINI_MAX_WAIT
+    ):
+        self._keys = keys
+        self._client_factory = client_factory
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._slots: Optional[List[KeySlot]] = None
+        self._file_owner: "OrderedDict[str, KeySlot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+
+    # ---- 初始化 ----
+
+    def _load_keys(self) -> List[str]:
+        if self._keys is not None:
+            return self._keys
+        load_dotenv()
+        raw = os.getenv("GOOGLE_API_KEYS") or os.getenv("GOOGLE_API_KEY") or ""
+        return [key.strip() for key in raw.split(",") if key.strip()]
+
+    def _ensure_slots(self) -> List[KeySlot]:
+        if self._slots is None:
+            with self._lock:
+                if self._slots is None:
+                    self._slots = [
+                        KeySlot(f"key-{i}", self._client_factory(key), self.rpm_limit, self.tpm_limit)
+                        for i, key in enumerate(self._load_keys())
+                    ]
+                    if self._slots:
+                        logger.info(f"Gemini pool initialized with {len(self._slots)} key(s)")
+        return self._slots
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._ensure_slots())
+
+    # ---- 路由 ----
+
+    def _pick(self, now: float, exclude: Tuple[KeySlot, ...]) -> Tuple[Optional[KeySlot], float]:
+        """选出可用且负载最低的 Key；没有可用 Key 时返回最早恢复时间"""
+        candidates = [slot for slot in self._slots if slot not in exclude] or list(self._slots)
+        ready = [
+            slot for slot in candidates
+            if not slot.is_open(now) and not slot.half_open and slot.has_quota(now)
+        ]
+        if ready:
+            return min(ready, key=lambda s: (s.load(now), s.inflight)), now
+        return None, min(slot.next_free_at(now) for slot in candidates)
+
+    def _acquire(self, pinned: Optional[KeySlot], exclude: Tuple[KeySlot, ...]) -> KeySlot:
+        slots = self._ensure_slots()
+        if not slots:
+            raise GeminiUnavailableError("GOOGLE_API_KEY not found.")
+
+        deadline = time.monotonic() + self.max_wait
+        with self._freed:
+            while True:
+                now = time.time()
+                if pinned is not None:
+                    # 文件只存在于上传它的 Key 下：即使熔断也只能用它，但仍遵守配额
+                    slot = pinned if pinned.has_quota(now) else None
+                    wake_at = pinned.next_free_at(now)
+                else:
+                    slot, wake_at = self._pick(now, exclude)
+                    if slot is not None and slot.open_until:
+                        # 冷却结束：半开，只放行这一个试探请求
+                        slot.half_open = True
+
+                if slot is not None:
+                    slot.inflight += 1
+                    return slot
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise GeminiUnavailableError("All Gemini keys are rate limited or unavailable")
+                self._freed.wait(timeout=min(max(wake_at - now, 0.05), remaining))
+
+    def _release(self, slot: KeySlot, tokens: int, error: Optional[Exception]) -> None:
+        now = time.time()
+        with self._freed:
+            slot.inflight -= 1
+            slot.requests.append(now)
+            slot.total_requests += 1
+            if tokens:
+                slot.tokens.append((now, tokens))
+                slot.token_sum += tokens
+                slot.total_tokens += tokens
+
+            status = _status_code(error) if error is not None else None
+            if error is not None:
+                slot.total_errors += 1
+            if status in RETRYABLE_STATUS:
+                slot.failures += 1
+                if slot.half_open or slot.failures >= self.failure_threshold:
+                    slot.open_until = now + self.cooldown
+                    logger.warning(f"Gemini {slot.label} circuit opened for {self.cooldown:.0f}s (status={status})")
+            elif error is None:
+                slot.failures = 0
+                slot.open_until = 0.0
+            slot.half_open = False
+            self._freed.notify_all()
+
+    @contextmanager
+    def lease(self, file: Any = None, exclude: Tuple[KeySlot, ...] = ()):
+        """借出一个 Key；传入已上传的文件时固定到该文件所属的 Key"""
+        slot = self._acquire(self.slot_for_file(file), exclude)
+        lease = GeminiLease(slot)
+        try:
+            yield lease
+        except Exception as e:
+            self._release(slot, lease.tokens, e)
+            raise
+        self._release(slot, lease.tokens, None)
+
+    # ---- 常用调用 ----
+
+    def generate(
+        self,
+        contents: Any,
+        file: Any = None,
+        model_name: str = GEMINI_MODEL,
+        **kwargs
+    ) -> Any:
+        """
+        generate_content 的池化版本
+
+        未固定 Key 时，429 / 5xx 会换一个 Key 重试（每个 Key 最多一次）。
+        """
+        tried: Tuple[KeySlot, ...] = ()
+        while True:
+            slot = None
+            try:
+                with self.lease(file=file, exclude=tried) as lease:
+                    slot = lease.slot
+                    model = lease.client.model(model_name)
+                    return lease.record_response(model.generate_content(contents, **kwargs))
+            except Exception as e:
+                if slot is None or file is not None or _status_code(e) not in RETRYABLE_STATUS:
+                    raise
+                tried = tried + (slot,)
+                if len(tried) >= len(self._slots):
+                    raise
+                logger.warning(f"Gemini {slot.label} failed ({_status_code(e)}), retrying on another key")
+
+    def generate_stream(
+        self,
+        contents: Any,
+        on_text: Callable[[str], None],
+        file: Any = None,
+        model_name: str = GEMINI_MODEL,
+        **kwargs
+    ) -> Any:
+        """
+        流式 generate_content：每个分片的文本交给 on_text，返回迭代完毕的完整响应
+
+        已经输出过分片后无法透明重试，因此流式调用不换 Key 重试。
+        """
+        with self.lease(file=file) as lease:
+            model = lease.client.model(model_name)
+            response = model.generate_content(contents, stream=True, **kwargs)
+            for chunk in response:
+                text = getattr(chunk, "text", "") if getattr(chunk, "parts", None) else ""
+                if text:
+                    on_text(text)
+            return lease.record_response(response)
+
+    def upload_file(self, path: Any, mime_type: Optional[str] = None) -> Any:
+        """上传文件并记录其所属 Key"""
+        with self.lease() as lease:
+            media_file = lease.client.upload_file(str(path), mime_type=mime_type)
+        self._remember_file(media_file, lease.slot)
+        return media_file
+
+    def get_file(self, file: Any) -> Any:
+        slot = self.slot_for_file(file) or self._ensure_slots()[0]
+        refreshed = slot.client.get_file(file.name)
+        self._remember_file(refreshed, slot)
+        return refreshed
+
+    def delete_file(self, file: Any) -> None:
+        slot = self.slot_for_file(file) or self._ensure_slots()[0]
+        slot.client.delete_file(file.name)
+        with self._lock:
+            self._file_owner.pop(file.name, None)
+
+    def slot_for_file(self, file: Any) -> Optional[KeySlot]:
+        name = getattr(file, "name", None)
+        if not name:
+            return None
+        with self._lock:
+            return self._file_owner.get(name)
+
+    def _remember_file(self, file: Any, slot: KeySlot) -> None:
+        with self._lock:
+            self._file_owner[file.name] = slot
+            self._file_owner.move_to_end(file.name)
+            while len(self._file_owner) > MAX_TRACKED_FILES:
+                self._file_owner.popitem(last=False)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [slot.stats(now) for slot in (self._slots or [])]
+
+
+# 全局客户端池（首次调用时读取 Key 并初始化）
+gemini_pool = GeminiPool()
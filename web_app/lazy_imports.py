@@ -0,0 +1,46 @@
+"""
+重依赖的延迟导入
+
+yt_dlp、pptx、PIL、qrcode 等包单独导入就要几十到上百毫秒，而大多数请求（以及测试收集、
+Render 冷启动）根本用不到它们。lazy_module() 返回一个代理对象，第一次访问属性时才真正导入：
+
+    yt_dlp = lazy_module("yt_dlp")
+    ...
+    with yt_dlp.YoutubeDL(opts) as ydl:   # 此时才 import yt_dlp
+
+导入由解释器的导入锁保护，多线程同时首次访问是安全的；包未安装时在首次使用处抛出 ImportError。
+代理只转发属性访问，需要模块对象本身（isinstance、monkeypatch 整个模块）时调用 .load()。
+"""
+import importlib
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule:
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """按模块全名（可以是子模块，如 "pptx.util"）创建延迟导入代理"""
+    return LazyModule(name)
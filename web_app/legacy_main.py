@@ -48,12 +48,15 @@ from .schemas import (
 
 # --- web_app 内部模块导入 ---
 from .downloader import download_content
+from .near_duplicate import NearDuplicateFound
 from .summarizer_gemini import summarize_content, extract_ai_transcript, upload_to_gemini, delete_gemini_file
-from .cache import get_cached_result, save_to_cache, get_cache_stats
+from .cache import get_cached_result, save_to_cache, get_cache_stats, get_base_extraction, save_base_extraction
 from .queue_manager import task_queue
 from .rate_limiter import rate_limiter
 from .auth import get_current_user, verify_session_token
-from .credits import ensure_user_credits, get_user_credits, charge_user_credits, get_daily_usage, grant_credits, get_credit_history
+from .credits import (
+    ensure_user_credits, get_user_credits, get_daily_usage, grant_credits, get_credit_history
+)
 from .payments import (
     create_alipay_payment,
     create_wechat_payment,
@@ -67,9 +70,10 @@ from .payments import (
 )
 from .idempotency import idempotency
 from .reconciliation import reconciliation
+from . import credit_ledger
 from .batch_summarize import batch_service
 from .share_card import generate_share_card, get_card_image
-from .favorites import parse_favorites_url, fetch_favorites_info, fetch_favorites_videos, fetch_all_favorites_videos
+from .favorites import parse_favorites_url, fetch_favorites_info, fetch_favorites_videos, iter_favorites_videos
 from .templates import get_user_templates, get_template_by_id, create_template, update_template, delete_template
 from .tts import generate_tts, VOICES
 from .services.subscriptions_service import search_up, subscribe_up, unsubscribe_up, get_user_subscriptions
@@ -81,8 +85,10 @@ from .teams import (
 )
 from .routers.dashboard import is_subscription_active
 from .telemetry import record_failure
+from .prewarm import prewarm_service
 from typing import List
 from .db import get_connection, get_backend_info, using_postgres
+from .db_async import execute, fetch_all, fetch_one, run_db
 from io import BytesIO
 import secrets
 import hashlib
@@ -153,6 +159,7 @@ async def run_summarization(
         user = None
         unlimited_user = False
         credit_cost = 10
+        credit_hold = None
         
         try:
             if not token:
@@ -170,18 +177,22 @@ async def run_summarization(
                         yield f"data: {json.dumps({'type': 'error', 'code': 'RATE_LIMITED', 'error': f'请求过于频繁，请等待 {wait_time:.0f} 秒后重试'})}\n\n"
                         return
 
-                ensure_user_credits(user["user_id"])
-                unlimited_user = is_unlimited_user(user) or is_subscription_active(user["user_id"])
+                # 积分与订阅一次查询，后续余额检查、是否扣费都命中请求内的用户上下文
+                await run_db(ensure_user_credits, user["user_id"])
+                unlimited_user = is_unlimited_user(user) or await run_db(is_subscription_active, user["user_id"])
             except HTTPException as e:
                 record_failure(None, "AUTH_INVALID", "auth", str(e.detail))
                 yield f"data: {json.dumps({'type': 'error', 'code': 'AUTH_INVALID', 'error': e.detail})}\n\n"
                 return
 
             # 检查缓存
+            base = None
             if not skip_cache:
-                cached = get_cached_result(url, mode, focus)
+                cached = await run_db(get_cached_result, url, mode, focus, template_id, output_language)
                 if cached:
                     logger.info(f"命中缓存: {url}")
+                    if cached["usage"].get("prewarmed"):
+                        prewarm_service.record_hit(url)
                     yield f"data: {json.dumps({'type': 'status', 'status': 'Found in cache! Loading...'})}\n\n"
                     # Emit all events for cached content using the same payload shape as live SSE
                     yield f"data: {json.dumps({'type': 'transcript_complete', 'transcript': cached['transcript']})}\n\n"
@@ -189,10 +200,15 @@ async def run_summarization(
                     # Finally emit completion
                     yield f"data: {json.dumps({'type': 'status', 'status': 'complete'})}\n\n"
                     return
+                # 同一视频已有基础提取：换侧重点/模板/语言只需一次纯文本调用
+                base = await run_db(get_base_extraction, url, mode)
 
             if user and not unlimited_user:
-                credits = get_user_credits(user["user_id"])
-                if not credits or credits["credits"] < credit_cost:
+                # 先预留积分：并发请求不会都通过余额检查后再在结尾扣费失败
+                credit_hold = await run_db(
+                    credit_ledger.reserve, user["user_id"], credit_cost, json.dumps({"url": safe_url})
+                )
+                if not credit_hold:
                     record_failure(user["user_id"], "CREDITS_EXCEEDED", "quota", "insufficient credits")
                     yield f"data: {json.dumps({'type': 'error', 'code': 'CREDITS_EXCEEDED', 'error': '积分不足，请升级或稍后再试'})}\n\n"
                     return
@@ -203,6 +219,9 @@ async def run_summarization(
             def progress_callback(status):
                 loop.call_soon_threadsafe(queue.put_nowait, {'type': 'status', 'data': status})
 
+            def summary_delta_callback(delta):
+                loop.call_soon_threadsafe(queue.put_nowait, {'type': 'summary_delta', 'data': delta})
+
             # Task wrapper to send results to queue
             async def task_wrapper(name, coro):
                 try:
@@ -220,19 +239,61 @@ async def run_summarization(
                     await queue.put({'type': 'error', 'data': str(e), 'source': name})
 
 
+            async def run_queued(task_type, payload):
+                task_id = await task_queue.submit(task_type, payload)
+                # 轮询任务状态 (或者可以使用更复杂的事件通知机制)
+                from .queue_manager import TaskStatus
+                while True:
+                    task = task_queue.get_task_status(task_id)
+                    if not task: raise Exception("Task disappeared")
+                    if task.status == TaskStatus.COMPLETED:
+                        return task.result
+                    if task.status == TaskStatus.FAILED:
+                        raise Exception(task.error)
+                    await asyncio.sleep(0.5)
+
+            def dedupe_lookup(candidate_url):
+                # 在下载线程中调用：查询同样交给数据库线程池，与其他 DB 调用共用并发上限
+                return asyncio.run_coroutine_threadsafe(
+                    run_db(get_cached_result, candidate_url, mode, focus, template_id, output_language), loop
+                ).result()
+
             # 1. Download Content
             # ... (download logic) ...
             try:
-                video_path, media_type, transcript = await loop.run_in_executor(None, download_content, url, mode, progress_callback)
+                if base:
+                    logger.info(f"复用基础提取: {safe_url}")
+                    video_path, media_type, transcript = None, 'base', base['transcript']
+                    yield f"data: {json.dumps({'type': 'status', 'status': 'Reusing previous analysis of this video...'})}\n\n"
+                else:
+                    video_path, media_type, transcript = await loop.run_in_executor(
+                        None,
+                        lambda: download_content(url, mode, progress_callback, dedupe_lookup=None if skip_cache else dedupe_lookup)
+                    )
                 
                 # Immediately notify frontend about video
-                video_filename = os.path.basename(video_path) if video_path else None
-                await queue.put({'type': 'video_downloaded', 'data': {'filename': video_filename}})
+                if not base:
+                    video_filename = os.path.basename(video_path) if video_path else None
+                    await queue.put({'type': 'video_downloaded', 'data': {'filename': video_filename}})
                 
                 # If transcript exists from download (e.g. subtitles), emit it now
                 if transcript:
                     await queue.put({'type': 'transcript_complete', 'data': transcript, 'source': 'subtitle'})
 
+            except NearDuplicateFound as dup:
+                # 转载/搬运视频：复用原视频的总结，不下载媒体、不调用 AI、不扣积分
+                logger.info(f"命中近重复内容: {safe_url} -> {dup.source_url} (distance={dup.distance})")
+                cached = dup.cached
+                usage = {**cached['usage'], 'near_duplicate_of': dup.source_url}
+                await run_db(
+                    save_to_cache, url, mode, focus, cached['summary'], cached['transcript'] or '', usage,
+                    template_id, output_language
+                )
+                yield f"data: {json.dumps({'type': 'status', 'status': 'Found a near-duplicate video in cache! Loading...'})}\n\n"
+                yield f"data: {json.dumps({'type': 'transcript_complete', 'transcript': cached['transcript']})}\n\n"
+                yield f"data: {json.dumps({'type': 'summary_complete', 'summary': cached['summary'], 'usage': usage, 'transcript': cached['transcript'], 'cached': True, 'near_duplicate_of': dup.source_url})}\n\n"
+                yield f"data: {json.dumps({'type': 'status', 'status': 'complete'})}\n\n"
+                return
             except Exception as e:
                 record_failure(user["user_id"] if user else None, "DOWNLOAD_FAILED", "download", str(e))
                 yield f"data: {json.dumps({'type': 'error', 'code': 'DOWNLOAD_FAILED', 'error': str(e)})}\n\n"
@@ -245,9 +306,11 @@ async def run_summarization(
             # 3. Start Parallel Tasks
             active_tasks = 0
 
-            # Task A: Summary
+            # Task A: Summary（两级：已有基础提取时只做纯文本调用；视频/音频冷启动时一次多模态调用同时产出基础笔记）
+            new_base = {}
+
             async def summary_via_queue():
-                task_id = await task_queue.submit('summarize', {
+                payload = {
                     'file_path': video_path,
                     'media_type': media_type,
                     'progress_callback': progress_callback,
@@ -255,18 +318,25 @@ async def run_summarization(
                     'uploaded_file': remote_file,
                     'template_id': template_id,
                     'output_language': output_language,
-                    'enable_cot': enable_cot
-                })
-                # 轮询任务状态 (或者可以使用更复杂的事件通知机制)
-                from .queue_manager import TaskStatus
-                while True:
-                    task = task_queue.get_task_status(task_id)
-                    if not task: raise Exception("Task disappeared")
-                    if task.status == TaskStatus.COMPLETED:
-                        return task.result
-                    if task.status == TaskStatus.FAILED:
-                        raise Exception(task.error)
-                    await asyncio.sleep(0.5)
+                    'enable_cot': enable_cot,
+                    'stream_callback': summary_delta_callback
+                }
+                if base:
+                    payload['base_text'] = base['notes'] or base['transcript']
+                elif media_type in ['audio', 'video']:
+                    summary_text, usage, notes = await run_queued('summarize', {**payload, 'with_base_notes': True})
+                    if notes:
+                        new_base.update(notes=notes, usage=dict(usage))
+                    usage['base_reused'] = False
+                    return summary_text, usage
+                elif transcript:
+                    # 字幕模式：字幕本身就是基础文本
+                    payload['base_text'] = transcript
+                    new_base.update(notes='', usage={})
+
+                summary_text, usage = await run_queued('summarize', payload)
+                usage['base_reused'] = bool(base)
+                return summary_text, usage
 
             asyncio.create_task(task_wrapper('summary', summary_via_queue()))
             active_tasks += 1
@@ -280,20 +350,11 @@ async def run_summarization(
                 transcript_audio_path = await loop.run_in_executor(None, extract_audio_for_transcript, video_path)
             if need_transcript:
                 async def transcript_via_queue():
-                    task_id = await task_queue.submit('transcript', {
+                    return await run_queued('transcript', {
                         'file_path': transcript_audio_path or video_path,
                         'progress_callback': progress_callback,
                         'uploaded_file': None if transcript_audio_path else remote_file
                     })
-                    from .queue_manager import TaskStatus
-                    while True:
-                        task = task_queue.get_task_status(task_id)
-                        if not task: raise Exception("Task disappeared")
-                        if task.status == TaskStatus.COMPLETED:
-                            return task.result
-                        if task.status == TaskStatus.FAILED:
-                            raise Exception(task.error)
-                        await asyncio.sleep(0.5)
 
                 asyncio.create_task(task_wrapper('transcript', transcript_via_queue()))
                 active_tasks += 1
@@ -319,6 +380,8 @@ async def run_summarization(
 
                     if msg_type == 'status':
                          yield f"data: {json.dumps({'type': 'status', 'status': data})}\n\n"
+                    elif msg_type == 'summary_delta':
+                         yield f"data: {json.dumps({'type': 'summary_delta', 'delta': data})}\n\n"
                     elif msg_type == 'video_downloaded':
                          yield f"data: {json.dumps({'type': 'video_downloaded', 'video_file': data['filename']})}\n\n"
                     elif msg_type == 'transcript_complete':
@@ -349,9 +412,17 @@ async def run_summarization(
                      yield f"data: {json.dumps({'type': 'status', 'status': 'AI analysis is taking longer than expected...'})}\n\n"
             
             if final_summary:
-                 if user and not unlimited_user:
-                     charge_user_credits(user["user_id"], credit_cost, metadata=json.dumps({"url": safe_url}))
-                 save_to_cache(url, mode, focus, final_summary, final_transcript or '', final_usage)
+                 if credit_hold:
+                     await run_db(credit_ledger.commit, credit_hold, credit_cost, json.dumps({"url": safe_url}))
+                     credit_hold = None
+                 await run_db(
+                     save_to_cache, url, mode, focus, final_summary, final_transcript or '', final_usage,
+                     template_id, output_language
+                 )
+                 if new_base:
+                     await run_db(
+                         save_base_extraction, url, mode, new_base['notes'], final_transcript or '', new_base['usage']
+                     )
                  yield f"data: {json.dumps({'type': 'status', 'status': 'complete'})}\n\n"
 
         except Exception as e:
@@ -359,6 +430,9 @@ async def run_summarization(
             record_failure(user["user_id"] if user else None, "INTERNAL_ERROR", "sse", str(e))
             yield f"data: {json.dumps({'type': 'error', 'code': 'INTERNAL_ERROR', 'error': str(e)})}\n\n"
         finally:
+            if credit_hold:
+                 # 未产出总结（失败、命中近重复、客户端断开）：释放预留，不扣积分
+                 asyncio.get_running_loop().run_in_executor(None, credit_ledger.release, credit_hold)
             if remote_file:
                  # Start cleanup in executor, but don't wrap in create_task since it returns a future
                  loop.run_in_executor(None, delete_gemini_file, remote_file)
@@ -400,9 +474,11 @@ async def get_dashboard(request: Request):
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
     
-    credits = ensure_user_credits(user["user_id"])
-    usage = get_daily_usage(user["user_id"])
-    history = get_credit_history(user["user_id"])
+    credits, usage, history = await asyncio.gather(
+        run_db(ensure_user_credits, user["user_id"]),
+        run_db(get_daily_usage, user["user_id"]),
+        run_db(get_credit_history, user["user_id"]),
+    )
     
     return {
         "credits": credits["credits"],
@@ -416,69 +492,57 @@ async def get_dashboard(request: Request):
 
 @app.get("/api/billing/{billing_id}/invoice")
 async def download_invoice(billing_id: str, user: dict = Depends(get_current_user)):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT id, amount_cents, currency, status, period_start, period_end, created_at
-            FROM billing_events
-            WHERE id = ? AND user_id = ?
-        """, (billing_id, user["user_id"]))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(404, "Invoice not found")
-        if row[3] != "paid":
-            raise HTTPException(400, "Invoice is not paid yet")
-        invoice_path = Path("invoices")
-        invoice_path.mkdir(exist_ok=True)
-        file_path = invoice_path / f"{billing_id}.pdf"
-        if not file_path.exists():
-            from reportlab.lib.pagesizes import A4
-            from reportlab.pdfgen import canvas
-            c = canvas.Canvas(str(file_path), pagesize=A4)
-            width, height = A4
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(40, height - 60, "Bili-Summarizer 发票")
-            c.setFont("Helvetica", 11)
-            c.drawString(40, height - 100, f"账单编号: {billing_id}")
-            c.drawString(40, height - 120, f"金额: ¥{row[1] / 100:.2f} {row[2]}")
-            c.drawString(40, height - 140, f"周期: {row[4]} - {row[5]}")
-            c.drawString(40, height - 160, f"开票时间: {row[6]}")
-            c.drawString(40, height - 200, "感谢使用 Bili-Summarizer")
-            c.showPage()
-            c.save()
-        return FileResponse(str(file_path), media_type="application/pdf", filename=f"invoice-{billing_id}.pdf")
-    finally:
-        conn.close()
+    row = await fetch_one("""
+        SELECT id, amount_cents, currency, status, period_start, period_end, created_at
+        FROM billing_events
+        WHERE id = ? AND user_id = ?
+    """, (billing_id, user["user_id"]))
+    if not row:
+        raise HTTPException(404, "Invoice not found")
+    if row[3] != "paid":
+        raise HTTPException(400, "Invoice is not paid yet")
+    invoice_path = Path("invoices")
+    invoice_path.mkdir(exist_ok=True)
+    file_path = invoice_path / f"{billing_id}.pdf"
+    if not file_path.exists():
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        c = canvas.Canvas(str(file_path), pagesize=A4)
+        width, height = A4
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(40, height - 60, "Bili-Summarizer 发票")
+        c.setFont("Helvetica", 11)
+        c.drawString(40, height - 100, f"账单编号: {billing_id}")
+        c.drawString(40, height - 120, f"金额: ¥{row[1] / 100:.2f} {row[2]}")
+        c.drawString(40, height - 140, f"周期: {row[4]} - {row[5]}")
+        c.drawString(40, height - 160, f"开票时间: {row[6]}")
+        c.drawString(40, height - 200, "感谢使用 Bili-Summarizer")
+        c.showPage()
+        c.save()
+    return FileResponse(str(file_path), media_type="application/pdf", filename=f"invoice-{billing_id}.pdf")
 
 
 @app.get("/api/billing")
 async def get_billing_history(user: dict = Depends(get_current_user)):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT id, amount_cents, currency, status, period_start, period_end, invoice_url, created_at
-            FROM billing_events
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        """, (user["user_id"],))
-        rows = cursor.fetchall()
-        return [
-            {
-                "id": row[0],
-                "amount_cents": row[1],
-                "currency": row[2],
-                "status": row[3],
-                "period_start": row[4],
-                "period_end": row[5],
-                "invoice_url": row[6],
-                "created_at": row[7]
-            }
-            for row in rows
-        ]
-    finally:
-        conn.close()
+    rows = await fetch_all("""
+        SELECT id, amount_cents, currency, status, period_start, period_end, invoice_url, created_at
+        FROM billing_events
+        WHERE user_id = ?
+        ORDER BY created_at DESC
+    """, (user["user_id"],))
+    return [
+        {
+            "id": row[0],
+            "amount_cents": row[1],
+            "currency": row[2],
+            "status": row[3],
+            "period_start": row[4],
+            "period_end": row[5],
+            "invoice_url": row[6],
+            "created_at": row[7]
+        }
+        for row in rows
+    ]
 
 
 # --- 批量处理端点 ---
@@ -489,7 +553,7 @@ async def batch_summarize(request: BatchSummarizeRequest):
     
     for url in request.urls:
         # 检查缓存
-        cached = get_cached_result(url, request.mode, request.focus)
+        cached = await run_db(get_cached_result, url, request.mode, request.focus)
         if cached:
             results.append({
                 "url": url,
@@ -539,44 +603,32 @@ async def cache_stats_api():
 @app.post("/api/share")
 async def create_share_link(request: ShareRequest, user: dict = Depends(get_current_user)):
     share_id = secrets.token_urlsafe(10)
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT INTO share_links (id, user_id, title, summary, transcript, mindmap)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (share_id, user["user_id"], request.title, request.summary, request.transcript, request.mindmap))
-        conn.commit()
-        return {
-            "share_id": share_id,
-            "share_url": f"/share/{share_id}"
-        }
-    finally:
-        conn.close()
+    await execute("""
+        INSERT INTO share_links (id, user_id, title, summary, transcript, mindmap)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (share_id, user["user_id"], request.title, request.summary, request.transcript, request.mindmap))
+    return {
+        "share_id": share_id,
+        "share_url": f"/share/{share_id}"
+    }
 
 
 @app.get("/api/share/{share_id}")
 async def get_share_link(share_id: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT title, summary, transcript, mindmap, created_at
-            FROM share_links
-            WHERE id = ?
-        """, (share_id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(404, "Share link not found")
-        return {
-            "title": row[0],
-            "summary": row[1],
-            "transcript": row[2],
-            "mindmap": row[3],
-            "created_at": row[4]
-        }
-    finally:
-        conn.close()
+    row = await fetch_one("""
+        SELECT title, summary, transcript, mindmap, created_at
+        FROM share_links
+        WHERE id = ?
+    """, (share_id,))
+    if not row:
+        raise HTTPException(404, "Share link not found")
+    return {
+        "title": row[0],
+        "summary": row[1],
+        "transcript": row[2],
+        "mindmap": row[3],
+        "created_at": row[4]
+    }
 
 
 # Feedback 端点已迁移到 routers/feedback.py
@@ -736,27 +788,21 @@ async def proxy_image_api(url: str):
 @app.post("/api/chat")
 async def chat_with_ai(request: ChatRequest):
     """Answer follow-up questions based on the video context with streaming support."""
-    import google.generativeai as genai
     from fastapi.responses import StreamingResponse
+    from .llm import get_llm_backend
     
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    backend = get_llm_backend()
+    if not backend.configured:
         raise HTTPException(status_code=500, detail="API Key not configured")
     
     async def chat_generator():
         try:
-            genai.configure(api_key=api_key)
-            # Use gemini-3-flash-preview (Flash 3.0) for better follow-up questions
-            model = genai.GenerativeModel(model_name="models/gemini-3-flash-preview")
-            
             # Build conversation history
             chat_history = [
                 {"role": "user" if m.role == "user" else "model", "parts": [m.content]}
                 for m in request.history
             ]
             
-            chat_session = model.start_chat(history=chat_history)
-            
             # System instruction and context
             context_prompt = f"""你是一个视频内容助手。用户已经观看了一个视频并获取了总结。
 以下是该视频的内容背景，请基于此回答用户的追问。
@@ -776,11 +822,32 @@ async def chat_with_ai(request: ChatRequest):
             # Send the message with context
             full_prompt = f"{context_prompt}\n\n当前问题: {request.question}"
             
-            response = chat_session.send_message(full_prompt, stream=True)
-            
-            for chunk in response:
-                if chunk.text:
-                    yield f"data: {json.dumps({'content': chunk.text})}\n\n"
+            # 多轮对话 = 历史消息 + 本轮问题，一次流式生成
+            contents = chat_history + [{"role": "user", "parts": [full_prompt]}]
+
+            # 流式迭代是同步阻塞的：在线程中执行，通过队列把分片交回事件循环
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+
+            def on_text(text):
+                loop.call_soon_threadsafe(queue.put_nowait, ('content', text))
+
+            def run_chat():
+                try:
+                    backend.stream(contents, on_text, task="chat")
+                    loop.call_soon_threadsafe(queue.put_nowait, ('done', None))
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, ('error', e))
+
+            loop.run_in_executor(None, run_chat)
+            while True:
+                kind, data = await queue.get()
+                if kind == 'content':
+                    yield f"data: {json.dumps({'content': data})}\n\n"
+                elif kind == 'error':
+                    raise data
+                else:
+                    break
             
             yield f"data: {json.dumps({'done': True})}\n\n"
             
@@ -861,6 +928,31 @@ async def run_reconciliation(
         "summary": result.summary
     }
 
+@app.get("/api/admin/prewarm/stats")
+async def get_prewarm_stats(request: Request):
+    """预热命中率与预算使用情况（仅管理员）"""
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    user = await verify_session_token(token)
+
+    if not is_unlimited_user(user):
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return prewarm_service.stats()
+
+
+@app.get("/api/admin/llm/usage")
+async def get_llm_usage(request: Request):
+    """LLM 后端按任务类型的用量、耗时与估算成本（仅管理员）"""
+    from .llm import get_llm_backend
+
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    user = await verify_session_token(token)
+
+    if not is_unlimited_user(user):
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return get_llm_backend().usage()
+
 # ============ 批量总结端点 ============
 
 @app.post("/api/batch/summarize")
@@ -872,43 +964,58 @@ async def create_batch_summarize(
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
     
-    # 积分校验：每个视频固定消耗 10 积分
-    required_credits = len(body.urls) * 10
-    credits_data = get_user_credits(user["user_id"])
+    if len(body.urls) > 20:
+        raise HTTPException(status_code=400, detail="单个批次最多支持 20 个 URL")
+    
+    # 先对照缓存：命中的视频立即返回且不计费，只为未命中的视频预留积分
+    cached_results, misses = await batch_service.plan_batch(body.urls, body.mode, body.focus)
+    
+    # 积分校验：每个未命中的视频固定消耗 10 积分，完成后按条目结算（失败退还）
+    credit_cost = 10
+    required_credits = len(misses) * credit_cost
     
     # 检查是否为无限额度用户（管理员 或 Pro 订阅）
-    unlimited_user = is_unlimited_user(user) or is_subscription_active(user["user_id"])
+    unlimited_user = is_unlimited_user(user) or await run_db(is_subscription_active, user["user_id"])
+    reserved_credits = 0 if unlimited_user else required_credits
     
-    if not unlimited_user and (not credits_data or credits_data["credits"] < required_credits):
-        raise HTTPException(
-            status_code=402,
-            detail=f"余额不足。此批次需要 {required_credits} 积分，当前余额为 {credits_data['credits'] if credits_data else 0}。"
+    credit_hold = None
+    if reserved_credits:
+        credit_hold = await run_db(
+            credit_ledger.reserve, user["user_id"], reserved_credits,
+            json.dumps({"source": "batch", "count": len(misses)})
         )
+        if not credit_hold:
+            credits_data = await run_db(get_user_credits, user["user_id"])
+            raise HTTPException(
+                status_code=402,
+                detail=f"余额不足。此批次需要 {required_credits} 积分，当前余额为 {credits_data['credits'] if credits_data else 0}。"
+            )
     
     try:
         job_id = await batch_service.create_batch(
             user_id=user["user_id"],
             urls=body.urls,
             mode=body.mode,
-            focus=body.focus
+            focus=body.focus,
+            cached_results=cached_results,
+            credit_cost=credit_cost,
+            reserved_credits=reserved_credits,
+            credit_hold_id=credit_hold
         )
-        
-        # 预扣积分（仅针对非无限用户）
-        if not unlimited_user:
-            charge_user_credits(user["user_id"], required_credits)
-            
-        return {
-            "job_id": job_id,
-            "count": len(body.urls),
-            "credits_charged": required_credits if not unlimited_user else 0
-        }
     except ValueError as e:
+        if credit_hold:
+            await run_db(credit_ledger.release, credit_hold)
         raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "job_id": job_id,
+        "count": len(cached_results) + len(misses),
+        "cached_count": len(cached_results),
+        "credits_charged": reserved_credits
+    }
 
-@app.get("/api/batch/{job_id}")
-async def get_batch_job_status(job_id: str, request: Request):
-    """获取批量任务状态和结果"""
-    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+async def _get_authorized_batch_job(job_id: str, token: str):
+    """加载批量任务并校验归属"""
     user = await verify_session_token(token)
     
     job = batch_service.get_job_status(job_id)
@@ -920,6 +1027,20 @@ async def get_batch_job_status(job_id: str, request: Request):
     if job.user_id != user["user_id"] and not is_unlimited_user(user):
         raise HTTPException(status_code=403, detail="Access denied")
     
+    return job
+
+def _batch_event_payload(job, event: Dict[str, Any]) -> Dict[str, Any]:
+    """done 事件附带该 URL 的结果（每个结果只随自己的事件下发一次）"""
+    if event["stage"] == "done" and event["url"] in job.results:
+        return {**event, "result": job.results[event["url"]]}
+    return event
+
+@app.get("/api/batch/{job_id}")
+async def get_batch_job_status(job_id: str, request: Request):
+    """获取批量任务状态和结果"""
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    job = await _get_authorized_batch_job(job_id, token)
+    
     return {
         "job_id": job.id,
         "status": job.status.value,
@@ -929,10 +1050,70 @@ async def get_batch_job_status(job_id: str, request: Request):
         "failed_count": len(job.errors),
         "results": job.results if job.status.value in ["completed", "partial"] else {},
         "errors": job.errors,
+        "source_error": job.source_error,
         "created_at": job.created_at,
         "completed_at": job.completed_at
     }
 
+@app.get("/api/batch/{job_id}/delta")
+async def get_batch_job_delta(job_id: str, request: Request, cursor: int = 0):
+    """增量状态：只返回游标之后的生命周期事件，客户端用返回的 cursor 继续轮询"""
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    job = await _get_authorized_batch_job(job_id, token)
+    
+    events = job.events_since(cursor)
+    return {
+        "job_id": job.id,
+        "status": job.status.value,
+        "progress": job.progress,
+        "total": len(job.urls),
+        "completed_count": len(job.results),
+        "failed_count": len(job.errors),
+        "source_error": job.source_error,
+        "cursor": len(job.events),
+        "events": [_batch_event_payload(job, e) for e in events]
+    }
+
+@app.get("/api/batch/{job_id}/events")
+async def stream_batch_job_events(
+    job_id: str,
+    request: Request,
+    token: Optional[str] = None,
+    cursor: int = 0
+):
+    """SSE 推送批量任务的逐 URL 生命周期事件（queued/downloading/summarizing/done/error）
+
+    EventSource 无法自定义 Header，因此同时支持 ?token= 参数；
+    断线重连时优先使用 Last-Event-ID 续传。
+    """
+    auth_token = token or request.headers.get("Authorization", "").replace("Bearer ", "")
+    job = await _get_authorized_batch_job(job_id, auth_token)
+    
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id) + 1
+    
+    async def event_generator():
+        position = cursor
+        while True:
+            for event in job.events_since(position):
+                payload = json.dumps(_batch_event_payload(job, event), ensure_ascii=False)
+                yield f"id: {event['seq']}\ndata: {payload}\n\n"
+                position = event["seq"] + 1
+            if job.finished and position >= len(job.events):
+                break
+            if await request.is_disconnected():
+                break
+            if not await job.wait_for_events(position, timeout=15):
+                # 心跳，防止代理断开空闲连接
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 
 # --- Frontend Static (Render) ---
@@ -1059,55 +1240,89 @@ async def import_favorites_api(request: Request, body: FavoritesImportRequest):
     if not media_id:
         raise HTTPException(status_code=400, detail="无效的收藏夹链接")
     
+    credit_hold = None
     try:
         # 获取视频列表
         if body.selected_bvids:
             # 如果指定了某些视频
             urls = [f"https://www.bilibili.com/video/{bvid}" for bvid in body.selected_bvids]
+            planned_count = len(urls)
         else:
-            # 否则获取全部（按限制）
-            videos = await fetch_all_favorites_videos(media_id, limit=body.limit)
-            urls = [v["url"] for v in videos]
+            # 否则边抓取边入队（第 1 页用于规划数量与计费）
+            urls = None
+            first_page = await fetch_favorites_videos(media_id, page=1)
+            planned_count = min(first_page.get("total") or 0, body.limit)
+            if not first_page.get("videos"):
+                planned_count = 0
             
-        if not urls:
+        if not planned_count:
             raise HTTPException(status_code=400, detail="没有可导入的视频")
             
         # 限制单次导入数量
-        if len(urls) > 100:
-            urls = urls[:100]
+        planned_count = min(planned_count, 100)
+        if urls is not None:
+            urls = urls[:planned_count]
             
-        # 计费检查
-        cost_info = await get_backend_info()
-        cost_per = cost_info.get("cost_per_summary", 10)
-        required_credits = len(urls) * cost_per
+        # 计费：每个视频固定消耗 10 积分，先预留，任务结束后按条目结算（缓存命中与失败退还）
+        credit_cost = 10
+        required_credits = planned_count * credit_cost
         
         # 检查是否为无限额度用户（管理员 或 Pro 订阅）
-        unlimited_user = is_unlimited_user(user) or is_subscription_active(user["user_id"])
+        unlimited_user = is_unlimited_user(user) or await run_db(is_subscription_active, user["user_id"])
+        reserved_credits = 0 if unlimited_user else required_credits
         
-        user_credits = await get_user_credits(user["user_id"])
-        if user_credits < required_credits and not unlimited_user:
-            raise HTTPException(status_code=402, detail=f"积分不足，需要 {required_credits}，当前 {user_credits}")
+        if reserved_credits:
+            credit_hold = await run_db(
+                credit_ledger.reserve, user["user_id"], reserved_credits,
+                json.dumps({"source": "favorites", "count": planned_count})
+            )
+            if not credit_hold:
+                credits_data = await run_db(get_user_credits, user["user_id"])
+                user_credits = credits_data["credits"] if credits_data else 0
+                raise HTTPException(status_code=402, detail=f"积分不足，需要 {required_credits}，当前 {user_credits}")
             
         # 创建批量任务
-        job_id = await batch_service.create_batch(
+        if urls is not None:
+            url_source = _iter_list(urls)
+        else:
+            async def favorites_urls():
+                async for video in iter_favorites_videos(media_id, limit=planned_count, first_page=first_page):
+                    yield video["url"]
+            url_source = favorites_urls()
+
+        job_id = await batch_service.create_streaming_batch(
             user_id=user["user_id"],
-            urls=urls,
+            url_source=url_source,
             mode=body.mode,
-            focus=body.focus
+            focus=body.focus,
+            expected_total=planned_count,
+            credit_cost=credit_cost,
+            reserved_credits=reserved_credits,
+            credit_hold_id=credit_hold
         )
-        
-        # 扣除积分（仅针对非无限用户）
-        if not unlimited_user:
-            await charge_user_credits(user["user_id"], required_credits, f"批量导入收藏夹任务: {job_id}")
+        credit_hold = None
             
         return {
             "job_id": job_id,
-            "video_count": len(urls),
-            "credits_charged": required_credits if not is_unlimited_user(user) else 0
+            "video_count": planned_count,
+            "credits_charged": reserved_credits
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Favorites import failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if credit_hold:
+            # 预留后未能创建任务：整笔释放
+            await run_db(credit_ledger.release, credit_hold)
+
+
+async def _iter_list(items: List[str]):
+    for item in items:
+        yield item
+
+
 # === 总结模板相关 ===
 
 @app.get("/api/templates")
@@ -1284,7 +1499,7 @@ async def list_teams(request: Request):
     """列出用户的团队"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
-    teams = get_user_teams(user["user_id"])
+    teams = await run_db(get_user_teams, user["user_id"])
     return {"teams": teams}
 
 @app.post("/api/teams")
@@ -1292,7 +1507,7 @@ async def handle_create_team(request: Request, body: TeamCreateRequest):
     """创建团队"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
-    team = create_team(body.name, user["user_id"], body.description)
+    team = await run_db(create_team, body.name, user["user_id"], body.description)
     return team
 
 @app.get("/api/teams/{team_id}")
@@ -1300,7 +1515,7 @@ async def fetch_team_details(team_id: str, request: Request):
     """获取团队详情"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
-    details = get_team_details(team_id, user["user_id"])
+    details = await run_db(get_team_details, team_id, user["user_id"])
     if not details:
         raise HTTPException(status_code=403, detail="无权访问该团队")
     return details
@@ -1310,7 +1525,8 @@ async def handle_share_to_team(team_id: str, body: TeamShareRequest, request: Re
     """分享总结到团队"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
-    success = share_summary_to_team(
+    success = await run_db(
+        share_summary_to_team,
         team_id=team_id,
         user_id=user["user_id"],
         title=body.title,
@@ -1330,7 +1546,7 @@ async def handle_add_comment(team_id: str, body: CommentCreateRequest, request:
     """发表团队评论"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
-    comment = add_comment(body.team_summary_id, user["user_id"], body.content, body.parent_id)
+    comment = await run_db(add_comment, body.team_summary_id, user["user_id"], body.content, body.parent_id)
     return comment
 
 @app.get("/api/teams/{team_id}/summaries/{team_summary_id}/comments")
@@ -1338,6 +1554,6 @@ async def list_comments(team_id: str, team_summary_id: str, request: Request):
     """获取总结的所有评论"""
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     await verify_session_token(token)
-    comments = get_summary_comments(team_summary_id)
+    comments = await run_db(get_summary_comments, team_summary_id)
     return {"comments": comments}
 
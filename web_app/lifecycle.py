@@ -1,79 +1,61 @@
 import asyncio
 import logging
+import os
 from fastapi import FastAPI
 
 from .queue_manager import task_queue
-from .scheduler import start_scheduler
-from .share_card import cleanup_expired_cards
-from .tts import cleanup_expired_tts
-from .summarizer_gemini import summarize_content, extract_ai_transcript
 
 logger = logging.getLogger(__name__)
 
+# 非关键启动项（定时任务调度器、过期卡片清理）延后执行，不占用冷启动时间
+STARTUP_DEFER_SECONDS = float(os.getenv("STARTUP_DEFER_SECONDS", "10"))
+
 
 def register_lifecycle_events(app: FastAPI) -> None:
     @app.on_event("startup")
     async def on_startup():
         """启动项集合"""
 
-        async def init_db_with_retry(name: str, init_fn):
-            for attempt in range(1, 6):
-                try:
-                    if asyncio.iscoroutinefunction(init_fn):
-                        await init_fn()
-                    else:
-                        init_fn()
-                    logger.info(f"{name} initialized")
-                    return
-                except Exception as exc:
-                    logger.warning(f"{name} init failed (attempt {attempt}/5): {exc}")
-                    await asyncio.sleep(min(2 ** (attempt - 1), 10))
-            logger.error(f"{name} init failed after retries; service may be degraded")
-
-        # 表初始化（允许失败并重试，避免启动崩溃）
-        from .startup.db_init import init_core_tables, init_all_databases
-        from .cache import init_cache_db
-        from .credits import init_credits_db
-        from .telemetry import init_telemetry_db
-
-        asyncio.create_task(init_db_with_retry("Core DB", init_core_tables))
-        asyncio.create_task(init_db_with_retry("Cache DB", init_cache_db))
-        asyncio.create_task(init_db_with_retry("Credits DB", init_credits_db))
-        asyncio.create_task(init_db_with_retry("Telemetry DB", init_telemetry_db))
-
-        async def run_blocking_init(name: str, init_fn):
-            try:
-                await asyncio.to_thread(init_fn)
-                logger.info(f"{name} initialized")
-            except Exception as exc:
-                logger.error(f"{name} init failed: {exc}")
+        # 表结构按版本迁移：已是最新版本时只查一次版本号；失败时重试，不阻止启动
+        from .startup.db_init import init_all_databases
+        asyncio.create_task(init_all_databases())
 
         async def delayed_start_scheduler():
-            await asyncio.sleep(0.1)
+            await asyncio.sleep(STARTUP_DEFER_SECONDS)
+            # apscheduler 与订阅 / 热门服务在这里才导入
+            from .scheduler import start_scheduler
             start_scheduler()
 
-        # 周期性清理任务
+        # 周期性清理任务：首次在 STARTUP_DEFER_SECONDS 后执行，之后每小时一次
         async def schedule_cleanups():
+            from .share_card import cleanup_expired_cards
+            from .tts import cleanup_expired_tts
+
+            await asyncio.sleep(STARTUP_DEFER_SECONDS)
             while True:
-                await asyncio.sleep(3600)  # 每小时运行一次
-                cleanup_expired_cards()
-                cleanup_expired_tts()
+                await asyncio.to_thread(cleanup_expired_cards)
+                await asyncio.to_thread(cleanup_expired_tts)
+                try:
+                    from .credit_ledger import release_expired_holds
+                    await asyncio.to_thread(release_expired_holds)
+                except Exception as exc:
+                    logger.error(f"Failed to release expired credit holds: {exc}")
+                await asyncio.sleep(3600)
 
         asyncio.create_task(schedule_cleanups())
 
-        # 初始化收藏夹表
-        try:
-            from .init_favorites_table import init_favorites_table
-            asyncio.create_task(run_blocking_init("Favorites table", init_favorites_table))
-        except Exception as e:
-            logger.error(f"Failed to initialize favorites table: {e}")
+        # 会话令牌签名公钥（JWKS）定期刷新
+        from .session_tokens import session_verifier
+        if session_verifier.jwks_url:
+            asyncio.create_task(session_verifier.run_key_refresher())
+
+        # 失败事件批量写库
+        from .telemetry import run_failure_flusher
+        asyncio.create_task(run_failure_flusher())
 
-        # 初始化团队协作表
-        try:
-            from .init_teams_tables import init_teams_tables
-            asyncio.create_task(run_blocking_init("Teams tables", init_teams_tables))
-        except Exception as e:
-            logger.error(f"Failed to initialize teams tables: {e}")
+        # API Key 用量批量写库
+        from .api_key_cache import run_usage_flusher
+        asyncio.create_task(run_usage_flusher())
 
         # 启动定时任务调度器 (P4 每日推送到订阅)
         asyncio.create_task(delayed_start_scheduler())
@@ -82,6 +64,8 @@ def register_lifecycle_events(app: FastAPI) -> None:
     async def start_queue():
         """启动后台任务队列并注册处理器"""
         import functools
+        # 处理器在调用时才从 summarizer_gemini 取函数，导入 lifecycle 不会加载模型 SDK 相关模块
+        from . import summarizer_gemini
 
         async def summarize_handler(payload):
             """总结任务处理器 - 在线程池中执行同步函数"""
@@ -95,8 +79,24 @@ def register_lifecycle_events(app: FastAPI) -> None:
                 if template:
                     custom_prompt = template.get('prompt_template')
 
+            if payload.get('base_text') is not None:
+                # 已有基础提取：只做一次纯文本调用生成该视角/模板/语言的变体
+                func = functools.partial(
+                    summarizer_gemini.summarize_from_base,
+                    payload['base_text'],
+                    payload.get('progress_callback'),
+                    payload.get('focus', 'default'),
+                    custom_prompt,
+                    payload.get('output_language', 'zh'),
+                    payload.get('enable_cot', False),
+                    payload.get('stream_callback')
+                )
+                return await loop.run_in_executor(None, func)
+
+            # 视频/音频冷启动：同一次多模态调用附带基础笔记，返回 (summary, usage, notes)
             func = functools.partial(
-                summarize_content,
+                summarizer_gemini.summarize_with_base_notes if payload.get('with_base_notes')
+                else summarizer_gemini.summarize_content,
                 payload['file_path'],
                 payload['media_type'],
                 payload.get('progress_callback'),
@@ -104,7 +104,8 @@ def register_lifecycle_events(app: FastAPI) -> None:
                 payload.get('uploaded_file'),
                 custom_prompt,
                 payload.get('output_language', 'zh'),
-                payload.get('enable_cot', False)
+                payload.get('enable_cot', False),
+                payload.get('stream_callback')
             )
             return await loop.run_in_executor(None, func)
 
@@ -114,7 +115,7 @@ def register_lifecycle_events(app: FastAPI) -> None:
             """转录任务处理器 - 在线程池中执行同步函数"""
             loop = asyncio.get_event_loop()
             func = functools.partial(
-                extract_ai_transcript,
+                summarizer_gemini.extract_ai_transcript,
                 payload['file_path'],
                 payload.get('progress_callback'),
                 payload.get('uploaded_file')
@@ -123,14 +124,36 @@ def register_lifecycle_events(app: FastAPI) -> None:
 
         task_queue.register_handler('transcript', transcript_handler)
 
-        await task_queue.start()
+        from .prewarm import prewarm_service
+        task_queue.register_handler('prewarm', prewarm_service.handle_task)
 
-    @app.on_event("startup")
-    async def schedule_cleanup():
-        """启动时清理过期文件"""
-        await asyncio.to_thread(cleanup_expired_cards)
+        await task_queue.start()
 
     @app.on_event("shutdown")
     async def shutdown_queue():
         """停止后台任务队列"""
         await task_queue.stop()
+
+    @app.on_event("shutdown")
+    async def flush_telemetry():
+        """写入尚未落库的失败事件"""
+        from .telemetry import flush_failures
+        await asyncio.to_thread(flush_failures)
+
+    @app.on_event("shutdown")
+    async def flush_api_key_usage():
+        """写入尚未落库的 API Key 用量"""
+        from .api_key_cache import flush_usage
+        await asyncio.to_thread(flush_usage)
+
+    @app.on_event("shutdown")
+    async def close_http_clients():
+        """关闭共享的 B 站 HTTP 连接池"""
+        from .clients.bilibili_client import close_shared_client
+        await close_shared_client()
+
+    @app.on_event("shutdown")
+    async def close_db_connections():
+        """关闭数据库连接池"""
+        from .db import close_all_connections
+        close_all_connections()
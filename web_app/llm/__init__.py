@@ -0,0 +1,52 @@
+"""
+LLM 后端抽象层
+通过 LLM_BACKEND 选择实现：
+- gemini（默认）：Google Gemini，经多 Key 客户端池调用
+- stub：本地确定性桩（可配置延迟与 token 数），用于离线运行、压测与基准测试
+"""
+import os
+import threading
+from typing import Optional
+
+from .base import LLMBackend, LLMResponse, UsageTracker
+from .stub_backend import StubBackend, StubFile
+
+_backend: Optional[LLMBackend] = None
+_lock = threading.Lock()
+
+
+def _create_backend(name: str) -> LLMBackend:
+    if name == "stub":
+        return StubBackend()
+    if name == "gemini":
+        from .gemini_backend import GeminiBackend
+        return GeminiBackend()
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
+
+
+def get_llm_backend() -> LLMBackend:
+    """获取当前进程的 LLM 后端（首次调用时按 LLM_BACKEND 创建）"""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = _create_backend(os.getenv("LLM_BACKEND", "gemini").strip().lower())
+    return _backend
+
+
+def set_llm_backend(backend: Optional[LLMBackend]) -> None:
+    """替换当前后端（测试 / 基准测试使用；传 None 则下次按环境变量重新创建）"""
+    global _backend
+    with _lock:
+        _backend = backend
+
+
+__all__ = [
+    "LLMBackend",
+    "LLMResponse",
+    "UsageTracker",
+    "StubBackend",
+    "StubFile",
+    "get_llm_backend",
+    "set_llm_backend"
+]
@@ -0,0 +1,193 @@
+"""
+LLM 后端接口与用量统计
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from ..metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, LLM_REQUESTS, LLM_TOKENS
+
+
+@dataclass
+class LLMResponse:
+    """统一的生成结果"""
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    latency: float = 0.0
+    first_token_latency: Optional[float] = None
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens
+        }
+
+
+class UsageTracker:
+    """按任务类型累计请求数、token、耗时与错误（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, Dict[str, float]] = {}
+
+    def record(self, task: str, response: Optional[LLMResponse], latency: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._tasks.setdefault(task, {
+                "requests": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency_total": 0.0,
+                "first_token_total": 0.0,
+                "streams": 0
+            })
+            stats["requests"] += 1
+            stats["latency_total"] += latency
+            if error:
+                stats["errors"] += 1
+            if response is not None:
+                stats["prompt_tokens"] += response.prompt_tokens
+                stats["completion_tokens"] += response.completion_tokens
+                if response.first_token_latency is not None:
+                    stats["streams"] += 1
+                    stats["first_token_total"] += response.first_token_latency
+
+    def snapshot(self, input_price_per_m: float, output_price_per_m: float) -> Dict[str, Any]:
+        with self._lock:
+            tasks = {task: dict(stats) for task, stats in self._tasks.items()}
+        result = {}
+        for task, stats in tasks.items():
+            requests = max(stats["requests"], 1)
+            result[task] = {
+                "requests": int(stats["requests"]),
+                "errors": int(stats["errors"]),
+                "prompt_tokens": int(stats["prompt_tokens"]),
+                "completion_tokens": int(stats["completion_tokens"]),
+                "avg_latency": round(stats["latency_total"] / requests, 4),
+                "avg_first_token_latency": (
+                    round(stats["first_token_total"] / stats["streams"], 4) if stats["streams"] else None
+                ),
+                "estimated_cost": round(
+                    stats["prompt_tokens"] / 1e6 * input_price_per_m
+                    + stats["completion_tokens"] / 1e6 * output_price_per_m,
+                    6
+                )
+            }
+        return result
+
+
+class LLMBackend(ABC):
+    """
+    LLM 后端接口
+    - upload / delete：媒体文件（视频、音频）的上传与清理
+    - generate / stream：一次生成（流式时每个分片交给 on_text）
+    - usage：按任务类型统计的用量、耗时与估算成本
+
+    task 用于区分调用场景（summary / transcript / ppt / compare / chat），
+    只影响用量统计（本地桩据此生成对应格式的输出）。
+    """
+    name = "base"
+    model_name = ""
+    input_price_per_m = 0.0
+    output_price_per_m = 0.0
+
+    def __init__(self):
+        self._usage = UsageTracker()
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    def upload(self, path: Any, mime_type: Optional[str] = None, progress_callback=None) -> Any:
+        """上传媒体文件，返回可放入 contents 的文件句柄"""
+
+    @abstractmethod
+    def delete(self, file: Any) -> None:
+        """删除已上传的文件"""
+
+    @abstractmethod
+    def _generate(self, contents: Any, file: Any, task: str, options: Dict[str, Any]) -> LLMResponse:
+        ...
+
+    @abstractmethod
+    def _stream(
+        self,
+        contents: Any,
+        on_text: Callable[[str], None],
+        file: Any,
+        task: str,
+        options: Dict[str, Any]
+    ) -> LLMResponse:
+        ...
+
+    def generate(self, contents: Any, file: Any = None, task: str = "generic", **options) -> LLMResponse:
+        """
+        一次完整生成
+
+        Args:
+            contents: 提示词，或提示词与文件句柄 / 对话历史组成的列表
+            file: contents 中引用的已上传文件（多 Key 场景下用于固定 Key）
+            options: 透传给具体实现（如 request_options、generation_config）
+        """
+        started = time.perf_counter()
+        try:
+            response = self._generate(contents, file, task, options)
+        except Exception:
+            self._record(task, None, time.perf_counter() - started)
+            raise
+        response.latency = time.perf_counter() - started
+        self._record(task, response, response.latency)
+        return response
+
+    def stream(
+        self,
+        contents: Any,
+        on_text: Callable[[str], None],
+        file: Any = None,
+        task: str = "generic",
+        **options
+    ) -> LLMResponse:
+        """流式生成：分片文本依次交给 on_text，返回完整结果（含首 token 耗时）"""
+        started = time.perf_counter()
+        first_token = []
+
+        def forward(text: str) -> None:
+            if not first_token:
+                first_token.append(time.perf_counter() - started)
+            on_text(text)
+
+        try:
+            response = self._stream(contents, forward, file, task, options)
+        except Exception:
+            self._record(task, None, time.perf_counter() - started)
+            raise
+        response.latency = time.perf_counter() - started
+        response.first_token_latency = first_token[0] if first_token else response.latency
+        self._record(task, response, response.latency)
+        return response
+
+    def _record(self, task: str, response: Optional[LLMResponse], latency: float) -> None:
+        """累计用量（/api/admin/llm/usage）并更新 Prometheus 指标；response 为 None 表示调用失败"""
+        self._usage.record(task, response, latency, error=response is None)
+        LLM_REQUEST_SECONDS.observe(latency, backend=self.name, task=task)
+        LLM_REQUESTS.inc(backend=self.name, task=task, status="error" if response is None else "ok")
+        if response is None:
+            return
+        LLM_TOKENS.inc(response.prompt_tokens, backend=self.name, task=task, kind="prompt")
+        LLM_TOKENS.inc(response.completion_tokens, backend=self.name, task=task, kind="completion")
+        if response.first_token_latency is not None:
+            LLM_FIRST_TOKEN_SECONDS.observe(response.first_token_latency, backend=self.name, task=task)
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "model": self.model_name,
+            "tasks": self._usage.snapshot(self.input_price_per_m, self.output_price_per_m)
+        }
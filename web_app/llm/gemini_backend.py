@@ -0,0 +1,70 @@
+"""
+Gemini 后端（基于多 Key 客户端池）
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ..gemini_pool import gemini_pool, GeminiPool, GEMINI_MODEL
+from ..metrics import STAGE_SECONDS
+from .base import LLMBackend, LLMResponse
+
+
+def _to_response(response: Any) -> LLMResponse:
+    usage = getattr(response, "usage_metadata", None)
+    # 被安全策略拦截等情况下没有 parts，此时访问 .text 会抛异常
+    text = response.text if getattr(response, "parts", None) else ""
+    return LLMResponse(
+        text=text,
+        prompt_tokens=int(getattr(usage, "prompt_token_count", 0) or 0),
+        completion_tokens=int(getattr(usage, "candidates_token_count", 0) or 0),
+        total_tokens=int(getattr(usage, "total_token_count", 0) or 0)
+    )
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, pool: GeminiPool = gemini_pool, model_name: str = GEMINI_MODEL):
+        super().__init__()
+        self.pool = pool
+        self.model_name = model_name
+        self.input_price_per_m = float(os.getenv("GEMINI_PRICE_INPUT_PER_M", "0.5"))
+        self.output_price_per_m = float(os.getenv("GEMINI_PRICE_OUTPUT_PER_M", "3.0"))
+
+    @property
+    def configured(self) -> bool:
+        return self.pool.configured
+
+    def upload(self, path: Any, mime_type: Optional[str] = None, progress_callback=None) -> Any:
+        media_file = self.pool.upload_file(path, mime_type=mime_type)
+
+        # 等待文件处理完成
+        with STAGE_SECONDS.time(stage="processing_wait"):
+            while media_file.state.name == "PROCESSING":
+                time.sleep(2)
+                media_file = self.pool.get_file(media_file)
+                if progress_callback:
+                    progress_callback(f"Cloud processing: {media_file.state.name}")
+
+        if media_file.state.name == "FAILED":
+            raise Exception("Google AI File Processing Failed")
+        return media_file
+
+    def delete(self, file: Any) -> None:
+        self.pool.delete_file(file)
+
+    def _generate(self, contents: Any, file: Any, task: str, options: Dict[str, Any]) -> LLMResponse:
+        return _to_response(self.pool.generate(contents, file=file, model_name=self.model_name, **options))
+
+    def _stream(
+        self,
+        contents: Any,
+        on_text: Callable[[str], None],
+        file: Any,
+        task: str,
+        options: Dict[str, Any]
+    ) -> LLMResponse:
+        return _to_response(
+            self.pool.generate_stream(contents, on_text, file=file, model_name=self.model_name, **options)
+        )
@@ -0,0 +1,177 @@
+"""
+本地确定性桩后端
+不访问网络、不消耗额度：相同输入得到相同输出，延迟与输出 token 数可配置。
+用于离线跑通完整 /summarize 链路、压测与基准测试。
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from ..structured_output import BASE_NOTES_MARKER
+from .base import LLMBackend, LLMResponse
+
+
+@dataclass
+class StubFile:
+    """桩后端的上传文件句柄"""
+    name: str
+    display_name: str = ""
+
+
+def _digest(contents: Any) -> str:
+    parts = contents if isinstance(contents, list) else [contents]
+    text = "\n".join(getattr(p, "name", None) or str(p) for p in parts)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class StubBackend(LLMBackend):
+    """
+    Args:
+        latency: 单次生成的总耗时（秒），流式时均摊到各分片之间
+        first_token_latency: 流式首个分片前的额外等待（秒）
+        output_tokens: 每次生成的输出 token 数（也决定正文长度，约 1 字 1 token）
+        chunks: 流式输出的分片数
+        upload_latency: 上传耗时（秒）
+        responses: 按 task 覆盖输出文本
+    """
+    name = "stub"
+    model_name = "stub-deterministic"
+
+    def __init__(
+        self,
+        latency: Optional[float] = None,
+        first_token_latency: Optional[float] = None,
+        output_tokens: Optional[int] = None,
+        chunks: int = 20,
+        upload_latency: float = 0.0,
+        responses: Optional[Dict[str, str]] = None
+    ):
+        super().__init__()
+        # 未显式传入时读取环境变量（便于压测时不改代码调整桩的表现）
+        self.latency = float(os.getenv("LLM_STUB_LATENCY", "0.5")) if latency is None else latency
+        self.first_token_latency = (
+            float(os.getenv("LLM_STUB_FIRST_TOKEN_LATENCY", "0.1"))
+            if first_token_latency is None else first_token_latency
+        )
+        self.output_tokens = int(os.getenv("LLM_STUB_TOKENS", "800")) if output_tokens is None else output_tokens
+        self.chunks = max(chunks, 1)
+        self.upload_latency = upload_latency
+        self.responses = responses or {}
+
+    def upload(self, path: Any, mime_type: Optional[str] = None, progress_callback=None) -> Any:
+        if self.upload_latency:
+            time.sleep(self.upload_latency)
+        digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:12]
+        return StubFile(name=f"files/stub-{digest}", display_name=os.path.basename(str(path)))
+
+    def delete(self, file: Any) -> None:
+        pass
+
+    def _generate(self, contents: Any, file: Any, task: str, options: Dict[str, Any]) -> LLMResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(contents, self._render(task, contents))
+
+    def _stream(
+        self,
+        contents: Any,
+        on_text: Callable[[str], None],
+        file: Any,
+        task: str,
+        options: Dict[str, Any]
+    ) -> LLMResponse:
+        text = self._render(task, contents)
+        size = max(len(text) // self.chunks, 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        pause = self.latency / len(pieces) if pieces else 0
+        for piece in pieces:
+            on_text(piece)
+            if pause:
+                time.sleep(pause)
+        return self._response(contents, text)
+
+    def _response(self, contents: Any, text: str) -> LLMResponse:
+        prompt_tokens = max(len(str(contents)) // 4, 1)
+        return LLMResponse(
+            text=text,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=self.output_tokens,
+            total_tokens=prompt_tokens + self.output_tokens
+        )
+
+    # ---- 确定性输出 ----
+
+    def _render(self, task: str, contents: Any) -> str:
+        if task in self.responses:
+            return self.responses[task]
+        digest = _digest(contents)
+        renderer = {
+            "summary": self._summary,
+            "summary_base": self._summary_with_notes,
+            "transcript": self._transcript,
+            "ppt": self._ppt,
+            "compare": self._compare
+        }.get(task, self._plain)
+        return renderer(digest)
+
+    def _filler(self, digest: str, budget: int) -> List[str]:
+        lines = []
+        i = 0
+        while sum(len(line) for line in lines) < budget:
+            lines.append(f"- 要点 {i + 1}（{digest[i % 32:i % 32 + 6]}）：桩后端生成的确定性内容。")
+            i += 1
+        return lines
+
+    def _summary(self, digest: str) -> str:
+        body = "\n".join(self._filler(digest, self.output_tokens))
+        keywords = {"keywords": [{"text": f"kw{digest[i]}", "value": 10 - i} for i in range(5)]}
+        return (
+            f"这是一段由本地桩后端生成的核心摘要（{digest[:8]}）。\n\n"
+            "# 🔑 关键概念与深度解析 (Key Concepts & Deep Dive)\n"
+            f"{body}\n\n"
+            "# 📝 总结与启示 (Conclusion & Takeaways)\n"
+            "桩输出仅用于离线测试与压测。\n\n"
+            "【思维导图】\n"
+            "- 核心主题\n"
+            "  - 分支1\n"
+            "  - 分支2\n\n"
+            "```json\n"
+            f"{json.dumps(keywords, ensure_ascii=False)}\n"
+            "```"
+        )
+
+    def _summary_with_notes(self, digest: str) -> str:
+        return f"{self._summary(digest)}\n\n{BASE_NOTES_MARKER}\n{self._notes(digest)}"
+
+    def _notes(self, digest: str) -> str:
+        return "\n".join(f"[{i:02d}:00] {line}" for i, line in enumerate(self._filler(digest, self.output_tokens)))
+
+    def _transcript(self, digest: str) -> str:
+        lines = []
+        for i in range(max(self.output_tokens // 20, 1)):
+            lines.append(f"[{i * 3 // 60:02d}:{i * 3 % 60:02d}] 桩转录第 {i + 1} 句（{digest[:6]}）")
+        return "\n".join(lines)
+
+    def _ppt(self, digest: str) -> str:
+        return json.dumps({
+            "title": f"桩演示文稿 {digest[:6]}",
+            "subtitle": "stub",
+            "slides": [{"title": f"第 {i + 1} 页", "content": ["要点 A", "要点 B"]} for i in range(5)]
+        }, ensure_ascii=False)
+
+    def _compare(self, digest: str) -> str:
+        return "```json\n" + json.dumps({
+            "comparison_table": {"headers": ["对比维度", "视频1", "视频2"], "rows": [["核心观点", "A", "B"]]},
+            "key_differences": [{"topic": "差异", "description": digest[:8], "videos": ["A", "B"]}],
+            "consensus_points": [{"topic": "共识", "description": "桩输出"}],
+            "analysis_summary": "桩后端生成的对比结论",
+            "recommendations": ["建议1"]
+        }, ensure_ascii=False) + "\n```"
+
+    def _plain(self, digest: str) -> str:
+        return f"这是桩后端的确定性回复（{digest[:8]}）。"
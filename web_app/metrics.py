@@ -0,0 +1,235 @@
+"""
+进程内指标（Prometheus 文本格式，由 /metrics 暴露）
+
+只做内存聚合：计数器是按标签分组的浮点数，直方图是固定分桶的计数数组，
+记录一次观测只需一次二分查找和一次加锁累加，可以放在热路径上（包括每条 SQL）。
+多 worker 部署时每个进程各自暴露，由 Prometheus 按实例聚合。
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# 秒：覆盖从缓存查询（毫秒级）到视频下载 / 模型调用（分钟级）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """固定分桶直方图（桶内计数不累计，渲染时再累加成 Prometheus 的 le 语义）"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时（包括异常）记录耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, list(s[0]), s[1], s[2]) for key, s in self._series.items())
+        lines = []
+        bounds = [*self.buckets, float("inf")]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Iterable[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# 流水线阶段：download / subtitle_parse / ffmpeg / upload（含云端处理）/ processing_wait / cache_lookup / base_cache_lookup
+# 总结、转录等模型调用见 bili_llm_request_duration_seconds（按 task 区分）
+STAGE_SECONDS = histogram("bili_stage_duration_seconds", "Pipeline stage duration in seconds", ["stage"])
+DB_QUERY_SECONDS = histogram(
+    "bili_db_query_duration_seconds", "Database statement duration in seconds", ["backend", "operation"], DB_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = histogram(
+    "bili_db_pool_wait_seconds", "Time spent acquiring a database connection", ["backend"], POOL_WAIT_BUCKETS
+)
+DB_CONNECTIONS_OPENED = counter("bili_db_connections_opened_total", "Physical database connections opened", ["backend"])
+DB_PREPARED_STATEMENTS = counter(
+    "bili_db_prepared_statements_total", "Postgres server-side prepared statement events", ["event"]
+)
+DB_CONNECTIONS_IN_USE = gauge("bili_db_connections_in_use", "Database connections currently checked out", ["backend"])
+LLM_REQUEST_SECONDS = histogram(
+    "bili_llm_request_duration_seconds", "LLM call duration in seconds", ["backend", "task"]
+)
+LLM_FIRST_TOKEN_SECONDS = histogram(
+    "bili_llm_first_token_seconds", "Time to first streamed chunk in seconds", ["backend", "task"]
+)
+LLM_REQUESTS = counter("bili_llm_requests_total", "LLM calls by outcome", ["backend", "task", "status"])
+LLM_TOKENS = counter("bili_llm_tokens_total", "LLM tokens by direction", ["backend", "task", "kind"])
+AUTH_VERIFICATIONS = counter(
+    "bili_auth_verifications_total", "Session token verifications by method and result", ["method", "result"]
+)
+CACHE_LOOKUPS = counter("bili_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
+BILIBILI_API_RESPONSES = counter(
+    "bili_bilibili_api_responses_total", "Bilibili API responses by business code (-352/-412 are risk control)",
+    ["endpoint", "code"]
+)
+FAILURES = counter("bili_failures_total", "Recorded user-facing failures", ["code", "stage"])
+FAILURE_EVENTS_DROPPED = counter(
+    "bili_failure_events_dropped_total", "Failure events dropped because the write buffer was full"
+)
+
+
+def record_bilibili_code(endpoint: str, code: Optional[Any]) -> None:
+    """记录一次 B 站接口返回的业务码（0 为成功）"""
+    BILIBILI_API_RESPONSES.inc(endpoint=endpoint, code="none" if code is None else code)
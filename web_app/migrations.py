@@ -0,0 +1,683 @@
+"""
+数据库结构迁移
+
+原先每次启动都并发执行 init_core_tables / init_cache_db / init_credits_db 等初始化函数，
+几十条 CREATE TABLE IF NOT EXISTS 加上 PRAGMA / information_schema 探测，彼此争抢写锁。
+这里把它们登记为按版本号排序的迁移：
+- schema_migrations 记录已应用的版本；已是最新版本时启动只做一次 SELECT，不执行任何 DDL
+- 迁移在进程内串行执行；Postgres 下用 advisory lock 在多个 worker 之间串行，
+  后拿到锁的 worker 重新读取版本后直接返回
+- 每个迁移必须可重复执行（IF NOT EXISTS）：执行完 DDL、记录版本之前进程崩溃时，下次启动会重跑
+- 本文件是表结构的唯一定义：各模块的 init_* 函数（供测试与脚本按模块建表）通过 apply_steps
+  执行这里的迁移步骤，不再各自维护一份 DDL
+- 已发布的迁移不可修改（已迁移的库不会重跑）；新的表结构变更只能追加为新的编号迁移，
+  需要该表的 init_* 函数同时列出新步骤
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from .db import get_connection, using_postgres
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock 的键（任意固定值，同一数据库的所有 worker 共用）
+_PG_LOCK_KEY = 726_551_049
+_lock = threading.Lock()
+
+
+def _identity_column() -> str:
+    return (
+        "id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY"
+        if using_postgres()
+        else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+    )
+
+
+# ---- 001-008：基线结构（原先分散在各模块初始化函数中的 DDL） ----
+
+def _core_tables():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # API Keys 表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_keys (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                key_hash TEXT NOT NULL UNIQUE,
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TEXT
+            )
+        """)
+        
+        # API Key 使用统计
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS api_key_usage_daily (
+                key_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (key_id, date)
+            )
+        """)
+        
+        # 使用配额表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, date)
+            )
+        """)
+        
+        # 订阅状态表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                user_id TEXT PRIMARY KEY,
+                plan TEXT NOT NULL DEFAULT 'free',
+                status TEXT NOT NULL DEFAULT 'inactive',
+                current_period_end TEXT,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # UP 主订阅表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS up_subscriptions (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                up_mid TEXT NOT NULL,
+                up_name TEXT,
+                up_avatar TEXT,
+                notify_methods TEXT,
+                last_checked_at TEXT,
+                last_video_bvid TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, up_mid)
+            )
+        """)
+        
+        # 总结模板表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS summary_templates (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT,
+                prompt_template TEXT NOT NULL,
+                output_format TEXT DEFAULT 'markdown',
+                sections TEXT,
+                is_preset BOOLEAN DEFAULT FALSE,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 幂等性主键表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                action TEXT,
+                status TEXT,
+                result TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 通知队列表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS notification_queue (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                title TEXT,
+                body TEXT,
+                payload TEXT,
+                status TEXT DEFAULT 'pending',
+                method TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                sent_at TEXT
+            )
+        """)
+        
+        
+        # 账单记录表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS billing_events (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                amount_cents INTEGER NOT NULL DEFAULT 0,
+                currency TEXT NOT NULL DEFAULT 'CNY',
+                status TEXT NOT NULL DEFAULT 'pending',
+                period_start TEXT,
+                period_end TEXT,
+                invoice_url TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 支付订单表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS payment_orders (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                amount_cents INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                billing_id TEXT NOT NULL,
+                transaction_id TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 邀请码表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invite_codes (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                code TEXT NOT NULL UNIQUE,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 邀请兑换表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invite_redemptions (
+                id TEXT PRIMARY KEY,
+                invite_id TEXT NOT NULL,
+                inviter_id TEXT NOT NULL,
+                invitee_id TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(invitee_id)
+            )
+        """)
+        
+        # 分享链接表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS share_links (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                title TEXT,
+                summary TEXT NOT NULL,
+                transcript TEXT,
+                mindmap TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                expires_at TEXT
+            )
+        """)
+        
+        # 反馈表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS feedbacks (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                feedback_type TEXT NOT NULL,
+                content TEXT NOT NULL,
+                contact TEXT,
+                status TEXT DEFAULT 'pending',
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # 浏览器推送订阅表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS push_subscriptions (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                p256dh TEXT NOT NULL,
+                auth TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, endpoint)
+            )
+        """)
+        
+        
+        # 创建索引以优化查询性能
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_user ON api_keys(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_hash ON api_keys(key_hash)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_daily_user ON usage_daily(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_billing_user ON billing_events(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_key_usage_user ON api_key_usage_daily(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payment_user ON payment_orders(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invite_user ON invite_codes(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_share_user ON share_links(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedbacks(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_status ON feedbacks(status)")
+
+
+def _cache_tables():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS video_cache (
+                {_identity_column()},
+                video_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                focus TEXT NOT NULL,
+                cache_key TEXT UNIQUE NOT NULL,
+                summary TEXT,
+                transcript TEXT,
+                mindmap TEXT,
+                usage_data TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS video_base_cache (
+                base_key TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                notes TEXT,
+                transcript TEXT,
+                usage_data TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_key ON video_cache(cache_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_video_id ON video_cache(video_id)")
+
+
+def _table_columns(cursor, table: str) -> List[str]:
+    if using_postgres():
+        cursor.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = ?
+        """, (table,))
+        return [row["column_name"] for row in cursor.fetchall()]
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _credit_tables():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_credits (
+                user_id TEXT PRIMARY KEY,
+                credits INTEGER NOT NULL DEFAULT 0,
+                total_used INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS credit_events (
+                {_identity_column()},
+                user_id TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                cost INTEGER NOT NULL,
+                metadata TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # 早期的 credit_events 没有 metadata 列
+        if "metadata" not in _table_columns(cursor, "credit_events"):
+            cursor.execute("ALTER TABLE credit_events ADD COLUMN metadata TEXT")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                user_id TEXT PRIMARY KEY,
+                plan TEXT NOT NULL DEFAULT 'free',
+                status TEXT NOT NULL DEFAULT 'inactive',
+                current_period_end TEXT,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS credit_holds (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'held',
+                metadata TEXT,
+                created_at TEXT NOT NULL,
+                settled_at TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_credit_holds_status ON credit_holds(status, created_at)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, date)
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_credit_events_user_type_time "
+            "ON credit_events(user_id, event_type, created_at)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_credit_events_user_time ON credit_events(user_id, created_at)")
+        # 每日用量汇总：consume 流水写入时在同一事务内累加，面板只读 O(天数) 行。
+        # 汇总表为空时从历史 consume 流水回填一次；created_at 为 UTC 文本，前 10 位即日期
+        cursor.execute("SELECT 1 FROM usage_daily LIMIT 1")
+        if not cursor.fetchone():
+            cursor.execute("""
+                INSERT INTO usage_daily (user_id, date, count)
+                SELECT user_id, SUBSTR(created_at, 1, 10), COUNT(*)
+                FROM credit_events
+                WHERE event_type = 'consume' AND created_at IS NOT NULL
+                GROUP BY user_id, SUBSTR(created_at, 1, 10)
+            """)
+
+
+def _telemetry_tables():
+    with get_connection() as conn:
+        conn.cursor().execute(f"""
+            CREATE TABLE IF NOT EXISTS failure_events (
+                {_identity_column()},
+                user_id TEXT,
+                code TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                detail TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def _bilibili_cache_tables():
+    with get_connection() as conn:
+        conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS bilibili_video_cache (
+                cache_key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                failed INTEGER NOT NULL DEFAULT 0,
+                ttl INTEGER NOT NULL,
+                stale_ttl INTEGER NOT NULL DEFAULT 0,
+                cached_at DOUBLE PRECISION NOT NULL
+            )
+        """)
+
+
+def _near_duplicate_tables():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                {_identity_column()},
+                video_id TEXT UNIQUE NOT NULL,
+                url TEXT NOT NULL,
+                duration_bucket INTEGER NOT NULL,
+                title_minhash TEXT,
+                simhash TEXT NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for band in range(4):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_fingerprint_band{band} "
+                f"ON content_fingerprints(duration_bucket, band{band})"
+            )
+
+
+def _favorites_table():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if using_postgres():
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS favorites (
+                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    user_id TEXT NOT NULL,
+                    bvid TEXT NOT NULL,
+                    title TEXT,
+                    cover TEXT,
+                    summary TEXT,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    UNIQUE(user_id, bvid)
+                )
+            """)
+        else:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS favorites (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    bvid TEXT NOT NULL,
+                    title TEXT,
+                    cover TEXT,
+                    summary TEXT,
+                    created_at TEXT NOT NULL,
+                    UNIQUE(user_id, bvid)
+                )
+            """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_favorites_user_id ON favorites(user_id)")
+
+
+def _teams_tables():
+    # Postgres 用 UUID 主键与 TIMESTAMP；SQLite 由应用写入文本 ID 与时间
+    if using_postgres():
+        id_type, id_default, time_type = "UUID", " DEFAULT gen_random_uuid()", "TIMESTAMP DEFAULT NOW()"
+    else:
+        id_type, id_default, time_type = "TEXT", "", "TEXT NOT NULL"
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS teams (
+                id {id_type} PRIMARY KEY{id_default},
+                name TEXT NOT NULL,
+                description TEXT,
+                owner_id TEXT NOT NULL,
+                created_at {time_type}
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS team_members (
+                id {id_type} PRIMARY KEY{id_default},
+                team_id {id_type} NOT NULL,
+                user_id TEXT NOT NULL,
+                role TEXT DEFAULT 'member',
+                joined_at {time_type},
+                FOREIGN KEY (team_id) REFERENCES teams(id) ON DELETE CASCADE,
+                UNIQUE(team_id, user_id)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS team_shares (
+                id {id_type} PRIMARY KEY{id_default},
+                team_id {id_type} NOT NULL,
+                summary_id TEXT NOT NULL,
+                shared_by TEXT NOT NULL,
+                shared_at {time_type},
+                FOREIGN KEY (team_id) REFERENCES teams(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_teams_owner ON teams(owner_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_team_members_user ON team_members(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_team_members_team ON team_members(team_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_team_shares_team ON team_shares(team_id)")
+
+
+# ---- 009 起：新增的结构变更 ----
+
+def _team_summary_tables():
+    """teams.py 读写的共享总结与评论表（此前只在 init_db_v2 脚本中创建）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS team_summaries (
+                id TEXT PRIMARY KEY,
+                team_id TEXT NOT NULL,
+                shared_by TEXT NOT NULL,
+                title TEXT NOT NULL,
+                video_url TEXT,
+                video_thumbnail TEXT,
+                summary_content TEXT NOT NULL,
+                transcript TEXT,
+                mindmap TEXT,
+                tags TEXT,
+                view_count INTEGER DEFAULT 0,
+                comment_count INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS comments (
+                id TEXT PRIMARY KEY,
+                team_summary_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                parent_id TEXT,
+                content TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def _hot_path_indexes():
+    """热点查询缺少的索引"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        # 面板按用户与时间范围读取积分流水（与 credit_ledger 中的同名索引一致，已存在时跳过）
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_credit_events_user_time ON credit_events(user_id, created_at)")
+        # 通知处理按 status = 'pending' ORDER BY created_at 取批
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_notification_queue_status ON notification_queue(status, created_at)"
+        )
+        # 团队详情逐条统计评论数、评论列表按总结读取
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_summary ON comments(team_summary_id, created_at)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_team_summaries_team ON team_summaries(team_id, created_at)"
+        )
+        # 定时任务按 UP 主检查新视频
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_up_subscriptions_mid ON up_subscriptions(up_mid)")
+
+
+def _bilibili_cache_retry_after():
+    """刷新失败时只推迟下一次刷新，不再改写旧数据的缓存时间"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if "retry_after" not in _table_columns(cursor, "bilibili_video_cache"):
+            cursor.execute(
+                "ALTER TABLE bilibili_video_cache ADD COLUMN retry_after DOUBLE PRECISION NOT NULL DEFAULT 0"
+            )
+
+
+# (版本号, 名称, 迁移函数)；1-8 为基线结构
+MIGRATIONS: List[Tuple[int, str, Callable[[], None]]] = [
+    (1, "core_tables", _core_tables),
+    (2, "cache_tables", _cache_tables),
+    (3, "credit_tables", _credit_tables),
+    (4, "telemetry_tables", _telemetry_tables),
+    (5, "bilibili_cache_tables", _bilibili_cache_tables),
+    (6, "near_duplicate_tables", _near_duplicate_tables),
+    (7, "favorites_table", _favorites_table),
+    (8, "teams_tables", _teams_tables),
+    (9, "team_summary_tables", _team_summary_tables),
+    (10, "hot_path_indexes", _hot_path_indexes),
+    (11, "bilibili_cache_retry_after", _bilibili_cache_retry_after),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def apply_steps(*names: str) -> None:
+    """按名称执行迁移步骤，不记录版本（各模块的 init_* 函数用它为测试与脚本建表）"""
+    steps = {name: migrate for _, name, migrate in MIGRATIONS}
+    for name in names:
+        steps[name]()
+
+
+def current_version() -> int:
+    """已应用的最高版本；迁移表还不存在时返回 0"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+            row = cursor.fetchone()
+    except Exception:
+        return 0
+    return (row["version"] or 0) if row else 0
+
+
+def _create_migrations_table() -> None:
+    with get_connection() as conn:
+        conn.cursor().execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """)
+
+
+def _record(version: int, name: str) -> None:
+    with get_connection() as conn:
+        conn.cursor().execute("""
+            INSERT INTO schema_migrations (version, name, applied_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(version) DO NOTHING
+        """, (version, name, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+@contextmanager
+def _migration_lock():
+    """
+    进程内用线程锁串行；Postgres 下再持有一条连接上的 advisory lock，直到迁移结束。
+    SQLite 没有跨进程的咨询锁：各 worker 的 DDL 都是 IF NOT EXISTS，由数据库写锁串行，
+    重复的版本记录被 ON CONFLICT 忽略。
+    """
+    with _lock:
+        if not using_postgres():
+            yield
+            return
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_advisory_lock(?)", (_PG_LOCK_KEY,))
+            conn.commit()
+            try:
+                yield
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(?)", (_PG_LOCK_KEY,))
+                conn.commit()
+        finally:
+            conn.close()
+
+
+def run_migrations() -> int:
+    """
+    应用尚未执行的迁移
+
+    Returns:
+        本次应用的迁移数量；已是最新版本时返回 0（只执行一次版本查询）
+    """
+    if current_version() >= LATEST_VERSION:
+        return 0
+
+    applied_count = 0
+    with _migration_lock():
+        # 等锁期间其他 worker 可能已经迁移完毕
+        applied = current_version()
+        if applied == 0:
+            _create_migrations_table()
+        for version, name, migrate in MIGRATIONS:
+            if version <= applied:
+                continue
+            started = time.perf_counter()
+            migrate()
+            _record(version, name)
+            applied_count += 1
+            logger.info(f"Applied migration {version:03d}_{name} ({time.perf_counter() - started:.2f}s)")
+    if applied_count:
+        logger.info(f"Database schema at version {LATEST_VERSION} ({applied_count} migrations applied)")
+    return applied_count
@@ -0,0 +1,253 @@
+"""
+近重复内容识别（转载 / 搬运 / 镜像账号）
+同一内容换了 BV 号后精确缓存键无法命中，这里为每个视频建立内容指纹：
+- 时长分桶：时长差距过大的视频直接排除
+- 标题 MinHash：估计标题字符 3-gram 的 Jaccard 相似度
+- 字幕 SimHash：64 位指纹，汉明距离越小内容越接近
+
+SimHash 拆成 4 个 16 位分段入库：汉明距离 ≤ 3 时至少有一段完全相同，
+因此只需按「相邻时长桶 + 任一分段相等」取少量候选，再逐个精确比较。
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .db import get_connection, using_postgres
+from .migrations import apply_steps
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3"))
+NEAR_DUP_MIN_TITLE_SIMILARITY = float(os.getenv("NEAR_DUP_MIN_TITLE_SIMILARITY", "0.5"))
+NEAR_DUP_DURATION_BUCKET = int(os.getenv("NEAR_DUP_DURATION_BUCKET", "15"))
+NEAR_DUP_MIN_TRANSCRIPT_CHARS = int(os.getenv("NEAR_DUP_MIN_TRANSCRIPT_CHARS", "200"))
+
+MINHASH_PERMUTATIONS = 32
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_perm_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_perm_rng.randrange(1, _MERSENNE_PRIME), _perm_rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+_TIMESTAMP = re.compile(r"\[\d{1,2}:\d{2}(?::\d{2})?\]")
+_NOISE = re.compile(r"[\s\W_]+", re.UNICODE)
+# 转载标题常见前后缀，不参与比较
+_TITLE_TAGS = re.compile(r"【[^】]*】|\[[^\]]*\]|（[^）]*）|\([^)]*\)")
+
+
+class NearDuplicateFound(Exception):
+    """下载阶段识别到已有总结的近重复视频（由调用方直接返回缓存结果）"""
+
+    def __init__(self, source_url: str, cached: Dict[str, Any], distance: int, title_similarity: float):
+        super().__init__(f"near duplicate of {source_url}")
+        self.source_url = source_url
+        self.cached = cached
+        self.distance = distance
+        self.title_similarity = title_similarity
+
+
+@dataclass
+class ContentFingerprint:
+    duration_bucket: int
+    title_minhash: List[int]
+    simhash: int
+
+    @property
+    def bands(self) -> List[int]:
+        mask = (1 << _BAND_BITS) - 1
+        return [(self.simhash >> (i * _BAND_BITS)) & mask for i in range(SIMHASH_BANDS)]
+
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _normalize(text: str) -> str:
+    return _NOISE.sub("", text).lower()
+
+
+def _shingles(text: str, size: int) -> List[str]:
+    if len(text) <= size:
+        return [text] if text else []
+    return [text[i:i + size] for i in range(len(text) - size + 1)]
+
+
+def title_minhash(title: str) -> List[int]:
+    """标题字符 3-gram 的 MinHash 签名（标题为空时返回空列表）"""
+    shingles = set(_shingles(_normalize(_TITLE_TAGS.sub("", title or "")), 3))
+    if not shingles:
+        return []
+    hashes = [_hash64(s) for s in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def minhash_similarity(left: List[int], right: List[int]) -> float:
+    if not left or not right or len(left) != len(right):
+        return 0.0
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def transcript_simhash(transcript: str) -> int:
+    """字幕文本（去掉时间戳与标点）字符 4-gram 的 64 位 SimHash"""
+    counts: Dict[str, int] = {}
+    for shingle in _shingles(_normalize(_TIMESTAMP.sub("", transcript or "")), 4):
+        counts[shingle] = counts.get(shingle, 0) + 1
+
+    weights = [0] * SIMHASH_BITS
+    for shingle, weight in counts.items():
+        h = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += weight if (h >> bit) & 1 else -weight
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(left: int, right: int) -> int:
+    return bin(left ^ right).count("1")
+
+
+def build_fingerprint(title: str, duration: Optional[float], transcript: str) -> Optional[ContentFingerprint]:
+    """字幕过短或缺少时长时不建立指纹（证据不足，容易误判）"""
+    if not duration or len(_normalize(transcript or "")) < NEAR_DUP_MIN_TRANSCRIPT_CHARS:
+        return None
+    return ContentFingerprint(
+        duration_bucket=int(duration) // NEAR_DUP_DURATION_BUCKET,
+        title_minhash=title_minhash(title),
+        simhash=transcript_simhash(transcript)
+    )
+
+
+def init_near_duplicate_db():
+    """初始化内容指纹表（表结构定义在 migrations 中）"""
+    apply_steps("near_duplicate_tables")
+
+
+def record_fingerprint(video_id: str, url: str, fingerprint: ContentFingerprint) -> None:
+    """登记（或更新）视频的内容指纹"""
+    params = (
+        video_id,
+        url,
+        fingerprint.duration_bucket,
+        json.dumps(fingerprint.title_minhash),
+        format(fingerprint.simhash, "016x"),
+        *fingerprint.bands
+    )
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if using_postgres():
+            cursor.execute("""
+                INSERT INTO content_fingerprints
+                (video_id, url, duration_bucket, title_minhash, simhash, band0, band1, band2, band3)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (video_id) DO UPDATE SET
+                    url = EXCLUDED.url,
+                    duration_bucket = EXCLUDED.duration_bucket,
+                    title_minhash = EXCLUDED.title_minhash,
+                    simhash = EXCLUDED.simhash,
+                    band0 = EXCLUDED.band0,
+                    band1 = EXCLUDED.band1,
+                    band2 = EXCLUDED.band2,
+                    band3 = EXCLUDED.band3
+            """, params)
+        else:
+            cursor.execute("""
+                INSERT OR REPLACE INTO content_fingerprints
+                (video_id, url, duration_bucket, title_minhash, simhash, band0, band1, band2, band3)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def find_near_duplicates(video_id: str, fingerprint: ContentFingerprint, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    查找近重复视频（不含自身），按字幕汉明距离从小到大排序
+
+    Returns:
+        [{"video_id", "url", "distance", "title_similarity"}]
+    """
+    buckets = [fingerprint.duration_bucket + offset for offset in (-1, 0, 1)]
+    band_clause = " OR ".join(f"band{i} = ?" for i in range(SIMHASH_BANDS))
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT video_id, url, title_minhash, simhash
+            FROM content_fingerprints
+            WHERE duration_bucket IN (?, ?, ?)
+              AND ({band_clause})
+              AND video_id != ?
+        """, (*buckets, *fingerprint.bands, video_id))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    matches = []
+    for row in rows:
+        distance = hamming_distance(fingerprint.simhash, int(row["simhash"], 16))
+        if distance > NEAR_DUP_MAX_DISTANCE:
+            continue
+        similarity = minhash_similarity(fingerprint.title_minhash, json.loads(row["title_minhash"] or "[]"))
+        if similarity < NEAR_DUP_MIN_TITLE_SIMILARITY:
+            continue
+        matches.append({
+            "video_id": row["video_id"],
+            "url": row["url"],
+            "distance": distance,
+            "title_similarity": round(similarity, 3)
+        })
+    matches.sort(key=lambda m: (m["distance"], -m["title_similarity"]))
+    return matches[:limit]
+
+
+def check_near_duplicate(
+    video_id: str,
+    url: str,
+    title: str,
+    duration: Optional[float],
+    transcript: str,
+    lookup: Callable[[str], Optional[Dict[str, Any]]]
+) -> None:
+    """
+    登记指纹，并在近重复视频已有总结时抛出 NearDuplicateFound
+
+    Args:
+        lookup: 按候选视频 URL 查询缓存总结（由调用方决定模式、侧重点、模板与语言）
+
+    指纹库异常只记录日志，不影响正常下载流程。
+    """
+    if not NEAR_DUP_ENABLED:
+        return
+    fingerprint = build_fingerprint(title, duration, transcript)
+    if fingerprint is None:
+        return
+
+    try:
+        candidates = find_near_duplicates(video_id, fingerprint)
+        record_fingerprint(video_id, url, fingerprint)
+    except Exception as e:
+        logger.warning(f"内容指纹查询失败: {e}")
+        return
+
+    for candidate in candidates:
+        cached = lookup(candidate["url"])
+        if cached:
+            raise NearDuplicateFound(
+                candidate["url"], cached, candidate["distance"], candidate["title_similarity"]
+            )
@@ -348,6 +348,7 @@ def deliver_order(order_id: str) -> bool:
     import logging
     from .db import get_connection
     from .credits import grant_credits
+    from .user_context import invalidate_user_context
     
     logger = logging.getLogger(__name__)
     
@@ -402,6 +403,7 @@ def deliver_order(order_id: str) -> bool:
             VALUES (?, ?, 'active', ?, ?)
         """, (user_id, plan, period_end.isoformat(), datetime.utcnow().isoformat()))
         logger.info(f"Activated subscription {plan} for user {user_id}")
+        invalidate_user_context(user_id)
     
     # 更新订单和账单状态
     cursor.execute("UPDATE payment_orders SET status = ?, updated_at = ? WHERE id = ?", 
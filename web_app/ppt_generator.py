@@ -1,24 +1,27 @@
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
 import io
 import re
 
+from .lazy_imports import lazy_module
+
+# python-pptx 导入较慢，生成第一份 PPT 时才加载
+pptx = lazy_module("pptx")
+pptx_util = lazy_module("pptx.util")
+pptx_color = lazy_module("pptx.dml.color")
+
 class PPTGenerator:
     def __init__(self):
-        self.prs = Presentation()
+        self.prs = pptx.Presentation()
         # 16:9 Aspect Ratio
-        self.prs.slide_width = Inches(13.333)
-        self.prs.slide_height = Inches(7.5)
+        self.prs.slide_width = pptx_util.Inches(13.333)
+        self.prs.slide_height = pptx_util.Inches(7.5)
 
     def _set_font(self, run, size: int, bold: bool = False, color: tuple = None):
         font = run.font
         font.name = 'Microsoft YaHei'  # Fallback to standard font
-        font.size = Pt(size)
+        font.size = pptx_util.Pt(size)
         font.bold = bold
         if color:
-            font.color.rgb = RGBColor(*color)
+            font.color.rgb = pptx_color.RGBColor(*color)
 
     def create_cover_slide(self, title: str, subtitle: str):
         """Create the title slide."""
@@ -60,7 +63,7 @@ class PPTGenerator:
                 p.text = point.strip()
             
             self._set_font(p.runs[0], 20, False, (55, 65, 81))
-            p.space_after = Pt(10)
+            p.space_after = pptx_util.Pt(10)
 
     def generate_from_json(self, data: dict) -> io.BytesIO:
         """
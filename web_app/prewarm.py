@@ -0,0 +1,283 @@
+"""
+预测式预总结（缓存预热）
+从热门榜单与订阅 UP 主的新视频中挑选候选，按预期需求排序，
+在每日 token / 视频数预算内以后台优先级提前写入 video_cache。
+
+默认关闭，通过 PREWARM_ENABLED=1 开启。
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Any, List, Optional, Set
+import logging
+
+from .queue_manager import task_queue, TaskPriority
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "0") == "1"
+PREWARM_DAILY_TOKENS = int(os.getenv("PREWARM_DAILY_TOKENS", "500000"))
+PREWARM_DAILY_VIDEOS = int(os.getenv("PREWARM_DAILY_VIDEOS", "20"))
+PREWARM_INTERVAL_MINUTES = int(os.getenv("PREWARM_INTERVAL_MINUTES", "30"))
+# 最终失败的视频在该时长（秒）内不再进入候选
+PREWARM_FAILURE_TTL = int(os.getenv("PREWARM_FAILURE_TTL", "21600"))
+PREWARM_MODE = "smart"
+PREWARM_FOCUS = "default"
+
+# 一个订阅者的预期需求约等于播放量高一个数量级的热门视频
+SUBSCRIBER_WEIGHT = 1.0
+TRENDING_CANDIDATES = 30
+DEFAULT_TOKENS_PER_VIDEO = 30000
+# 每个预热任务的总尝试次数（task_queue 的 max_retries 即总尝试次数）
+PREWARM_MAX_ATTEMPTS = 2
+
+
+@dataclass
+class PrewarmCandidate:
+    """预热候选视频"""
+    bvid: str
+    url: str
+    title: str = ""
+    views: int = 0
+    subscribers: int = 0
+    sources: Set[str] = field(default_factory=set)
+    added_at: float = field(default_factory=time.time)
+
+    @property
+    def score(self) -> float:
+        """预期需求：订阅者数量 + 播放量的数量级"""
+        return SUBSCRIBER_WEIGHT * self.subscribers + math.log10(self.views + 1)
+
+
+def _extract_bvid(url: str) -> Optional[str]:
+    match = re.search(r'BV[a-zA-Z0-9]+', url or "")
+    return match.group(0) if match else None
+
+
+class PrewarmService:
+    def __init__(
+        self,
+        daily_tokens: int = PREWARM_DAILY_TOKENS,
+        daily_videos: int = PREWARM_DAILY_VIDEOS
+    ):
+        self.daily_tokens = daily_tokens
+        self.daily_videos = daily_videos
+        self.candidates: Dict[str, PrewarmCandidate] = {}
+        self.prewarmed: Set[str] = set()
+        self.hits: Set[str] = set()
+        self.hit_count = 0
+        self.failures = 0
+        self._inflight: Set[str] = set()
+        self._failed: Dict[str, float] = {}
+        self._day = date.today().isoformat()
+        self._tokens_today = 0
+        self._videos_today = 0
+        self._avg_tokens = DEFAULT_TOKENS_PER_VIDEO
+
+    # ---- 候选收集 ----
+
+    def add_candidate(self, video: Dict[str, Any], source: str, subscribers: int = 0) -> None:
+        """登记候选视频（同一视频多次登记时累加订阅者数）"""
+        bvid = video.get("bvid") or _extract_bvid(video.get("url", ""))
+        if not bvid or bvid in self.prewarmed or self._recently_failed(bvid):
+            return
+        candidate = self.candidates.get(bvid)
+        if candidate is None:
+            candidate = PrewarmCandidate(
+                bvid=bvid,
+                url=video.get("url") or f"https://www.bilibili.com/video/{bvid}",
+                title=video.get("title", "")
+            )
+            self.candidates[bvid] = candidate
+        candidate.views = max(candidate.views, int(video.get("view") or 0))
+        candidate.subscribers += subscribers
+        candidate.sources.add(source)
+
+    def _collect_trending(self) -> None:
+        from .services.trending_service import trending_service
+        for video in trending_service.get_videos(TRENDING_CANDIDATES):
+            self.add_candidate(video, "trending")
+
+    def _recently_failed(self, bvid: str) -> bool:
+        failed_until = self._failed.get(bvid)
+        if failed_until is None:
+            return False
+        if failed_until <= time.time():
+            del self._failed[bvid]
+            return False
+        return True
+
+    def rank_candidates(self) -> List[PrewarmCandidate]:
+        return sorted(self.candidates.values(), key=lambda c: c.score, reverse=True)
+
+    # ---- 预算 ----
+
+    def _roll_day(self) -> None:
+        today = date.today().isoformat()
+        if today != self._day:
+            self._day = today
+            self._tokens_today = 0
+            self._videos_today = 0
+            # 隔天的候选热度已失效
+            self.candidates.clear()
+
+    def _has_budget(self) -> bool:
+        reserved = len(self._inflight)
+        if self._videos_today + reserved >= self.daily_videos:
+            return False
+        return self._tokens_today + (reserved + 1) * self._avg_tokens <= self.daily_tokens
+
+    def _record_usage(self, tokens: int) -> None:
+        self._tokens_today += tokens
+        self._videos_today += 1
+        if tokens > 0:
+            self._avg_tokens = int(0.8 * self._avg_tokens + 0.2 * tokens)
+
+    def _record_failed_attempt(self, llm_called: bool, final: bool) -> None:
+        """失败的尝试同样计入预算：调用过 Gemini 时按平均用量估算 token，最终失败占用一个视频名额"""
+        if llm_called:
+            self._tokens_today += self._avg_tokens
+        if final:
+            self._videos_today += 1
+
+    # ---- 执行 ----
+
+    async def run_cycle(self) -> int:
+        """执行一轮预热：收集候选、排序并在预算内提交后台任务"""
+        if not PREWARM_ENABLED:
+            return 0
+        from .cache import get_cached_result
+
+        self._roll_day()
+        self._collect_trending()
+
+        submitted = 0
+        for candidate in self.rank_candidates():
+            if not self._has_budget():
+                break
+            if candidate.bvid in self._inflight or self._recently_failed(candidate.bvid):
+                continue
+            cached = await asyncio.to_thread(get_cached_result, candidate.url, PREWARM_MODE, PREWARM_FOCUS)
+            if cached:
+                self.candidates.pop(candidate.bvid, None)
+                continue
+            try:
+                await task_queue.submit('prewarm', {
+                    'url': candidate.url,
+                    'bvid': candidate.bvid
+                }, priority=TaskPriority.BACKGROUND, max_retries=PREWARM_MAX_ATTEMPTS)
+            except Exception as e:
+                logger.warning(f"Prewarm submit failed: {e}")
+                break
+            self._inflight.add(candidate.bvid)
+            self.candidates.pop(candidate.bvid, None)
+            submitted += 1
+
+        if submitted:
+            logger.info(f"Prewarm cycle submitted {submitted} videos (tokens today: {self._tokens_today}/{self.daily_tokens})")
+        return submitted
+
+    async def handle_task(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        task_queue 处理器：下载 → 总结 → 转录 → 写缓存
+
+        与 /summarize 冷启动走同一条路径：视频/音频的总结调用同时产出基础笔记并写入基础提取缓存，
+        用户打开预热过的视频后切换侧重点/语言只需一次纯文本调用。
+        """
+        from .downloader import download_content
+        from .summarizer_gemini import (
+            summarize_content, summarize_with_base_notes, extract_ai_transcript, upload_to_gemini, delete_gemini_file
+        )
+        from .cache import save_to_cache, save_base_extraction
+        from .db_async import run_db
+
+        url = payload['url']
+        bvid = payload['bvid']
+        # 重试时 task_queue 传入同一个 payload，用它记录第几次尝试
+        payload['attempt'] = payload.get('attempt', 0) + 1
+        final_attempt = payload['attempt'] >= PREWARM_MAX_ATTEMPTS
+        loop = asyncio.get_event_loop()
+        remote_file = None
+        llm_called = False
+        retry_pending = False
+        try:
+            video_path, media_type, transcript = await loop.run_in_executor(
+                None, download_content, url, PREWARM_MODE
+            )
+            llm_called = True
+            if media_type in ['video', 'audio']:
+                remote_file = await loop.run_in_executor(None, upload_to_gemini, video_path, None)
+
+            if media_type in ['video', 'audio']:
+                summary_text, usage, notes = await loop.run_in_executor(
+                    None, summarize_with_base_notes, video_path, media_type, None, PREWARM_FOCUS, remote_file
+                )
+            else:
+                # 字幕模式：字幕本身就是基础文本
+                summary_text, usage = await loop.run_in_executor(
+                    None, summarize_content, video_path, media_type, None, PREWARM_FOCUS, remote_file
+                )
+                notes = '' if transcript else None
+            if not transcript and media_type in ['audio', 'video']:
+                transcript = await loop.run_in_executor(
+                    None, extract_ai_transcript, video_path, None, remote_file
+                )
+
+            usage = dict(usage or {})
+            if notes is not None:
+                await run_db(save_base_extraction, url, PREWARM_MODE, notes, transcript or '', dict(usage))
+            usage["prewarmed"] = True
+            await run_db(save_to_cache, url, PREWARM_MODE, PREWARM_FOCUS, summary_text, transcript or '', usage)
+            self._record_usage(int(usage.get("total_tokens") or 0))
+            self.prewarmed.add(bvid)
+            return {"bvid": bvid, "tokens": usage.get("total_tokens", 0)}
+        except Exception:
+            self.failures += 1
+            self._record_failed_attempt(llm_called, final_attempt)
+            if final_attempt:
+                self._failed[bvid] = time.time() + PREWARM_FAILURE_TTL
+            else:
+                retry_pending = True
+            raise
+        finally:
+            # 还会重试时保留 inflight，避免下一轮收集重复提交同一视频
+            if not retry_pending:
+                self._inflight.discard(bvid)
+            if remote_file:
+                loop.run_in_executor(None, delete_gemini_file, remote_file)
+
+    # ---- 命中率 ----
+
+    def record_hit(self, url: str) -> None:
+        """用户请求命中了预热写入的缓存"""
+        bvid = _extract_bvid(url)
+        if not bvid:
+            return
+        self.hit_count += 1
+        self.hits.add(bvid)
+
+    def stats(self) -> Dict[str, Any]:
+        self._roll_day()
+        prewarmed = len(self.prewarmed)
+        hit_videos = len(self.hits & self.prewarmed)
+        return {
+            "enabled": PREWARM_ENABLED,
+            "prewarmed": prewarmed,
+            "hit_videos": hit_videos,
+            "hit_requests": self.hit_count,
+            "hit_rate": round(hit_videos / prewarmed, 4) if prewarmed else 0.0,
+            "failures": self.failures,
+            "pending_candidates": len(self.candidates),
+            "inflight": len(self._inflight),
+            "tokens_today": self._tokens_today,
+            "videos_today": self._videos_today,
+            "daily_token_budget": self.daily_tokens,
+            "daily_video_budget": self.daily_videos
+        }
+
+
+prewarm_service = PrewarmService()
@@ -3,8 +3,10 @@
 使用 asyncio.Queue 实现轻量级任务队列
 """
 import asyncio
+import itertools
 import time
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, Callable
 from enum import Enum
@@ -12,6 +14,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class TaskPriority:
+    """任务优先级（数值越小越先执行）"""
+    INTERACTIVE = 0   # 用户正在等待的请求
+    BATCH = 5         # 批量任务
+    BACKGROUND = 10   # 预热等后台任务，只在空闲时执行
+
 class TaskStatus(Enum):
     PENDING = "pending"
     RUNNING = "running"
@@ -31,29 +39,46 @@ class Task:
     completed_at: Optional[float] = None
     retry_count: int = 0
     max_retries: int = 3
+    priority: int = TaskPriority.INTERACTIVE
 
 class TaskQueue:
-    def __init__(self, max_workers: int = 3, max_queue_size: int = 100):
-        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+    def __init__(self, max_workers: int = 3, max_queue_size: int = 100, max_background_workers: int = 1):
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue_size)
         self.tasks: Dict[str, Task] = {}
         self.max_workers = max_workers
         self.workers: list = []
         self.running = False
         self.handlers: Dict[str, Callable] = {}
+        # 后台任务最多占用的 worker 数，保证交互请求始终有空闲 worker
+        self.max_background_workers = max(1, min(max_background_workers, max_workers - 1))
+        self._background_running = 0
+        # 名额已满时取出的后台任务暂存于此，名额释放时再放回队列
+        self._deferred: deque = deque()
+        self._seq = itertools.count()
     
     def register_handler(self, task_type: str, handler: Callable):
         """注册任务处理器"""
         self.handlers[task_type] = handler
     
-    async def submit(self, task_type: str, payload: Dict[str, Any]) -> str:
+    def _entry(self, task: Task) -> tuple:
+        # 同优先级按提交顺序（FIFO）出队
+        return (task.priority, next(self._seq), task)
+    
+    async def submit(
+        self,
+        task_type: str,
+        payload: Dict[str, Any],
+        priority: int = TaskPriority.INTERACTIVE,
+        max_retries: int = 3
+    ) -> str:
         """提交任务，返回任务ID"""
         task_id = str(uuid.uuid4())
-        task = Task(id=task_id, task_type=task_type, payload=payload)
+        task = Task(id=task_id, task_type=task_type, payload=payload, priority=priority, max_retries=max_retries)
         self.tasks[task_id] = task
         
         try:
             await asyncio.wait_for(
-                self.queue.put(task),
+                self.queue.put(self._entry(task)),
                 timeout=5.0
             )
             logger.info(f"Task {task_id} submitted: {task_type}")
@@ -72,11 +97,27 @@ class TaskQueue:
         logger.info(f"Worker {worker_id} started")
         while self.running:
             try:
-                task = await asyncio.wait_for(
+                entry = await asyncio.wait_for(
                     self.queue.get(),
                     timeout=1.0
                 )
-                await self._process_task(task, worker_id)
+                task = entry[2]
+                if task.priority >= TaskPriority.BACKGROUND:
+                    if self._background_running >= self.max_background_workers:
+                        # 后台名额已满：暂存任务，等名额释放时再放回队列，避免反复出队轮询
+                        self._deferred.append(entry)
+                        self.queue.task_done()
+                        continue
+                    self._background_running += 1
+                    try:
+                        await self._process_task(task, worker_id)
+                    finally:
+                        self._background_running -= 1
+                        if self._deferred:
+                            # 保留原排序键，暂存的任务仍按提交顺序执行
+                            await self.queue.put(self._deferred.popleft())
+                else:
+                    await self._process_task(task, worker_id)
                 self.queue.task_done()
             except asyncio.TimeoutError:
                 continue
@@ -109,7 +150,7 @@ class TaskQueue:
             if task.retry_count < task.max_retries:
                 # 重新入队重试
                 task.status = TaskStatus.PENDING
-                await self.queue.put(task)
+                await self.queue.put(self._entry(task))
                 logger.warning(f"Task {task.id} failed, retrying ({task.retry_count}/{task.max_retries})")
             else:
                 task.status = TaskStatus.FAILED
@@ -10,6 +10,7 @@ from datetime import datetime
 
 from ..dependencies import get_current_user
 from ..db import get_connection
+from ..api_key_cache import invalidate_api_key
 
 router = APIRouter(prefix="/api/keys", tags=["API Keys"])
 
@@ -96,6 +97,7 @@ async def delete_api_key(key_id: str, user: dict = Depends(get_current_user)):
             raise HTTPException(404, "API key not found or unauthorized")
         
         conn.commit()
+        invalidate_api_key(key_id)
         return {"message": "API key deleted successfully"}
     finally:
         conn.close()
@@ -3,6 +3,7 @@ Dashboard Router - 用户面板、订阅、额度相关端点
 """
 from fastapi import APIRouter, Request, HTTPException, Depends
 from typing import Optional
+import asyncio
 import os
 import logging
 
@@ -10,6 +11,8 @@ from ..dependencies import get_current_user, get_optional_user
 from ..auth import verify_session_token
 from ..credits import ensure_user_credits, get_user_credits, get_credit_history, get_daily_usage
 from ..db import get_connection
+from ..db_async import run_db
+from ..user_context import FREE_SUBSCRIPTION, get_user_context, is_pro_active
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +35,12 @@ def is_unlimited_user(user: Optional[dict]) -> bool:
 
 # --- 订阅检查辅助函数 ---
 def fetch_subscription(user_id: str) -> dict:
-    """从本地 DB 获取订阅信息"""
+    """获取订阅信息（优先取请求内已加载的用户上下文）"""
+    context = get_user_context(user_id)
+    if context:
+        return context["subscription"]
+    
+    # 尚未开户的用户：单独查订阅表
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -50,24 +58,14 @@ def fetch_subscription(user_id: str) -> dict:
                 "current_period_end": row["current_period_end"],
                 "updated_at": row["updated_at"]
             }
-        return {
-            "plan": "free",
-            "status": "inactive",
-            "current_period_end": None,
-            "updated_at": None
-        }
+        return dict(FREE_SUBSCRIPTION)
     finally:
         conn.close()
 
 
 def is_subscription_active(user_id: str) -> bool:
     """检查用户订阅是否有效"""
-    subscription = fetch_subscription(user_id)
-    if subscription["plan"] != "pro":
-        return False
-    if subscription["status"] != "active":
-        return False
-    return True
+    return is_pro_active(fetch_subscription(user_id))
 
 
 # --- Dashboard 端点 ---
@@ -77,13 +75,13 @@ async def get_dashboard(request: Request):
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
     user = await verify_session_token(token)
     
-    credits_info = ensure_user_credits(user["user_id"])
-    usage = get_daily_usage(user["user_id"])
-    history = get_credit_history(user["user_id"])
-    subscription = fetch_subscription(user["user_id"])
-    
-    # 检查是否为激活的 Pro 订阅
-    is_pro_active = (subscription["plan"] == "pro" and subscription["status"] == "active")
+    # 积分与订阅一次查询并缓存到请求上下文；用量与流水在数据库线程池中并发查询
+    credits_info = await run_db(ensure_user_credits, user["user_id"])
+    usage, history, subscription = await asyncio.gather(
+        run_db(get_daily_usage, user["user_id"]),
+        run_db(get_credit_history, user["user_id"]),
+        run_db(fetch_subscription, user["user_id"]),
+    )
     
     return {
         "credits": credits_info["credits"],
@@ -91,7 +89,7 @@ async def get_dashboard(request: Request):
         "usage_history": usage,
         "credit_history": history,
         "is_admin": is_unlimited_user(user),
-        "is_pro_active": is_pro_active,  # 新增：Pro 是否激活
+        "is_pro_active": is_pro_active(subscription),  # 新增：Pro 是否激活
         "cost_per_summary": 10
     }
 
@@ -100,7 +98,7 @@ async def get_dashboard(request: Request):
 @router.get("/subscription")
 async def get_subscription(user: dict = Depends(get_current_user)):
     """获取用户订阅状态"""
-    subscription = fetch_subscription(user["user_id"])
+    subscription = await run_db(fetch_subscription, user["user_id"])
     return {
         "user_id": user["user_id"],
         "plan": subscription["plan"],
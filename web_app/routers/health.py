@@ -2,7 +2,12 @@
 Health check router - 独立于 DB 的健康检查端点
 必须第一个注册，确保即使 DB 初始化失败也能响应
 """
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+
+from ..metrics import CONTENT_TYPE, METRICS_TOKEN, render_metrics
 
 router = APIRouter(tags=["Health"])
 
@@ -17,3 +22,11 @@ async def health_check():
 async def api_health_check():
     """API health check endpoint"""
     return {"status": "ok", "service": "Bili-Summarizer API"}
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus 文本格式指标；配置 METRICS_TOKEN 时需携带 Bearer Token"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
@@ -7,6 +7,8 @@ from typing import List, Optional
 import logging
 
 from ..auth import verify_session_token
+from ..bilibili_cache import video_cache
+from ..bilibili_rate_limiter import call_bilibili_api_with_limit
 from ..services.subscriptions_service import (
     search_up,
     subscribe_up,
@@ -100,12 +102,12 @@ async def get_up_videos(up_mid: str, count: int = 2, request: Request = None):
         except HTTPException:
             pass  # 允许未登录用户查询
     
-    # 获取视频列表
-    videos = await get_up_latest_videos(up_mid, count)
-    
+    # 获取视频列表（缓存 + 限流；旧数据立即返回并后台刷新）
     # 即使遇到风控也容错,返回空列表
-    if videos is None:
-        videos = []
+    videos = await video_cache.get_or_fetch(
+        f"{up_mid}:{count}",
+        lambda: call_bilibili_api_with_limit(get_up_latest_videos, up_mid, count)
+    )
     
     return {
         "up_mid": up_mid,
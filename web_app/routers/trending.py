@@ -1,76 +1,58 @@
 """
 Trending Router - B站热门视频推荐
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
-import httpx
+from email.utils import formatdate
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
 import logging
 
+from ..services.trending_service import trending_service
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/trending", tags=["Trending"])
 
 
+def _not_modified(request: Request, etag: str) -> bool:
+    """
+    根据 If-None-Match 判断客户端缓存是否仍然有效
+
+    只有 ETag 区分 limit；Last-Modified 是整份快照的刷新时间，各 limit 共用，
+    单独携带 If-Modified-Since 的请求无法确认客户端持有的是哪个 limit，因此不据此返回 304。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
 @router.get("/videos")
-async def get_trending_videos(limit: int = 20):
+async def get_trending_videos(request: Request, limit: int = 20):
     """获取B站热门视频列表
-    
+
+    数据来自后台定时刷新的内存快照，请求从不等待 B 站。
+    支持 ETag 条件请求（If-None-Match 命中返回 304）。
+
     Args:
         limit: 返回视频数量，默认20个
-    
+
     Returns:
         {"videos": [...]}
     """
-    try:
-        # B站热门视频API
-        url = "https://api.bilibili.com/x/web-interface/popular"
-        params = {"ps": min(limit, 50), "pn": 1}
-        
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-            "Referer": "https://www.bilibili.com"
-        }
-        
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url, params=params, headers=headers)
-            data = response.json()
-            
-            if data.get("code") != 0:
-                logger.error(f"Get trending failed: {data.get('message')}")
-                return {"videos": []}
-            
-            raw_videos = data.get("data", {}).get("list", [])
-            
-            # 转换为统一格式
-            videos = []
-            for v in raw_videos:
-                videos.append({
-                    "bvid": v.get("bvid", ""),
-                    "title": v.get("title", ""),
-                    "cover": v.get("pic", ""),
-                    "duration": format_duration(v.get("duration", 0)),
-                    "view": v.get("stat", {}).get("view", 0),
-                    "like": v.get("stat", {}).get("like", 0),
-                    "danmaku": v.get("stat", {}).get("danmaku", 0),
-                    "url": f"https://www.bilibili.com/video/{v.get('bvid', '')}",
-                    "owner": {
-                        "name": v.get("owner", {}).get("name", ""),
-                        "mid": v.get("owner", {}).get("mid", ""),
-                        "face": v.get("owner", {}).get("face", "")
-                    },
-                    "pubdate": v.get("pubdate", 0),
-                    "desc": v.get("desc", "")[:100]  # 简介截取100字
-                })
-            
-            return {"videos": videos}
-            
-    except Exception as e:
-        logger.error(f"Get trending exception: {e}")
+    snapshot = trending_service.snapshot
+    if not snapshot.ready:
+        # 冷启动：快照尚未就绪，触发后台刷新后立即返回
+        trending_service.refresh_in_background()
         return {"videos": []}
 
+    etag = f'"{snapshot.etag}-{limit}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(snapshot.updated_at, usegmt=True),
+        "Cache-Control": "public, max-age=60"
+    }
+
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
 
-def format_duration(seconds: int) -> str:
-    """格式化时长为 mm:ss"""
-    minutes = seconds // 60
-    secs = seconds % 60
-    return f"{minutes:02d}:{secs:02d}"
+    return JSONResponse({"videos": trending_service.get_videos(limit)}, headers=headers)
@@ -9,6 +9,8 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from .services.subscriptions_service import get_all_subscriptions, get_up_latest_videos, update_subscription_check
 from .notifications import queue_notification, process_notification_queue
+from .services.trending_service import trending_service, TRENDING_REFRESH_MINUTES
+from .prewarm import prewarm_service, PREWARM_ENABLED, PREWARM_INTERVAL_MINUTES
 from .wbi import parse_wbi_keys
 import httpx
 
@@ -74,6 +76,9 @@ async def check_new_videos():
                     # 下面的逻辑只是决定发不发通知
                     
                     if sub["last_video_bvid"]:
+                        # 订阅者越多，新视频被请求总结的可能越大
+                        prewarm_service.add_candidate(latest, "subscription", subscribers=1)
+
                         # 加入通知队列
                         await queue_notification(
                             user_id=sub["user_id"],
@@ -111,6 +116,24 @@ def start_scheduler():
         next_run_time=datetime.now()
     )
     
+    # 定时刷新热门视频快照（启动时立即预取一次）
+    scheduler.add_job(
+        trending_service.refresh,
+        trigger=IntervalTrigger(minutes=TRENDING_REFRESH_MINUTES),
+        id="refresh_trending",
+        replace_existing=True,
+        next_run_time=datetime.now()
+    )
+    
+    # 预测式预总结（需显式开启）
+    if PREWARM_ENABLED:
+        scheduler.add_job(
+            prewarm_service.run_cycle,
+            trigger=IntervalTrigger(minutes=PREWARM_INTERVAL_MINUTES),
+            id="prewarm_cycle",
+            replace_existing=True
+        )
+    
     # 每 5 分钟处理一次通知队列
     scheduler.add_job(
         process_notification_queue,
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from ..bilibili_rate_limiter import bilibili_limiter
+from ..clients.bilibili_client import BILIBILI_API, get_shared_client
+from ..metrics import record_bilibili_code
+
+logger = logging.getLogger(__name__)
+
+TRENDING_PAGES = int(os.getenv("TRENDING_PAGES", "3"))
+TRENDING_PAGE_SIZE = 50
+TRENDING_REFRESH_MINUTES = int(os.getenv("TRENDING_REFRESH_MINUTES", "10"))
+
+
+@dataclass
+class TrendingSnapshot:
+    """热门视频快照（内存共享，只读）"""
+    videos: List[Dict[str, Any]] = field(default_factory=list)
+    etag: str = ""
+    updated_at: float = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.updated_at > 0
+
+
+def format_duration(seconds: int) -> str:
+    """格式化时长为 mm:ss"""
+    minutes = seconds // 60
+    secs = seconds % 60
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def _normalize_video(v: Dict[str, Any]) -> Dict[str, Any]:
+    """转换为统一格式"""
+    return {
+        "bvid": v.get("bvid", ""),
+        "title": v.get("title", ""),
+        "cover": v.get("pic", ""),
+        "duration": format_duration(v.get("duration", 0)),
+        "view": v.get("stat", {}).get("view", 0),
+        "like": v.get("stat", {}).get("like", 0),
+        "danmaku": v.get("stat", {}).get("danmaku", 0),
+        "url": f"https://www.bilibili.com/video/{v.get('bvid', '')}",
+        "owner": {
+            "name": v.get("owner", {}).get("name", ""),
+            "mid": v.get("owner", {}).get("mid", ""),
+            "face": v.get("owner", {}).get("face", "")
+        },
+        "pubdate": v.get("pubdate", 0),
+        "desc": v.get("desc", "")[:100]  # 简介截取100字
+    }
+
+
+class TrendingService:
+    """
+    B站热门视频后台刷新器
+    - 定时预取多页 x/web-interface/popular 写入共享快照
+    - 请求只读快照，从不等待 B 站
+    - 刷新失败时保留上一份快照
+    """
+    def __init__(self, pages: int = TRENDING_PAGES, page_size: int = TRENDING_PAGE_SIZE):
+        self.pages = pages
+        self.page_size = page_size
+        self.snapshot = TrendingSnapshot()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _fetch_page(self, page: int) -> List[Dict[str, Any]]:
+        await bilibili_limiter.acquire()
+        client = get_shared_client()
+        response = await client.get(
+            f"{BILIBILI_API}/x/web-interface/popular",
+            params={"ps": self.page_size, "pn": page}
+        )
+        data = response.json()
+        record_bilibili_code("popular", data.get("code"))
+        if data.get("code") != 0:
+            raise ValueError(f"code={data.get('code')} {data.get('message')}")
+        return data.get("data", {}).get("list", []) or []
+
+    async def refresh(self) -> bool:
+        """拉取热门列表并原子替换快照"""
+        videos: List[Dict[str, Any]] = []
+        seen = set()
+        for page in range(1, self.pages + 1):
+            try:
+                raw_videos = await self._fetch_page(page)
+            except Exception as e:
+                logger.error(f"Get trending failed (page={page}): {e}")
+                break
+            for v in raw_videos:
+                bvid = v.get("bvid", "")
+                if bvid and bvid not in seen:
+                    seen.add(bvid)
+                    videos.append(_normalize_video(v))
+            if len(raw_videos) < self.page_size:
+                break
+
+        if not videos:
+            return False
+
+        body = json.dumps(videos, ensure_ascii=False, sort_keys=True).encode()
+        self.snapshot = TrendingSnapshot(
+            videos=videos,
+            etag=hashlib.md5(body).hexdigest(),
+            updated_at=time.time()
+        )
+        logger.info(f"Trending snapshot refreshed: {len(videos)} videos")
+        return True
+
+    def refresh_in_background(self) -> None:
+        """触发一次后台刷新（已有刷新在进行时忽略）"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    def get_videos(self, limit: int) -> List[Dict[str, Any]]:
+        return self.snapshot.videos[:max(limit, 0)]
+
+
+trending_service = TrendingService()
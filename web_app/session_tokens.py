@@ -0,0 +1,209 @@
+"""
+Supabase 会话令牌本地校验
+
+原先每个需要登录的请求都调用 supabase.auth.get_user(token)，一次远程往返约 100ms。
+Supabase 的会话令牌是标准 JWT，这里在本地校验签名、过期时间与 audience：
+- HS256：使用项目 JWT Secret（SUPABASE_JWT_SECRET）
+- RS256 / ES256：使用 JWKS 公钥，后台定期刷新；遇到未知 kid 时立即补刷一次
+- 校验通过的令牌放进短 TTL 的 LRU，同一令牌的后续请求只需一次字典查找
+
+本地无法判断的情况（未配置密钥、未知 kid、不支持的算法）返回 None，由调用方回退到远程校验；
+签名错误、已过期等明确无效的令牌直接拒绝，不再请求 Supabase。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import httpx
+import jwt
+
+from .metrics import AUTH_VERIFICATIONS, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = (os.getenv("SUPABASE_URL") or "").rstrip("/")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else ""
+)
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+JWT_ISSUER = os.getenv("JWT_ISSUER", "")
+JWT_LEEWAY_SECONDS = int(os.getenv("JWT_LEEWAY_SECONDS", "30"))
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "600"))
+# 未知 kid 触发补刷的最小间隔，避免伪造 kid 的请求把 JWKS 端点打爆
+JWKS_MIN_REFRESH_INTERVAL = 30.0
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+_ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "PS256"}
+
+
+class SessionTokenVerifier:
+    def __init__(
+        self,
+        secret: str = "",
+        jwks_url: str = "",
+        audience: str = "authenticated",
+        issuer: str = "",
+        leeway: int = 30,
+        cache_ttl: float = 60,
+        cache_size: int = 10000
+    ):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience or None
+        self.issuer = issuer or None
+        self.leeway = leeway
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._keys_loaded_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.secret or self.jwks_url)
+
+    # --- 已验证令牌缓存 ---
+
+    def _cached(self, token: str) -> Optional[dict]:
+        now = time.time()
+        with self._cache_lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+            return user
+
+    def remember(self, token: str, user: dict, token_exp: Optional[float] = None) -> None:
+        """缓存一次校验结果；有效期取 TTL 与令牌剩余有效期中较短者"""
+        expires_at = time.time() + self.cache_ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._cache_lock:
+            self._cache[token] = (user, expires_at)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    # --- 签名密钥 ---
+
+    def load_jwks(self, jwks: dict) -> int:
+        """载入 JWKS（{"keys": [...]}），返回可用的公钥数量"""
+        keys = {}
+        for data in jwks.get("keys", []):
+            try:
+                key = jwt.PyJWK(data)
+            except jwt.PyJWTError as e:
+                logger.warning(f"Skipping unsupported JWK {data.get('kid')}: {e}")
+                continue
+            keys[data.get("kid") or ""] = key
+        self._keys = keys
+        self._keys_loaded_at = time.time()
+        return len(keys)
+
+    async def refresh_keys(self, force: bool = False) -> None:
+        if not self.jwks_url:
+            return
+        async with self._refresh_lock:
+            if not force and time.time() - self._keys_loaded_at < JWKS_MIN_REFRESH_INTERVAL:
+                return
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                    count = self.load_jwks(response.json())
+                logger.info(f"Loaded {count} JWT signing keys")
+            except Exception as e:
+                # 保留旧密钥；新 kid 的令牌在刷新成功前走远程校验
+                self._keys_loaded_at = time.time()
+                logger.warning(f"JWKS refresh failed: {e}")
+
+    async def run_key_refresher(self) -> None:
+        """后台定期刷新 JWKS（应用启动时创建任务）"""
+        while True:
+            await self.refresh_keys(force=True)
+            await asyncio.sleep(JWKS_REFRESH_INTERVAL)
+
+    def _signing_key(self, header: dict):
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            return self.secret or None
+        if algorithm in _ASYMMETRIC_ALGORITHMS:
+            key = self._keys.get(header.get("kid") or "")
+            return key.key if key else None
+        return None
+
+    # --- 校验 ---
+
+    def verify(self, token: str) -> Optional[dict]:
+        """
+        本地校验会话令牌
+
+        Returns:
+            用户信息；本地无法判断时返回 None（调用方应回退到远程校验）
+        Raises:
+            jwt.InvalidTokenError: 令牌格式错误、签名不符、已过期或 audience 不符
+        """
+        user = self._cached(token)
+        if user is not None:
+            CACHE_LOOKUPS.inc(cache="session_token", result="hit")
+            AUTH_VERIFICATIONS.inc(method="cache", result="ok")
+            return user
+        CACHE_LOOKUPS.inc(cache="session_token", result="miss")
+
+        header = jwt.get_unverified_header(token)
+        key = self._signing_key(header)
+        if key is None:
+            return None
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[header["alg"]],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"require": ["exp", "sub"], "verify_aud": self.audience is not None}
+            )
+        except jwt.InvalidTokenError:
+            AUTH_VERIFICATIONS.inc(method="local", result="rejected")
+            raise
+        user = {"user_id": claims["sub"], "email": claims.get("email"), "source": "session"}
+        self.remember(token, user, claims["exp"])
+        AUTH_VERIFICATIONS.inc(method="local", result="ok")
+        return user
+
+    def needs_key_refresh(self, token: str) -> bool:
+        """令牌使用非对称签名且本地没有对应 kid 的公钥"""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            return False
+        return bool(self.jwks_url) and header.get("alg") in _ASYMMETRIC_ALGORITHMS \
+            and (header.get("kid") or "") not in self._keys
+
+
+session_verifier = SessionTokenVerifier(
+    secret=SUPABASE_JWT_SECRET,
+    jwks_url=SUPABASE_JWKS_URL,
+    audience=JWT_AUDIENCE,
+    issuer=JWT_ISSUER,
+    leeway=JWT_LEEWAY_SECONDS,
+    cache_ttl=SESSION_CACHE_TTL,
+    cache_size=SESSION_CACHE_SIZE
+)
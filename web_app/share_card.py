@@ -1,17 +1,27 @@
 """
 分享卡片生成服务
 仿微信读书风格的精美总结卡片
+
+PIL / qrcode 与字体路径都在生成第一张卡片时才加载，导入本模块不触发这些开销。
 """
+from __future__ import annotations
+
+import functools
 import io
 import os
 import uuid
 import time
 from pathlib import Path
 from typing import Optional, Dict, Any
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import qrcode
 import logging
 
+from .lazy_imports import lazy_module
+
+Image = lazy_module("PIL.Image")
+ImageDraw = lazy_module("PIL.ImageDraw")
+ImageFont = lazy_module("PIL.ImageFont")
+qrcode = lazy_module("qrcode")
+
 logger = logging.getLogger(__name__)
 
 # 卡片尺寸定义（微信读书风格 3:4 比例）
@@ -42,8 +52,9 @@ SYSTEM_FONTS = [
 MIN_FONT_SIZE = 1_000_000
 
 
+@functools.lru_cache(maxsize=None)
 def get_font_path(font_name: str = "NotoSansSC-Regular.otf") -> str:
-    """获取可用的字体路径"""
+    """获取可用的字体路径（首次调用时探测并缓存）"""
     # 1. 检查项目字体目录
     font_path = FONT_DIR / font_name
     if font_path.exists() and font_path.stat().st_size > MIN_FONT_SIZE:
@@ -57,6 +68,7 @@ def get_font_path(font_name: str = "NotoSansSC-Regular.otf") -> str:
     return str(font_path)
 
 
+@functools.lru_cache(maxsize=None)
 def get_bold_font_path() -> str:
     """获取粗体字体路径"""
     bold_path = FONT_DIR / "NotoSansSC-Bold.otf"
@@ -65,9 +77,6 @@ def get_bold_font_path() -> str:
     return get_font_path()
 
 
-FONT_REGULAR = get_font_path()
-FONT_BOLD = get_bold_font_path()
-
 # 卡片存储目录
 CARDS_DIR = Path(__file__).parent.parent / "cards"
 CARDS_DIR.mkdir(exist_ok=True)
@@ -157,10 +166,10 @@ def generate_share_card(
     
     # 加载字体
     try:
-        font_quote = ImageFont.truetype(FONT_BOLD, 48)      # 主引文
-        font_title = ImageFont.truetype(FONT_REGULAR, 32)   # 标题/来源
-        font_small = ImageFont.truetype(FONT_REGULAR, 26)   # 日期/作者
-        font_brand = ImageFont.truetype(FONT_BOLD, 28)      # 品牌
+        font_quote = ImageFont.truetype(get_bold_font_path(), 48)      # 主引文
+        font_title = ImageFont.truetype(get_font_path(), 32)   # 标题/来源
+        font_small = ImageFont.truetype(get_font_path(), 26)   # 日期/作者
+        font_brand = ImageFont.truetype(get_bold_font_path(), 28)      # 品牌
     except Exception as e:
         logger.warning(f"Failed to load fonts: {e}")
         font_quote = ImageFont.load_default()
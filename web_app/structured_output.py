@@ -0,0 +1,261 @@
+"""
+模型结构化输出解析
+对模型回复做一次线性扫描，拆出：
+- [COT_START]...[COT_END] 思考过程（解析为 cot_steps；缺少结束标记时到下一个段落标记为止）
+- ```json 代码块（图表 charts、词云 keywords、对比结果等）
+- 【思维导图】段落（Markdown 无序列表）
+冷启动的多模态调用在总结之后以 [BASE_NOTES] 引出基础笔记，先用 split_base_notes 切开。
+summarize_content 与 compare_summaries 共用，避免对全文反复做 DOTALL 正则与整串替换。
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+COT_START = "[COT_START]"
+COT_END = "[COT_END]"
+FENCE = "```"
+MINDMAP_MARKER = "【思维导图】"
+BASE_NOTES_MARKER = "[BASE_NOTES]"
+
+# 只在思考过程内部逐行匹配，不会作用于全文
+_STEP_LINE = re.compile(r"^(?:###\s*)?步骤\s*(\d+)[:：]\s*(.+)$")
+_THINKING_LINE = re.compile(r"^\[思考\][:：]\s*(.*)$")
+
+
+@dataclass
+class FencedBlock:
+    """一个 ``` 代码块"""
+    lang: str
+    content: str
+    start: int
+    end: int
+    data: Any = None
+    is_json: bool = False
+
+
+@dataclass
+class StructuredOutput:
+    """
+    Attributes:
+        body: 去掉思考过程与已识别的图表/关键词代码块后的正文
+        cot_raw: 思考过程原文（不含标记）；未输出时为 None
+        cot_steps: 解析出的思考步骤；无法按步骤解析时退化为单个步骤
+        blocks: 全部代码块（JSON 已解析到 data）
+        charts / keywords: 从 JSON 代码块中取出的图表与关键词
+        mindmap: 【思维导图】后的无序列表原文
+    """
+    body: str
+    cot_raw: Optional[str] = None
+    cot_steps: List[Dict[str, Any]] = field(default_factory=list)
+    blocks: List[FencedBlock] = field(default_factory=list)
+    charts: Optional[List[Any]] = None
+    keywords: Optional[List[Any]] = None
+    mindmap: Optional[str] = None
+
+    def first_json(self) -> Any:
+        """
+        取第一个可解析的 JSON：优先 ```json 代码块，其次任意代码块，最后把正文整体当作 JSON
+        全部失败时抛出 json.JSONDecodeError
+        """
+        for block in self.blocks:
+            if block.is_json:
+                return block.data
+        for block in self.blocks:
+            try:
+                return json.loads(block.content)
+            except ValueError:
+                continue
+        return json.loads(self.body)
+
+    def apply_to_usage(self, usage: Dict[str, Any]) -> Dict[str, Any]:
+        """把思考步骤、图表与关键词写入 usage（沿用原有字段名）"""
+        if self.cot_steps:
+            usage["cot_steps"] = self.cot_steps
+        if self.charts is not None:
+            usage["charts"] = self.charts
+        if self.keywords is not None:
+            usage["keywords"] = self.keywords
+        return usage
+
+
+def parse_cot_steps(cot: str) -> List[Dict[str, Any]]:
+    """
+    逐行解析思考过程：
+        ### 步骤 1: 标题
+        [思考]: 内容（可跨多行，遇到空行或下一个步骤结束）
+    """
+    steps = []
+    current = None
+    thinking: List[str] = []
+    collecting = False
+
+    def close():
+        if current is not None and thinking:
+            steps.append({"step": current[0], "title": current[1], "thinking": "\n".join(thinking).strip()})
+
+    for raw in cot.splitlines():
+        line = raw.strip()
+        step = _STEP_LINE.match(line)
+        if step:
+            close()
+            current = (int(step.group(1)), step.group(2).strip())
+            thinking = []
+            collecting = False
+            continue
+        if current is None:
+            continue
+        if not collecting:
+            match = _THINKING_LINE.match(line)
+            if match:
+                collecting = True
+                thinking = [match.group(1)]
+            continue
+        if not line:
+            close()
+            current = None
+            collecting = False
+            continue
+        thinking.append(line)
+    close()
+    return steps
+
+
+def _skip_separator(text: str, pos: int) -> int:
+    """跳过思考过程之后的空白与 --- 分隔线"""
+    n = len(text)
+    while True:
+        while pos < n and text[pos] in " \t\r\n":
+            pos += 1
+        if text.startswith("---", pos):
+            pos += 3
+            continue
+        return pos
+
+
+def _unterminated_cot_end(text: str, start: int) -> int:
+    """缺少 COT_END 时思考过程的结束位置：最早出现的段落标记，没有则为全文末尾"""
+    candidates = [text.find(marker, start) for marker in ("\n---", FENCE, MINDMAP_MARKER)]
+    found = [index for index in candidates if index != -1]
+    return min(found) if found else len(text)
+
+
+def _extract_mindmap(body: str) -> Optional[str]:
+    marker = body.find(MINDMAP_MARKER)
+    if marker < 0:
+        return None
+    line_end = body.find("\n", marker)
+    if line_end < 0:
+        return None
+    lines = []
+    for line in body[line_end + 1:].split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            if lines:
+                break
+            continue
+        if not stripped.startswith(("- ", "* ", "+ ")):
+            break
+        lines.append(line.rstrip())
+    return "\n".join(lines) or None
+
+
+def split_base_notes(text: str) -> Tuple[str, Optional[str]]:
+    """
+    把“总结 + [BASE_NOTES] + 基础笔记”的回复切成两部分
+
+    Returns:
+        (总结原文, 基础笔记)；没有标记或笔记为空时笔记为 None
+    """
+    index = text.find(BASE_NOTES_MARKER)
+    if index < 0:
+        return text, None
+    notes = text[index + len(BASE_NOTES_MARKER):].strip()
+    return text[:index].rstrip(), notes or None
+
+
+def parse_structured_output(text: str) -> StructuredOutput:
+    """
+    线性扫描模型回复，提取思考过程、代码块与思维导图
+
+    扫描位置只向前推进，每个字符最多被查找一次；
+    含 charts / keywords 的 JSON 代码块从正文中移除，其余代码块原样保留。
+    """
+    pieces: List[str] = []
+    blocks: List[FencedBlock] = []
+    cot_raw = None
+    charts = None
+    keywords = None
+
+    n = len(text)
+    pos = 0
+    next_cot = text.find(COT_START)
+    next_fence = text.find(FENCE)
+
+    while pos < n:
+        if next_cot != -1 and next_cot < pos:
+            next_cot = text.find(COT_START, pos)
+        if next_fence != -1 and next_fence < pos:
+            next_fence = text.find(FENCE, pos)
+
+        if next_cot != -1 and (next_fence == -1 or next_cot < next_fence):
+            cot_body = next_cot + len(COT_START)
+            end = text.find(COT_END, cot_body)
+            if end == -1:
+                # 思考过程没有结束标记：到下一个已知段落（--- 分隔线、代码块、思维导图）或全文末尾为止
+                end = _unterminated_cot_end(text, cot_body)
+                resume = end
+            else:
+                resume = end + len(COT_END)
+            pieces.append(text[pos:next_cot])
+            if cot_raw is None:
+                cot_raw = text[cot_body:end].strip()
+            pos = _skip_separator(text, resume)
+            continue
+
+        if next_fence != -1:
+            header_end = text.find("\n", next_fence + 3)
+            close = text.find(FENCE, header_end + 1) if header_end != -1 else -1
+            if close == -1:
+                # 未闭合的代码块：保留原文
+                pieces.append(text[pos:])
+                break
+            block_end = close + 3
+            lang = text[next_fence + 3:header_end].strip().lower()
+            block = FencedBlock(lang=lang, content=text[header_end + 1:close].strip(), start=next_fence, end=block_end)
+            consumed = False
+            if lang == "json":
+                try:
+                    block.data = json.loads(block.content)
+                    block.is_json = True
+                except ValueError:
+                    pass
+                if isinstance(block.data, dict):
+                    if isinstance(block.data.get("charts"), list):
+                        charts = block.data["charts"]
+                        consumed = True
+                    if isinstance(block.data.get("keywords"), list):
+                        keywords = block.data["keywords"]
+                        consumed = True
+            blocks.append(block)
+            pieces.append(text[pos:next_fence] if consumed else text[pos:block_end])
+            pos = block_end
+            continue
+
+        pieces.append(text[pos:])
+        break
+
+    body = "".join(pieces).strip()
+    cot_steps: List[Dict[str, Any]] = []
+    if cot_raw is not None:
+        cot_steps = parse_cot_steps(cot_raw) or [{"step": 0, "title": "AI 分析过程", "thinking": cot_raw}]
+
+    return StructuredOutput(
+        body=body,
+        cot_raw=cot_raw,
+        cot_steps=cot_steps,
+        blocks=blocks,
+        charts=charts,
+        keywords=keywords,
+        mindmap=_extract_mindmap(body)
+    )
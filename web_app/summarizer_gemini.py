@@ -5,21 +5,17 @@ import sys
 import time
 from typing import Optional
 
-import google.generativeai as genai
-from dotenv import load_dotenv
+from .llm import get_llm_backend
+from .metrics import STAGE_SECONDS
+from .structured_output import BASE_NOTES_MARKER, COT_START, COT_END, parse_structured_output, split_base_notes
 
 
 def upload_to_gemini(file_path: Path, progress_callback=None):
     """
     独立上传文件到 Gemini，供后续步骤复用。
+    文件归属于上传它的 Key，后续引用该文件的请求由客户端池自动固定到同一 Key。
+    实际的上传与云端处理等待由当前 LLM 后端完成（本地桩后端不会访问网络）。
     """
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not found.")
-    
-    genai.configure(api_key=api_key)
-    
     # MIME 类型映射
     mime_mapping = {
         '.mp4': 'video/mp4',
@@ -41,22 +37,14 @@ def upload_to_gemini(file_path: Path, progress_callback=None):
     if progress_callback:
         progress_callback(f"Uploading file to Google AI (Mime: {mime_type})...")
     
+    backend = get_llm_backend()
     try:
-        media_file = genai.upload_file(path=str(file_path), mime_type=mime_type)
+        with STAGE_SECONDS.time(stage="upload"):
+            media_file = backend.upload(file_path, mime_type=mime_type, progress_callback=progress_callback)
     except Exception as e:
         # 如果还是报错，尝试不带 mime_type 让它自适应（虽然通常这就是报错原因）
         print(f"带MIME上传失败，尝试自动探测: {e}")
-        media_file = genai.upload_file(path=str(file_path))
-    
-    # 等待文件处理完成
-    while media_file.state.name == "PROCESSING":
-        time.sleep(2)
-        media_file = genai.get_file(media_file.name)
-        if progress_callback:
-             progress_callback(f"Cloud processing: {media_file.state.name}")
-    
-    if media_file.state.name == "FAILED":
-        raise Exception("Google AI File Processing Failed")
+        media_file = backend.upload(file_path, progress_callback=progress_callback)
         
     print(f"上传完成: {media_file.name}")
     return media_file
@@ -65,7 +53,7 @@ def delete_gemini_file(file_obj):
     """安全删除云端文件"""
     try:
         if hasattr(file_obj, 'name'):
-            genai.delete_file(file_obj.name)
+            get_llm_backend().delete(file_obj)
             print(f"已清理云端文件: {file_obj.name}")
     except Exception as e:
         print(f"清理云端文件失败 (并不影响结果): {e}")
@@ -83,16 +71,13 @@ def extract_ai_transcript(file_path: Path, progress_callback=None, uploaded_file
     内置重试机制，最多重试 2 次。
     """
     MAX_RETRIES = 2
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    backend = get_llm_backend()
+    if not backend.configured:
         logger.error("GOOGLE_API_KEY not found, cannot extract transcript")
         return ""
     
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name="models/gemini-3-flash-preview")
-        logger.info(f"Using AI Model: {model.model_name}")
+        logger.info(f"Using AI Model: {backend.model_name}")
         
         # 如果 uploaded_file 存在，说明是并行模式，main.py 已经发送了统一的进度消息
         if progress_callback and not uploaded_file:
@@ -124,19 +109,21 @@ def extract_ai_transcript(file_path: Path, progress_callback=None, uploaded_file
 [00:07] 首先让我们来看第一个观点...
 """
         
-        response = model.generate_content(
+        response = backend.generate(
             [transcript_prompt, media_file],
+            file=media_file,
+            task="transcript",
             request_options={"timeout": 600}
         )
         
         # 3. 清理（仅清理自己上传的文件，传入的文件由调用者负责清理）
         if file_owned:
             try:
-                genai.delete_file(media_file.name)
+                backend.delete(media_file)
             except:
                 pass
         
-        if response.parts:
+        if response.text:
             logger.info("AI Transcript generated successfully.")
             return response.text
         logger.warning("AI Transcript returned empty parts.")
@@ -157,14 +144,84 @@ def extract_ai_transcript(file_path: Path, progress_callback=None, uploaded_file
         return ""
 
 
-def summarize_content(file_path: Path, media_type: str, progress_callback=None, focus: str = "default", uploaded_file=None, custom_prompt: Optional[str] = None, output_language: str = "zh", enable_cot: bool = False) -> str:
+class SummaryDeltaFilter:
     """
-    使用 Google Gemini API 总结内容。
-    支持传入 uploaded_file 以避免重复上传。
-    支持传入 custom_prompt 使用自定义模板。
-    支持传入 output_language 设置输出语言。
-    支持传入 enable_cot 启用思维链展示。
+    流式总结的增量过滤器
+    - 原样放行正文 Markdown
+    - 隐藏 [COT_START]...[COT_END] 思考过程（结束后统一解析为 cot_steps）
+    - 遇到末尾的 ```json 图表/关键词代码块或 [BASE_NOTES] 基础笔记后不再放行（结束后统一解析）
+    标记可能被拆在两个分片之间，因此末尾保留一小段待确认文本。
     """
+    COT_START = COT_START
+    COT_END = COT_END
+    STOP_MARKERS = ("```json", BASE_NOTES_MARKER)
+
+    def __init__(self):
+        self._pending = ""
+        self._in_cot = False
+        self._after_cot = False
+        self._stopped = False
+
+    def feed(self, text: str) -> str:
+        if self._stopped:
+            return ""
+        self._pending += text
+        output = []
+        while True:
+            if self._in_cot:
+                end = self._pending.find(self.COT_END)
+                if end < 0:
+                    # 丢弃思考内容，只保留可能是半个结束标记的尾部
+                    self._pending = self._pending[-(len(self.COT_END) - 1):]
+                    break
+                self._pending = self._pending[end + len(self.COT_END):]
+                self._in_cot = False
+                self._after_cot = True
+                continue
+
+            if self._after_cot:
+                # 去掉思考过程后面的空行与 --- 分隔线（可能跨分片到达）
+                stripped = self._pending.lstrip("\n ")
+                while stripped.startswith("---"):
+                    stripped = stripped[3:].lstrip("\n ")
+                self._pending = stripped
+                if not stripped or "---".startswith(stripped):
+                    break
+                self._after_cot = False
+
+            cot = self._pending.find(self.COT_START)
+            trailer = min(
+                (i for i in (self._pending.find(m) for m in self.STOP_MARKERS) if i >= 0),
+                default=-1
+            )
+            if trailer >= 0 and (cot < 0 or trailer < cot):
+                output.append(self._pending[:trailer])
+                self._pending = ""
+                self._stopped = True
+                break
+            if cot >= 0:
+                output.append(self._pending[:cot])
+                self._pending = self._pending[cot + len(self.COT_START):]
+                self._in_cot = True
+                continue
+
+            holdback = max(len(marker) for marker in (self.COT_START, *self.STOP_MARKERS)) - 1
+            safe = len(self._pending) - holdback
+            if safe > 0:
+                output.append(self._pending[:safe])
+                self._pending = self._pending[safe:]
+            break
+        return "".join(output)
+
+    def flush(self) -> str:
+        if self._stopped or self._in_cot:
+            return ""
+        rest, self._pending = self._pending, ""
+        return rest
+
+
+def build_summary_prompt(focus: str = "default", custom_prompt: Optional[str] = None, output_language: str = "zh", enable_cot: bool = False) -> str:
+    """根据视角 / 自定义模板 / 输出语言 / 思维链开关构造总结提示词"""
     # 语言映射
     lang_map = {
         "zh": "中文（简体）",
@@ -176,19 +233,6 @@ def summarize_content(file_path: Path, media_type: str, progress_callback=None,
     }
     
     target_language = lang_map.get(output_language, "中文（简体）")
-    # 1. 加载和配置 API 密钥
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("错误: GOOGLE_API_KEY 未在 .env 文件中设置。")
-    
-    try:
-        genai.configure(api_key=api_key)
-        # 使用完整的模型名称
-        model = genai.GenerativeModel(model_name="models/gemini-3-flash-preview")
-    except Exception as e:
-        raise Exception(f"Google AI SDK 配置失败: {e}")
-
     # 如果提供了自定义 Prompt，则优先使用
     if custom_prompt:
         prompt_text = (
@@ -283,6 +327,106 @@ def summarize_content(file_path: Path, media_type: str, progress_callback=None,
             "16. **内容深度要求**：对于中长视频或信息密度高的内容，正文必须足够详尽，不要过度概括。请保留重要的论据、案例、数据和逻辑推导过程。"
         )
 
+    return prompt_text
+
+
+def _generate_summary(backend, content_parts, media_file, stream_callback=None, task: str = "summary"):
+    """调用模型生成总结；有 stream_callback 时流式下发过滤后的正文增量"""
+    # 增加超时时间到 1200 秒
+    if stream_callback:
+        delta_filter = SummaryDeltaFilter()
+
+        def on_text(text):
+            delta = delta_filter.feed(text)
+            if delta:
+                stream_callback(delta)
+
+        response = backend.stream(
+            content_parts, on_text, file=media_file, task=task, request_options={"timeout": 1200}
+        )
+        tail = delta_filter.flush()
+        if tail:
+            stream_callback(tail)
+        return response
+    return backend.generate(
+        content_parts, file=media_file, task=task, request_options={"timeout": 1200}
+    )
+
+
+def _parse_summary_response(text: str, usage, enable_cot: bool):
+    """把模型回复文本解析为 (正文, usage)"""
+    if not text:
+        raise Exception(f"AI未能生成有效回复")
+
+    logger.info("AI Content Summary generated successfully.")
+
+    # 一次线性扫描拆出思考过程、图表/关键词 JSON 与思维导图
+    parsed = parse_structured_output(text)
+    if enable_cot and parsed.cot_raw is None:
+        logger.warning("CoT 启用但未检测到标记")
+    parsed.apply_to_usage(usage)
+    return parsed.body, usage
+
+
+def summarize_content(file_path: Path, media_type: str, progress_callback=None, focus: str = "default", uploaded_file=None, custom_prompt: Optional[str] = None, output_language: str = "zh", enable_cot: bool = False, stream_callback=None) -> str:
+    """
+    使用 Google Gemini API 总结内容。
+    支持传入 uploaded_file 以避免重复上传。
+    支持传入 custom_prompt 使用自定义模板。
+    支持传入 output_language 设置输出语言。
+    支持传入 enable_cot 启用思维链展示。
+    支持传入 stream_callback 以流式接收正文增量（思考过程与末尾 JSON 块不会下发，返回值不变）。
+    """
+    prompt_text = build_summary_prompt(focus, custom_prompt, output_language, enable_cot)
+    response = _summarize_media(
+        file_path, media_type, prompt_text, progress_callback, uploaded_file, enable_cot, stream_callback, "summary"
+    )
+    return _parse_summary_response(response.text, response.usage, enable_cot)
+
+
+BASE_NOTES_INSTRUCTION = f"""
+
+## 附加输出：基础笔记（不会展示给用户）
+完成以上全部输出（包括思维导图、图表与关键词 JSON）之后，另起一行单独输出 {BASE_NOTES_MARKER}，
+然后输出一份详尽、中立的内容笔记，供之后按其他视角和语言重新生成总结使用：
+1. 按时间顺序覆盖全部内容，不要取舍，也不要加入评价或总结性结论。
+2. 保留所有论点、论据、案例、数据、步骤、专有名词与原话金句（金句用引号标出）。
+3. 描述关键画面信息（图表、演示、屏幕文字、场景与人物动作），标注 [画面]。
+4. 记录氛围、笑点、槽点与互动性的瞬间，便于娱乐视角使用。
+5. 每个段落前标注大致时间 [mm:ss]。
+6. 笔记使用视频原语言，直接输出 Markdown。
+"""
+
+
+def summarize_with_base_notes(file_path: Path, media_type: str, progress_callback=None, focus: str = "default", uploaded_file=None, custom_prompt: Optional[str] = None, output_language: str = "zh", enable_cot: bool = False, stream_callback=None) -> tuple:
+    """
+    两级缓存的冷启动路径：一次多模态调用同时产出所需变体与基础笔记。
+    总结在前、照常流式下发（首字延迟与单次调用相同），笔记在 [BASE_NOTES] 之后、不下发；
+    之后切换侧重点、模板或语言时只需基于笔记做纯文本调用（见 summarize_from_base）。
+
+    Returns:
+        (summary, usage, notes)；模型没有输出笔记时 notes 为 None
+    """
+    if media_type not in ['audio', 'video']:
+        raise ValueError("基础笔记只适用于视频/音频")
+    prompt_text = build_summary_prompt(focus, custom_prompt, output_language, enable_cot) + BASE_NOTES_INSTRUCTION
+    response = _summarize_media(
+        file_path, media_type, prompt_text, progress_callback, uploaded_file, enable_cot, stream_callback, "summary_base"
+    )
+    summary_text, notes = split_base_notes(response.text or "")
+    if notes is None:
+        logger.warning("未检测到基础笔记标记，本次不保存基础提取")
+    summary, usage = _parse_summary_response(summary_text, response.usage, enable_cot)
+    return summary, usage, notes
+
+
+def _summarize_media(file_path: Path, media_type: str, prompt_text: str, progress_callback, uploaded_file, enable_cot: bool, stream_callback, task: str):
+    """准备字幕文本或媒体文件并调用模型，返回原始回复"""
+    # 1. 检查 API 密钥（客户端池在首次使用时初始化）
+    backend = get_llm_backend()
+    if not backend.configured:
+        raise ValueError("错误: GOOGLE_API_KEY 未在 .env 文件中设置。")
+
     content_parts = [prompt_text]
     file_to_delete = None # 本地上传的文件需要删除
     
@@ -323,12 +467,12 @@ def summarize_content(file_path: Path, media_type: str, progress_callback=None,
         if progress_callback and not uploaded_file:
             progress_callback("AI is analyzing content...")
             
-        logger.info(f"开始 AI 分析: Model={model.model_name}, EnableCoT={enable_cot}")
+        logger.info(f"开始 AI 分析: Model={backend.model_name}, EnableCoT={enable_cot}")
         if enable_cot:
             logger.info("CoT 指令已启用，等待思考过程...")
             
-        # 增加超时时间到 1200 秒
-        response = model.generate_content(content_parts, request_options={"timeout": 1200})
+        media_file = content_parts[-1] if media_type in ['audio', 'video'] else None
+        response = _generate_summary(backend, content_parts, media_file, stream_callback, task)
         
         # 打印部分响应内容用于调试
         logger.info(f"AI 响应前 500 字符: {response.text[:500]}")
@@ -341,100 +485,45 @@ def summarize_content(file_path: Path, media_type: str, progress_callback=None,
         # if file_to_delete:
         #    delete_gemini_file(file_to_delete)
         
-        if not response.parts:
-             raise Exception(f"AI未能生成有效回复")
-
-        logger.info("AI Content Summary generated successfully.")
-        # Extract usage metadata
-        usage = {
-            "prompt_tokens": response.usage_metadata.prompt_token_count,
-            "completion_tokens": response.usage_metadata.candidates_token_count,
-            "total_tokens": response.usage_metadata.total_token_count
-        }
-
-        # 解析 CoT 内容（如果启用）
-        response_text = response.text
-        if enable_cot:
-            logger.info(f"CoT 解析: [COT_START]={('[COT_START]' in response_text)}, [COT_END]={('[COT_END]' in response_text)}")
-            
-            if "[COT_START]" in response_text and "[COT_END]" in response_text:
-                try:
-                    cot_start = response_text.index("[COT_START]")
-                    cot_end = response_text.index("[COT_END]") + len("[COT_END]")
-                    cot_content = response_text[cot_start:cot_end]
-                    
-                    logger.info(f"CoT 前200字符: {cot_content[:200]}")
-                    
-                    import re
-                    # 更宽容的正则：兼容中英文冒号
-                    steps = re.findall(
-                        r'(?:###\s*)?步骤\s*(\d+)[:：]\s*(.+?)\n\s*\[思考\][:：]\s*(.+?)(?=\n\n|\n(?:###\s*)?步骤|\[COT_END\]|$)',
-                        cot_content, re.DOTALL
-                    )
-                    
-                    logger.info(f"正则匹配到 {len(steps)} 个步骤")
-                    
-                    if steps:
-                        cot_steps = [{"step": int(num), "title": title.strip(), "thinking": thinking.strip()} for num, title, thinking in steps]
-                        usage["cot_steps"] = cot_steps
-                    else:
-                        # 兜底：返回原始文本
-                        raw_cot = cot_content.replace("[COT_START]", "").replace("[COT_END]", "").strip()
-                        usage["cot_steps"] = [{"step": 0, "title": "AI 分析过程", "thinking": raw_cot}]
-                    
-                    response_text = response_text[:cot_start] + response_text[cot_end:]
-                    response_text = response_text.replace("---\n\n", "").strip()
-                except Exception as e:
-                    logger.warning(f"CoT 解析失败: {e}")
-            else:
-                logger.warning("CoT 启用但未检测到标记")
-
-        # 解析图表数据（如果存在）
-        if "```json" in response_text and "charts" in response_text:
-            try:
-                import json
-                import re
-                # 提取 JSON 代码块
-                json_match = re.search(r'```json\s*(\{.*?"charts".*?\})\s*```', response_text, re.DOTALL)
-                if json_match:
-                    chart_json = json_match.group(1)
-                    chart_data = json.loads(chart_json)
-                    if "charts" in chart_data and isinstance(chart_data["charts"], list):
-                        usage["charts"] = chart_data["charts"]
-                    if "keywords" in chart_data and isinstance(chart_data["keywords"], list):
-                        usage["keywords"] = chart_data["keywords"]
-                    # 移除 JSON 代码块
-                    response_text = response_text.replace(json_match.group(0), "").strip()
-            except Exception as e:
-                logger.warning(f"Failed to parse chart data: {e}")
-
-        # 解析关键词数据（词云用）
-        if "```json" in response_text and "keywords" in response_text:
-            try:
-                import json
-                import re
-                keyword_match = re.search(r'```json\s*(\{.*?"keywords".*?\})\s*```', response_text, re.DOTALL)
-                if keyword_match:
-                    keyword_json = keyword_match.group(1)
-                    keyword_data = json.loads(keyword_json)
-                    if "keywords" in keyword_data and isinstance(keyword_data["keywords"], list):
-                        usage["keywords"] = keyword_data["keywords"]
-                        response_text = response_text.replace(keyword_match.group(0), "").strip()
-            except Exception as e:
-                logger.warning(f"Failed to parse keyword data: {e}")
-
-        return response_text, usage
+        if not response.text:
+            raise Exception("AI未能生成有效回复")
+        return response
 
     except Exception as e:
         logger.error(f"AI 总结最终失败: {e}")
         # Error Cleanup
         if file_to_delete:
             try:
-                genai.delete_file(file_to_delete.name)
+                backend.delete(file_to_delete)
             except:
                 pass
         raise Exception(f"AI 总结失败: {e}")
 
+
+def summarize_from_base(base_text: str, progress_callback=None, focus: str = "default", custom_prompt: Optional[str] = None, output_language: str = "zh", enable_cot: bool = False, stream_callback=None) -> tuple:
+    """
+    两级缓存的第二级：基于基础笔记（或字幕文本）生成指定视角 / 模板 / 语言的总结。
+    只有一次纯文本调用，不再上传或分析媒体文件。返回值与 summarize_content 相同。
+    """
+    backend = get_llm_backend()
+    if not backend.configured:
+        raise ValueError("错误: GOOGLE_API_KEY 未在 .env 文件中设置。")
+
+    prompt_text = build_summary_prompt(focus, custom_prompt, output_language, enable_cot)
+    content_parts = [
+        prompt_text,
+        f"以下是视频的详细内容笔记（已包含画面信息与时间标注）:\n{base_text}"
+    ]
+    try:
+        logger.info(f"基于基础提取生成总结: Model={backend.model_name}, Focus={focus}, Language={output_language}")
+        response = _generate_summary(backend, content_parts, None, stream_callback)
+        if progress_callback:
+            progress_callback("Analysis complete! Formatting result...")
+        return _parse_summary_response(response.text, response.usage, enable_cot)
+    except Exception as e:
+        logger.error(f"AI 总结最终失败: {e}")
+        raise Exception(f"AI 总结失败: {e}")
+
 import json
 
 def generate_ppt_structure(summary_text: str) -> dict:
@@ -442,15 +531,10 @@ def generate_ppt_structure(summary_text: str) -> dict:
     根据视频总结内容，生成 PPT 结构的 JSON 数据。
     使用 Gemini 模型进行转换。
     """
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    backend = get_llm_backend()
+    if not backend.configured:
         raise ValueError("GOOGLE_API_KEY not found.")
     
-    genai.configure(api_key=api_key)
-    # 使用较快的模型处理简单的格式转换任务
-    model = genai.GenerativeModel("models/gemini-3-flash-preview")
-    
     prompt = """User wants to turn the following textual summary into a PowerPoint presentation.
     Please act as a Presentation Expert and structure the content into a JSON format suitable for generating slides.
 
@@ -480,19 +564,9 @@ def generate_ppt_structure(summary_text: str) -> dict:
     """ + summary_text + "\n--- INPUT SUMMARY END ---"
 
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        
-        # Clean Markdown Code Blocks
-        if text.startswith("```json"):
-            text = text[7:]
-        elif text.startswith("```"):
-            text = text[3:]
-        
-        if text.endswith("```"):
-            text = text[:-3]
-            
-        return json.loads(text)
+        response = backend.generate(prompt, task="ppt")
+        # 兼容模型用 Markdown 代码块包裹 JSON 的情况
+        return parse_structured_output(response.text).first_json()
     except Exception as e:
         print(f"PPT Structure Generation Failed: {e}", file=sys.stderr)
         # Return a fallback structure
@@ -1,6 +1,26 @@
-from typing import Optional
+"""
+失败事件记录
+record_failure 只做内存追加（同时累加 bili_failures_total 计数），
+明细由后台任务按 TELEMETRY_FLUSH_INTERVAL 批量写入 failure_events，一次连接、一次提交。
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from .db import get_connection, using_postgres
+from .db import get_connection
+from .metrics import FAILURE_EVENTS_DROPPED, FAILURES
+from .migrations import apply_steps
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
+TELEMETRY_BUFFER_MAX = int(os.getenv("TELEMETRY_BUFFER_MAX", "5000"))
+
+_pending: List[Tuple[Optional[str], str, str, str, str]] = []
+_pending_lock = threading.Lock()
 
 
 def _get_connection():
@@ -8,41 +28,60 @@ def _get_connection():
 
 
 def init_telemetry_db():
-    conn = _get_connection()
-    cursor = conn.cursor()
-    if using_postgres():
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS failure_events (
-                id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                user_id TEXT,
-                code TEXT NOT NULL,
-                stage TEXT NOT NULL,
-                detail TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    else:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS failure_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                code TEXT NOT NULL,
-                stage TEXT NOT NULL,
-                detail TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    conn.commit()
-    conn.close()
+    apply_steps("telemetry_tables")
 
 
 def record_failure(user_id: Optional[str], code: str, stage: str, detail: str = ""):
-    conn = _get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO failure_events (user_id, code, stage, detail)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, code, stage, detail))
-    conn.commit()
-    conn.close()
+    """登记一次失败（不访问数据库；缓冲区满时丢弃明细，计数照常累加）"""
+    FAILURES.inc(code=code, stage=stage)
+    # 与列默认值 CURRENT_TIMESTAMP 同格式（UTC），记录的是发生时间而不是写库时间
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    with _pending_lock:
+        if len(_pending) >= TELEMETRY_BUFFER_MAX:
+            FAILURE_EVENTS_DROPPED.inc()
+            return
+        _pending.append((user_id, code, stage, detail, created_at))
+
+
+def flush_failures() -> int:
+    """
+    把缓冲的失败事件一次性写入数据库
+
+    Returns:
+        写入条数；写库失败时事件放回缓冲区（受容量上限约束），返回 0
+    """
+    with _pending_lock:
+        batch = _pending[:]
+        _pending.clear()
+    if not batch:
+        return 0
+
+    try:
+        conn = _get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO failure_events (user_id, code, stage, detail, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Failed to flush {len(batch)} failure events: {e}")
+        with _pending_lock:
+            room = max(TELEMETRY_BUFFER_MAX - len(_pending), 0)
+            _pending[:0] = batch[-room:] if room else []
+            dropped = len(batch) - min(room, len(batch))
+        if dropped:
+            FAILURE_EVENTS_DROPPED.inc(dropped)
+        return 0
+    return len(batch)
+
+
+async def run_failure_flusher(interval: float = TELEMETRY_FLUSH_INTERVAL):
+    """后台定期批量写入失败事件（应用启动时创建，关闭时再补一次 flush）"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(flush_failures)
 
@@ -0,0 +1,122 @@
+"""
+请求级用户上下文
+
+一次 /summarize 原本要分别查询 user_credits（ensure / 余额检查）和 subscriptions（是否 Pro / 是否扣费），
+每次都借一次连接。这里用一条 LEFT JOIN 同时取回积分与订阅，并在当前请求内缓存：
+- 缓存挂在 ContextVar 上，由 UserContextMiddleware 为每个 HTTP 请求开一个新作用域，请求结束即丢弃
+- 积分或订阅写入后调用 invalidate_user_context()，同一请求内的后续读取会重新加载
+- 不在请求作用域内（后台任务、脚本）时不缓存，每次直接查询
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .db import get_connection
+from .metrics import CACHE_LOOKUPS
+
+_request_cache: ContextVar[Optional[Dict[str, dict]]] = ContextVar("user_context_cache", default=None)
+
+FREE_SUBSCRIPTION = {
+    "plan": "free",
+    "status": "inactive",
+    "current_period_end": None,
+    "updated_at": None
+}
+
+_CONTEXT_QUERY = """
+    SELECT c.credits, c.total_used, c.created_at, c.updated_at,
+           s.plan, s.status, s.current_period_end, s.updated_at AS subscription_updated_at
+    FROM user_credits c
+    LEFT JOIN subscriptions s ON s.user_id = c.user_id
+    WHERE c.user_id = ?
+"""
+
+
+def _to_context(row) -> dict:
+    subscription = dict(FREE_SUBSCRIPTION)
+    if row["plan"] is not None:
+        subscription = {
+            "plan": row["plan"],
+            "status": row["status"],
+            "current_period_end": row["current_period_end"],
+            "updated_at": row["subscription_updated_at"]
+        }
+    return {
+        "credits": row["credits"],
+        "total_used": row["total_used"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "subscription": subscription
+    }
+
+
+def load_user_context(user_id: str, initial_credits: Optional[int] = None) -> Optional[dict]:
+    """
+    一次查询取回积分与订阅
+
+    用户还没有积分记录时：initial_credits 为 None 返回 None，否则在同一连接内开户后重新读取。
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_CONTEXT_QUERY, (user_id,))
+        row = cursor.fetchone()
+        if row or initial_credits is None:
+            return _to_context(row) if row else None
+        cursor.execute("""
+            INSERT INTO user_credits (user_id, credits)
+            VALUES (?, ?)
+        """, (user_id, initial_credits))
+        cursor.execute("""
+            INSERT INTO credit_events (user_id, event_type, cost)
+            VALUES (?, ?, ?)
+        """, (user_id, "grant", 0))
+        cursor.execute(_CONTEXT_QUERY, (user_id,))
+        return _to_context(cursor.fetchone())
+
+
+def get_user_context(user_id: str, initial_credits: Optional[int] = None) -> Optional[dict]:
+    """读取用户上下文（请求内缓存）；返回值只读，不要修改"""
+    cache = _request_cache.get()
+    if cache is not None and user_id in cache:
+        CACHE_LOOKUPS.inc(cache="user_context", result="hit")
+        return cache[user_id]
+    CACHE_LOOKUPS.inc(cache="user_context", result="miss")
+    context = load_user_context(user_id, initial_credits)
+    if cache is not None and context is not None:
+        cache[user_id] = context
+    return context
+
+
+def invalidate_user_context(user_id: str) -> None:
+    """积分或订阅写入后调用"""
+    cache = _request_cache.get()
+    if cache is not None:
+        cache.pop(user_id, None)
+
+
+def is_pro_active(subscription: dict) -> bool:
+    return subscription["plan"] == "pro" and subscription["status"] == "active"
+
+
+@contextmanager
+def user_context_scope():
+    """开启一个缓存作用域（HTTP 请求由中间件开启；批处理脚本也可以手动使用）"""
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+
+class UserContextMiddleware:
+    """为每个 HTTP 请求开启独立的用户上下文缓存（纯 ASGI，流式响应期间同样有效）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with user_context_scope():
+            await self.app(scope, receive, send)